@@ -1,14 +1,22 @@
 # TableToBot.py
+import os
 import re
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import html
+import datetime
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 from database import db_manager
-import pandas as pd
-from parser import parse_table
+from rate_limiter import rate_limited
+from guild_registry import guild_registry
+import callback_data as cb
+import user_state
+import rollups
+import charts
 import asyncio
 import time
 
-GUILD_URLS = {}
+HISTORY_PAGE_SIZE = 25
 
 async def send_data_from_db(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_name: str):
     """Отправляет данные из БД"""
@@ -38,7 +46,9 @@ async def send_data_from_db(update: Update, context: ContextTypes.DEFAULT_TYPE,
             "Выберите действие:"
         )
 
-        show_more_keyboard = create_show_more_keyboard(guild_name)
+        guild_id = guild_registry.get_id(guild_name)
+        subscribed = db_manager.is_subscribed(update.effective_chat.id, guild_id)
+        show_more_keyboard = create_show_more_keyboard(guild_id, subscribed)
 
         # Отправляем ВСЕ в одном сообщении
         await update.message.reply_text(
@@ -47,8 +57,8 @@ async def send_data_from_db(update: Update, context: ContextTypes.DEFAULT_TYPE,
             reply_markup=show_more_keyboard
         )
 
-        # Сохраняем данные в контексте
-        context.user_data['guild_name'] = guild_name
+        # Запоминаем только id гильдии; курсор истории сохраняется, если гильдия та же
+        user_state.set_view(context.user_data, guild_id, user_state.get_cursor(context.user_data, guild_id))
 
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка загрузки данных: {e}")
@@ -66,7 +76,8 @@ async def gettable(update: Update, context: ContextTypes.DEFAULT_TYPE, url: str,
     try:
         await message_func("⏳ Начинаю извлечение данных таблицы... это займет около 2 мин")
 
-        # Используем функцию parse_table из parser.py
+        # Используем функцию parse_table из parser.py; selenium и pandas грузятся только при первом обновлении
+        from parser import parse_table
         df = await asyncio.to_thread(parse_table, url)
 
         if df.empty:
@@ -81,28 +92,81 @@ async def gettable(update: Update, context: ContextTypes.DEFAULT_TYPE, url: str,
     except Exception as e:
         await message_func(f"❌ Произошла ошибка: {e}")
 
-def create_choice_keyboard():
+def create_choice_keyboard(guild_id: int):
     """Создает клавиатуру для выбора показа таблицы"""
     keyboard = [
-        [InlineKeyboardButton("✅ Да, показать всю таблицу", callback_data="show_full")],
-        [InlineKeyboardButton("❌ Нет, хватит", callback_data="show_partial")]
+        [InlineKeyboardButton("✅ Да, показать всю таблицу", callback_data=cb.encode(cb.HISTORY, guild_id))],
+        [InlineKeyboardButton("❌ Нет, хватит", callback_data=cb.encode(cb.SKIP_HISTORY))]
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def create_show_more_keyboard(guild_name: str):
+def create_show_more_keyboard(guild_id: int, subscribed: bool = False):
     """Создает клавиатуру с кнопками показа всех данных"""
+    if subscribed:
+        subscription_button = InlineKeyboardButton("🔕 Отписаться от новых бустов",
+                                                   callback_data=cb.encode(cb.UNSUBSCRIBE, guild_id))
+    else:
+        subscription_button = InlineKeyboardButton("🔔 Уведомлять о новых бустах",
+                                                   callback_data=cb.encode(cb.SUBSCRIBE, guild_id))
+
     keyboard = [
-        [InlineKeyboardButton("📋 Показать всех бустеров", callback_data=f"show_all_{guild_name}")],
-        [InlineKeyboardButton("📜 Показать историю бустов", callback_data="show_full")],
-        [InlineKeyboardButton("🔄 Обновить данные", callback_data=f"refresh_{guild_name}")],
-        [InlineKeyboardButton("❌ Закрыть", callback_data="close_table")]
+        [InlineKeyboardButton("📋 Показать всех бустеров", callback_data=cb.encode(cb.SHOW_ALL, guild_id))],
+        [InlineKeyboardButton("📜 Показать историю бустов", callback_data=cb.encode(cb.HISTORY, guild_id))],
+        [InlineKeyboardButton("📅 За неделю",
+                              callback_data=cb.encode(cb.PERIOD, guild_id, rollups.PERIOD_CODES[rollups.WEEK])),
+         InlineKeyboardButton("🗓️ За месяц",
+                              callback_data=cb.encode(cb.PERIOD, guild_id, rollups.PERIOD_CODES[rollups.MONTH]))],
+        [InlineKeyboardButton("📈 График",
+                              callback_data=cb.encode(cb.CHART, guild_id, charts.CHART_CODES[charts.CUMULATIVE]))],
+        [InlineKeyboardButton("🔄 Обновить данные", callback_data=cb.encode(cb.REFRESH, guild_id))],
+        [subscription_button],
+        [InlineKeyboardButton("❌ Закрыть", callback_data=cb.encode(cb.CLOSE))]
     ]
     return InlineKeyboardMarkup(keyboard)
 
+def create_history_keyboard(guild_id: int, page: int, total_pages: int):
+    """Клавиатура листания истории бустов"""
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("◀️ Новее", callback_data=cb.encode(cb.HISTORY_PAGE, guild_id, page - 1)))
+    if page < total_pages - 1:
+        navigation.append(InlineKeyboardButton("Старше ▶️", callback_data=cb.encode(cb.HISTORY_PAGE, guild_id, page + 1)))
+
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton("❌ Закрыть", callback_data=cb.encode(cb.CLOSE))])
+    return InlineKeyboardMarkup(keyboard)
+
+PERIOD_BUTTONS = {rollups.DAY: "Сегодня", rollups.WEEK: "Неделя", rollups.MONTH: "Месяц"}
+
+def create_period_keyboard(guild_id: int, period: str):
+    """Переключатель периода итогов; текущий период отмечен точкой"""
+    switch = [
+        InlineKeyboardButton(f"• {title}" if option == period else title,
+                             callback_data=cb.encode(cb.PERIOD_SWITCH, guild_id, rollups.PERIOD_CODES[option]))
+        for option, title in PERIOD_BUTTONS.items()
+    ]
+    return InlineKeyboardMarkup([switch, [InlineKeyboardButton("❌ Закрыть", callback_data=cb.encode(cb.CLOSE))]])
+
+CHART_BUTTONS = {charts.CUMULATIVE: "Всего", charts.DAILY: "По дням", charts.TOP: "Топ"}
+CHART_TITLES = {
+    charts.CUMULATIVE: "сумма бустов за все время",
+    charts.DAILY: f"бусты по дням за {charts.CHART_DAYS} дней",
+    charts.TOP: f"топ-{charts.CHART_TOP_N} бустеров",
+}
+
+def create_chart_keyboard(guild_id: int, chart_type: str):
+    """Переключатель типа графика; текущий тип отмечен точкой"""
+    switch = [
+        InlineKeyboardButton(f"• {title}" if option == chart_type else title,
+                             callback_data=cb.encode(cb.CHART_SWITCH, guild_id, charts.CHART_CODES[option]))
+        for option, title in CHART_BUTTONS.items()
+    ]
+    return InlineKeyboardMarkup([switch, [InlineKeyboardButton("❌ Закрыть", callback_data=cb.encode(cb.CLOSE))]])
+
 def create_simple_keyboard():
     """Создает простую клавиатуру только с кнопкой закрытия"""
     keyboard = [
-        [InlineKeyboardButton("❌ Закрыть", callback_data="close_table")]
+        [InlineKeyboardButton("❌ Закрыть", callback_data=cb.encode(cb.CLOSE))]
     ]
     return InlineKeyboardMarkup(keyboard)
 
@@ -161,6 +225,27 @@ def split_long_message(message: str, max_length: int = 4000):
 
     return parts
 
+def split_message_by_lines(message: str, max_length: int = 4000):
+    """Разбивает HTML-сообщение только между строками: теги и экранированные символы не режутся,
+    открытый на месте разрыва <pre> закрывается и открывается заново в следующей части"""
+    parts = []
+    current = ""
+    in_pre = False
+
+    for line in message.splitlines(keepends=True):
+        closing = "</pre>" if in_pre else ""
+        # Закрывающий тег дописывается к своей части, чтобы не оставлять пустой <pre></pre>
+        if current and not (in_pre and line.startswith("</pre>")) \
+                and len(current) + len(line) + len(closing) > max_length:
+            parts.append(current + closing)
+            current = "<pre>" if in_pre else ""
+        current += line
+        in_pre = current.rfind("<pre>") > current.rfind("</pre>")
+
+    if current:
+        parts.append(current + ("</pre>" if in_pre else ""))
+    return parts
+
 def format_stats_from_db(db_stats):
     """Форматирует статистику по данным из БД с HTML разметкой"""
     if not db_stats:
@@ -175,36 +260,64 @@ def format_stats_from_db(db_stats):
     )
     return stats
 
-def format_full_table(df, start_idx: int = 0, chunk_size: int = None):
-    """Форматирует часть таблицы с HTML разметкой"""
-    if df.empty:
+def format_history_page(rows, page: int, total: int, page_size: int = HISTORY_PAGE_SIZE):
+    """Форматирует страницу истории бустов с HTML разметкой"""
+    if not rows:
         return "❌ Нет данных для отображения"
 
-    if chunk_size:
-        end_idx = min(start_idx + chunk_size, len(df))
-        df_chunk = df.iloc[start_idx:end_idx]
-        title = f"<b>📊 Таблица бустов (часть {start_idx // chunk_size + 1})</b>\n"
-        title += f"<b>Записи {start_idx + 1}-{end_idx} из {len(df)}</b>\n\n"
-    else:
-        df_chunk = df
-        title = f"<b>📊 Полная таблица бустов</b>\n"
-        title += f"<b>Всего записей: {len(df)}</b>\n\n"
-
-    table = title
+    start_idx = page * page_size
+    total_pages = (total + page_size - 1) // page_size
+    table = f"<b>📊 История бустов (страница {page + 1} из {total_pages})</b>\n"
+    table += f"<b>Записи {start_idx + 1}-{start_idx + len(rows)} из {total}</b>\n\n"
     table += "<pre>"
     table += f"{'№':<3} {'Бустер':<25} {'Сумма':<12} {'Дата':<18}\n"
     table += "-" * 65 + "\n"
 
-    for i, (_, row) in enumerate(df_chunk.iterrows(), start_idx + 1):
-        user = str(row['user_name'])[:24] if pd.notna(row['user_name']) else "Неизвестный"
-        amount = str(row['sum'])[:11] if pd.notna(row['sum']) else "0"
-        date = str(row['date_buster'])[:17] if pd.notna(row['date_buster']) else "Неизвестная дата"
+    for i, row in enumerate(rows, start_idx + 1):
+        user = str(row['user_name'])[:24] if row['user_name'] is not None else "Неизвестный"
+        amount = str(row['sum'])[:11] if row['sum'] is not None else "0"
+        date = row['date_buster'].strftime('%d.%m.%Y %H:%M') if row['date_buster'] is not None else "Неизвестная дата"
 
         table += f"{i:<3} {user:<25} {amount:<12} {date:<18}\n"
 
     table += "</pre>"
     return table
 
+PERIOD_TITLES = {rollups.DAY: "сегодня", rollups.WEEK: "эту неделю", rollups.MONTH: "этот месяц"}
+PREVIOUS_TITLES = {rollups.DAY: "вчера", rollups.WEEK: "прошлая неделя", rollups.MONTH: "прошлый месяц"}
+
+def format_period_summary(guild_name: str, summary):
+    """Форматирует итоги гильдии за период из предагрегатов с HTML разметкой"""
+    period = summary['period']
+    current, previous = summary['current'], summary['previous']
+    total = f"{int(current['total']):,} ⚡".replace(",", " ")
+    previous_total = f"{int(previous['total']):,} ⚡".replace(",", " ")
+
+    text = (
+        f"<b>📅 {html.escape(guild_name)}: итоги за {PERIOD_TITLES[period]}</b> "
+        f"(с {summary['bucket']:%d.%m.%Y})\n"
+        f"• Сумма: <code>{total}</code>\n"
+        f"• Бустов: <code>{current['donations']}</code>\n"
+        f"• Бустеров: <code>{current['boosters']}</code>\n"
+        f"• {PREVIOUS_TITLES[period].capitalize()}: <code>{previous_total}</code>, "
+        f"бустеров: <code>{previous['boosters']}</code>\n"
+    )
+    if summary['top']:
+        text += "\n" + format_top_donators_from_db(summary['top'], len(summary['top']))
+    else:
+        text += "\n<i>За этот период бустов пока нет</i>"
+    return text
+
+def format_rank_movement(movement):
+    """Движение в лидерборде за последний проход: ↑3, ↓1, new или пусто"""
+    if movement is None:
+        return "new"
+    if movement > 0:
+        return f"↑{movement}"
+    if movement < 0:
+        return f"↓{-movement}"
+    return ""
+
 def format_top_donators_from_db(db_data, top_n=20, show_all=False):
     """Форматирует топ бустеров в виде таблицы"""
     if not db_data:
@@ -215,17 +328,28 @@ def format_top_donators_from_db(db_data, top_n=20, show_all=False):
     else:
         top_text = f"<b>🏆 Топ-{min(top_n, len(db_data))} бустеров</b>\n\n"
 
-    top_text += "<pre>"
-    top_text += f"{'№':<3} {'Бустер':<20} {'Сумма':<12} {'Бустов':<8}\n"
-    top_text += "─" * 45 + "\n"
-
     display_data = db_data if show_all else db_data[:top_n]
+    # Движение в лидерборде есть только у общего топа; итоги за период его не содержат
+    show_movement = any(len(row) > 3 for row in display_data)
 
-    for i, (user_name, total_donated, donation_count) in enumerate(display_data, 1):
+    top_text += "<pre>"
+    if show_movement:
+        top_text += f"{'№':<3} {'Бустер':<20} {'Сумма':<12} {'Бустов':<7} {'Δ':<5}\n"
+        top_text += "─" * 51 + "\n"
+    else:
+        top_text += f"{'№':<3} {'Бустер':<20} {'Сумма':<12} {'Бустов':<8}\n"
+        top_text += "─" * 45 + "\n"
+
+    for i, row in enumerate(display_data, 1):
+        user_name, total_donated, donation_count = row[:3]
         user_display = user_name[:19]
         total_formatted = f"{total_donated:,} ⚡".replace(",", " ")
 
-        top_text += f"{i:<3} {user_display:<20} {total_formatted:<12} {donation_count:<8}\n"
+        if show_movement:
+            movement = format_rank_movement(row[3]) if len(row) > 3 else ""
+            top_text += f"{i:<3} {user_display:<20} {total_formatted:<12} {donation_count:<7} {movement:<5}\n"
+        else:
+            top_text += f"{i:<3} {user_display:<20} {total_formatted:<12} {donation_count:<8}\n"
 
     top_text += "</pre>"
 
@@ -270,7 +394,7 @@ def format_top_donators_without_footer(db_data, top_n=20):
 
     display_data = db_data[:top_n]
 
-    for i, (user_name, total_donated, donation_count) in enumerate(display_data, 1):
+    for i, (user_name, total_donated, donation_count, *_) in enumerate(display_data, 1):
         user_display = user_name[:19]
         total_formatted = f"{total_donated:,} ⚡".replace(",", " ")
 
@@ -318,94 +442,281 @@ async def send_complete_data(update: Update, context: ContextTypes.DEFAULT_TYPE,
         await update.message.reply_text("❌ Не удалось получить данные бустеров")
 
     # ПРЕДЛАГАЕМ ПОКАЗАТЬ ВСЮ ТАБЛИЦУ
-    choice_keyboard = create_choice_keyboard()
+    choice_keyboard = create_choice_keyboard(guild_registry.get_id(guild_name))
 
     await update.message.reply_text(
         "Хотите увидеть полную историю всех бустов?",
         reply_markup=choice_keyboard
     )
 
-    # Сохраняем данные в контексте
-    df_renamed = df.rename(columns={
-        'user_name': 'Пользователь',
-        'sum': 'Сумма',
-        'date_buster': 'Дата'
-    })
-
-    context.user_data['guild_name'] = guild_name
-    context.user_data['full_dataframe'] = df_renamed
-    context.user_data['web_page_url'] = web_page_url
+    # DataFrame в контексте не храним: история читается из БД постранично
+    user_state.set_view(context.user_data, guild_registry.get_id(guild_name))
 
-async def send_full_table(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_name: str):
-    """Отправляет полную историю бустов из БД"""
+async def send_history_page(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int, page: int,
+                            edit: bool = False):
+    """Показывает страницу истории бустов из БД; при листании редактирует то же сообщение"""
     query = update.callback_query
-    await query.answer()
+    guild_name = guild_registry.get_name(guild_id)
+    if guild_name is None:
+        await query.answer("❌ Гильдия не найдена", show_alert=True)
+        return
 
-    all_donations = db_manager.get_all_donations(guild_name)
+    page = max(page, 0)
+    rows, total = await asyncio.to_thread(
+        db_manager.get_donations_page, guild_name, page * HISTORY_PAGE_SIZE, HISTORY_PAGE_SIZE)
 
-    if not all_donations:
+    # Курсор мог устареть (записей стало меньше): возвращаемся на первую страницу
+    if not rows and total and page:
+        page = 0
+        rows, total = await asyncio.to_thread(db_manager.get_donations_page, guild_name, 0, HISTORY_PAGE_SIZE)
+
+    await query.answer()
+    if not rows:
         await query.message.reply_text("❌ В базе данных нет записей")
         return
 
-    df = pd.DataFrame(all_donations)
+    user_state.set_view(context.user_data, guild_id, page)
 
-    await query.message.reply_text("📊 Загружаю историю бустов из БД...")
+    total_pages = (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+    text = format_history_page(rows, page, total)
+    keyboard = create_history_keyboard(guild_id, page, total_pages)
+    if edit:
+        await query.message.edit_text(text, reply_markup=keyboard, parse_mode='HTML')
+    else:
+        await query.message.reply_text(text, reply_markup=keyboard, parse_mode='HTML')
 
-    chunk_size = 25
-    total_parts = (len(df) + chunk_size - 1) // chunk_size
+@rate_limited('history')
+async def handle_show_history(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int):
+    """Обработчик кнопки показа истории бустов: открывает ее на сохраненной странице"""
+    await send_history_page(update, context, guild_id, user_state.get_cursor(context.user_data, guild_id))
 
-    for part in range(total_parts):
-        start_idx = part * chunk_size
-        table_text = format_full_table(df, start_idx, chunk_size)
+@rate_limited('callback')
+async def handle_history_page(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int, page: int):
+    """Обработчик листания истории бустов"""
+    await send_history_page(update, context, guild_id, page, edit=True)
 
-        if part == 0:
-            keyboard = create_simple_keyboard()
-            await query.message.reply_text(
-                table_text,
-                reply_markup=keyboard,
-                parse_mode='HTML'
-            )
-        else:
-            await query.message.reply_text(
-                table_text,
-                parse_mode='HTML'
-            )
+@rate_limited('callback')
+async def handle_skip_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик отказа от показа истории бустов"""
+    query = update.callback_query
+    await query.answer()
+    await query.message.delete()
+    await query.message.reply_text("✅ Хорошо! Если понадобится полная таблица - просто запросите данные снова.")
+
+@rate_limited('view')
+async def handle_show_all(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int):
+    """Обработчик кнопки 'Показать всех'"""
+    guild_name = guild_registry.get_name(guild_id)
+    if guild_name is None:
+        await update.callback_query.answer("❌ Гильдия не найдена", show_alert=True)
+        return
+
+    await send_all_donators(update, context, guild_name)
 
-        await asyncio.sleep(0.5)
+def is_not_modified(error: BadRequest) -> bool:
+    """Telegram отклоняет правку, которая ничего не меняет: повторное нажатие уже выбранной кнопки"""
+    return 'message is not modified' in str(error).lower()
 
-async def handle_table_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обрабатывает выбор пользователя"""
+async def send_period_summary(update: Update, guild_id: int, period_code: int, edit: bool = False):
+    """Показывает итоги гильдии за день/неделю/месяц; при переключении периода редактирует то же сообщение"""
     query = update.callback_query
+    guild_name = guild_registry.get_name(guild_id)
+    period = next((name for name, code in rollups.PERIOD_CODES.items() if code == period_code), None)
+    if guild_name is None or period is None:
+        await query.answer("❌ Гильдия не найдена", show_alert=True)
+        return
+
+    summary = await asyncio.to_thread(db_manager.get_period_summary, guild_id, period)
+    if summary is None:
+        await query.answer("❌ Не удалось загрузить итоги, попробуйте позже", show_alert=True)
+        return
+
     await query.answer()
+    text = format_period_summary(guild_name, summary)
+    keyboard = create_period_keyboard(guild_id, period)
+    if edit:
+        try:
+            await query.message.edit_text(text, reply_markup=keyboard, parse_mode='HTML')
+        except BadRequest as e:
+            # Тот же период и новых бустов нет: сообщение уже актуально
+            if not is_not_modified(e):
+                raise
+    else:
+        await query.message.reply_text(text, reply_markup=keyboard, parse_mode='HTML')
+
+@rate_limited('view')
+async def handle_period(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int, period_code: int):
+    """Обработчик кнопок 'За неделю' / 'За месяц'"""
+    await send_period_summary(update, guild_id, period_code)
+
+@rate_limited('callback')
+async def handle_period_switch(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int, period_code: int):
+    """Обработчик переключения периода в сообщении с итогами"""
+    await send_period_summary(update, guild_id, period_code, edit=True)
+
+def load_chart_points(guild_id: int, guild_name: str, chart_type: str):
+    """Данные графика из предагрегатов: суммы по дням или лидерборд"""
+    if chart_type == charts.TOP:
+        leaders = db_manager.get_all_donations_grouped(guild_name, limit=charts.CHART_TOP_N) or []
+        return [(user_name, int(total)) for user_name, total, *_ in leaders]
+    since = None
+    if chart_type == charts.DAILY:
+        since = rollups.site_today() - datetime.timedelta(days=charts.CHART_DAYS - 1)
+    return db_manager.get_daily_totals(guild_id, since) or []
+
+async def reply_chart(query, photo, caption: str, keyboard, edit: bool):
+    if edit:
+        return await query.message.edit_media(InputMediaPhoto(photo, caption=caption), reply_markup=keyboard)
+    return await query.message.reply_photo(photo, caption=caption, reply_markup=keyboard)
+
+async def send_chart(update: Update, guild_id: int, chart_code: int, edit: bool = False):
+    """Показывает график гильдии. Та же версия данных отправляется по сохраненному file_id,
+    без рендера и загрузки; новая рендерится в пуле процессов и кэшируется PNG-файлом"""
+    query = update.callback_query
+    guild_name = guild_registry.get_name(guild_id)
+    chart_type = charts.chart_type_by_code(chart_code)
+    if guild_name is None or chart_type is None:
+        await query.answer("❌ Гильдия не найдена", show_alert=True)
+        return
 
-    data = query.data
-    guild_name = context.user_data.get('guild_name', 'Неизвестная гильдия')
+    cached = await asyncio.to_thread(db_manager.get_chart_file, guild_id, chart_type)
+    if cached is None:
+        await query.answer("❌ Не удалось загрузить график, попробуйте позже", show_alert=True)
+        return
+    await query.answer()
 
-    if data == "show_full":
-        await send_full_table(update, context, guild_name)
-    elif data == "show_partial":
-        await query.message.delete()
-        await query.message.reply_text("✅ Хорошо! Если понадобится полная таблица - просто запросите данные снова.")
-    elif data == "close_table":
-        await query.message.delete()
+    version, file_id = cached
+    caption = f"📈 {guild_name}: {CHART_TITLES[chart_type]}"
+    keyboard = create_chart_keyboard(guild_id, chart_type)
+    if file_id:
+        try:
+            await reply_chart(query, file_id, caption, keyboard, edit)
+            return
+        except BadRequest as e:
+            if is_not_modified(e):
+                # Выбран тот же график, что уже показан
+                return
+            # file_id больше не принимается (например, другой токен бота): загружаем файл заново
+            print(f"⚠️ file_id графика {chart_type} гильдии {guild_name} не принят: {e}")
+
+    path = charts.cache_path(guild_id, chart_type, version)
+    if not os.path.exists(path):
+        points = await asyncio.to_thread(load_chart_points, guild_id, guild_name, chart_type)
+        if not points:
+            await query.message.reply_text("❌ Для графика пока нет данных")
+            return
+        try:
+            await charts.render(chart_type, f"{guild_name}: {CHART_TITLES[chart_type]}", points, path)
+        except Exception as e:
+            print(f"❌ Ошибка рендера графика {chart_type} гильдии {guild_name}: {e}")
+            await query.message.reply_text("❌ Не удалось построить график, попробуйте позже")
+            return
+        charts.prune_cache(guild_id, chart_type, version)
 
-async def handle_show_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик кнопки 'Показать всех'"""
+    try:
+        with open(path, 'rb') as photo:
+            message = await reply_chart(query, photo, caption, keyboard, edit)
+    except BadRequest as e:
+        if not is_not_modified(e):
+            print(f"❌ Не удалось отправить график {chart_type} гильдии {guild_name}: {e}")
+            await query.message.reply_text("❌ Не удалось отправить график, попробуйте позже")
+        return
+    if message is not True and message.photo:
+        await asyncio.to_thread(db_manager.save_chart_file_id, guild_id, chart_type, version,
+                                message.photo[-1].file_id)
+
+@rate_limited('view')
+async def handle_chart(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int, chart_code: int):
+    """Обработчик кнопки '📈 График'"""
+    await send_chart(update, guild_id, chart_code)
+
+@rate_limited('callback')
+async def handle_chart_switch(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int, chart_code: int):
+    """Обработчик переключения типа графика"""
+    await send_chart(update, guild_id, chart_code, edit=True)
+
+async def set_subscription(update: Update, guild_id: int, subscribe: bool):
+    """Подписывает чат на гильдию или отписывает и обновляет кнопку под сообщением"""
     query = update.callback_query
-    await query.answer()
+    guild_name = guild_registry.get_name(guild_id)
+    if guild_name is None:
+        await query.answer("❌ Гильдия не найдена", show_alert=True)
+        return
 
-    data = query.data
-    guild_name = data.replace('show_all_', '')
+    chat_id = update.effective_chat.id
+    if subscribe:
+        success = await asyncio.to_thread(db_manager.subscribe, chat_id, guild_id)
+        text = f"🔔 Буду присылать новые бусты гильдии {guild_name}"
+    else:
+        success = await asyncio.to_thread(db_manager.unsubscribe, chat_id, guild_id)
+        text = f"🔕 Уведомления гильдии {guild_name} отключены"
 
-    await send_all_donators(update, context, guild_name)
+    if not success:
+        await query.answer("❌ Не удалось изменить подписку, попробуйте позже", show_alert=True)
+        return
+
+    await query.answer(text)
+    await query.message.edit_reply_markup(reply_markup=create_show_more_keyboard(guild_id, subscribe))
+
+@rate_limited('callback')
+async def handle_subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int):
+    """Обработчик кнопки подписки на новые бусты"""
+    await set_subscription(update, guild_id, True)
+
+@rate_limited('callback')
+async def handle_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int):
+    """Обработчик кнопки отписки от новых бустов"""
+    await set_subscription(update, guild_id, False)
+
+def format_booster_search(rows, query: str, max_users: int = 5):
+    """Форматирует результат /user: по каждому найденному нику - гильдии с суммой, числом и датой последнего буста"""
+    if not rows:
+        return f"❌ Бустер <b>{html.escape(query)}</b> не найден"
+
+    users = {}
+    for row in rows:
+        users.setdefault(row['user_name'], []).append(row)
+
+    text = ""
+    for user_name, guilds in list(users.items())[:max_users]:
+        guilds.sort(key=lambda row: row['total'], reverse=True)
+        total = sum(row['total'] for row in guilds)
+        count = sum(row['donations'] for row in guilds)
+        total_formatted = f"{total:,} ⚡".replace(",", " ")
+        text += f"<b>👤 {html.escape(user_name)}</b>: {total_formatted} за {count} бустов\n<pre>"
+        for row in guilds:
+            last_date = row['last_date'].strftime('%d.%m.%Y') if row['last_date'] else "—"
+            amount = f"{row['total']:,} ⚡".replace(",", " ")
+            text += f"{html.escape(row['guild_name'][:18]):<18} {amount:<12} {row['donations']:<6} {last_date}\n"
+        text += "</pre>\n"
+
+    if len(users) > max_users:
+        text += f"<i>... и еще {len(users) - max_users} ников с таким началом, уточните запрос</i>"
+    return text
+
+@rate_limited('view')
+async def handle_user_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /user <ник>: где и сколько бустил пользователь"""
+    query = ' '.join(context.args or []).strip()
+    if not query:
+        await update.message.reply_text("🔎 Укажите ник или его начало: <code>/user ник</code>", parse_mode='HTML')
+        return
+
+    rows = await asyncio.to_thread(db_manager.search_boosters, query)
+    if rows is None:
+        await update.message.reply_text("❌ Поиск сейчас недоступен, попробуйте позже")
+        return
+
+    for part in split_message_by_lines(format_booster_search(rows, query)):
+        await update.message.reply_text(part, parse_mode='HTML')
 
 async def show_guilds_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает список доступных гильдий"""
     guilds_text = "📋 Доступные гильдии:\n\n"
 
-    for i, (guild_name, url) in enumerate(GUILD_URLS.items(), 1):
+    for i, guild_name in enumerate(guild_registry.names(), 1):
         guilds_text += f"{i}. {guild_name}\n"
 
-    guilds_text += f"\nВсего гильдий: {len(GUILD_URLS)}"
+    guilds_text += f"\nВсего гильдий: {len(guild_registry)}"
 
     await update.message.reply_text(guilds_text)
\ No newline at end of file
@@ -0,0 +1,128 @@
+# Бенчмарк холодного старта: время импорта модуля бота в чистом процессе, память и самые тяжелые импорты
+#
+# Каждый прогон - отдельный интерпретатор с -X importtime, поэтому кэш модулей не влияет на результат.
+# Код выхода 1, если медиана превышает бюджет или при импорте загрузились запрещенные тяжелые пакеты.
+#
+# Запуск из корня репозитория:
+#   python -m benchmarks.bench_cold_start
+#   python -m benchmarks.bench_cold_start --module parser_service --forbid --budget-ms 3000
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# Пакеты, которые боту нужны только при ручном обновлении (parse_table)
+DEFAULT_FORBIDDEN = ['pandas', 'selenium', 'bs4', 'webdriver_manager', 'lxml']
+
+CHILD_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': seconds,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+    'forbidden': [name for name in {forbidden!r} if name in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr: str):
+    """Строки -X importtime -> {пакет верхнего уровня: собственное время, мкс}"""
+    by_package = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        by_package[package] = by_package.get(package, 0) + int(self_us)
+    return by_package
+
+
+def run_once(module: str, forbidden):
+    """Один холодный импорт в новом процессе"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT.format(module=module, forbidden=forbidden)],
+        capture_output=True, text=True, env=env,
+    )
+    wall_seconds = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"Импорт {module} завершился с ошибкой:\n{completed.stderr[-2000:]}")
+
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['process_seconds'] = wall_seconds
+    result['packages'] = parse_importtime(completed.stderr)
+    return result
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Холодный старт бота: время импорта и тяжелые зависимости")
+    arg_parser.add_argument('--module', default='main', help="какой модуль импортировать")
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--budget-ms', type=float, default=1000, help="бюджет медианы времени импорта")
+    arg_parser.add_argument('--forbid', nargs='*', default=DEFAULT_FORBIDDEN,
+                            help="пакеты, которые не должны загружаться при импорте (пусто - не проверять)")
+    arg_parser.add_argument('--top', type=int, default=10, help="сколько самых тяжелых пакетов показать")
+    arg_parser.add_argument('--json', help="куда сохранить результаты в JSON")
+    args = arg_parser.parse_args(argv)
+
+    runs = [run_once(args.module, args.forbid) for _ in range(args.repeat)]
+
+    import_ms = statistics.median(run['seconds'] for run in runs) * 1000
+    process_ms = statistics.median(run['process_seconds'] for run in runs) * 1000
+    max_rss_mb = max(run['max_rss_kb'] for run in runs) / 1024
+    forbidden = sorted({name for run in runs for name in run['forbidden']})
+
+    packages = {}
+    for run in runs:
+        for package, self_us in run['packages'].items():
+            packages.setdefault(package, []).append(self_us)
+    heaviest = sorted(((statistics.median(values) / 1000, package) for package, values in packages.items()),
+                      reverse=True)[:args.top]
+
+    print(f"🚀 import {args.module}: медиана {import_ms:.0f} мс (процесс целиком {process_ms:.0f} мс), "
+          f"бюджет {args.budget_ms:.0f} мс")
+    print(f"🧠 Пиковая память: {max_rss_mb:.1f} МБ, модулей загружено: {runs[0]['modules']}")
+    print(f"\n{'пакет':<28} {'мс':>8}")
+    for ms, package in heaviest:
+        print(f"{package:<28} {ms:>8.1f}")
+
+    within_budget = import_ms <= args.budget_ms
+    if forbidden:
+        print(f"\n❌ При импорте загружены тяжелые пакеты: {', '.join(forbidden)}")
+    if not within_budget:
+        print(f"\n❌ Бюджет холодного старта превышен: {import_ms:.0f} > {args.budget_ms:.0f} мс")
+    if within_budget and not forbidden:
+        print("\n✅ Холодный старт в пределах бюджета")
+
+    report = {
+        'benchmark': 'cold_start',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'config': vars(args),
+        'import_ms_median': round(import_ms, 1),
+        'process_ms_median': round(process_ms, 1),
+        'max_rss_mb': round(max_rss_mb, 1),
+        'forbidden_loaded': forbidden,
+        'heaviest_packages_ms': {package: round(ms, 1) for ms, package in heaviest},
+        'within_budget': within_budget,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Результаты сохранены в {args.json}")
+
+    return report
+
+
+if __name__ == '__main__':
+    result = main()
+    sys.exit(0 if result['within_budget'] and not result['forbidden_loaded'] else 1)
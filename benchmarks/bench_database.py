@@ -0,0 +1,244 @@
+# Бенчмарк путей чтения и записи DatabaseManager на синтетических данных
+#
+# Наполняет отдельную базу синтетическими гильдиями и донатами, замеряет каждый метод DatabaseManager,
+# считает подключения и обращения к серверу на вызов и сохраняет результаты в JSON для сравнения между коммитами.
+#
+# Запуск из корня репозитория против локального MySQL/MariaDB (настройки из MYSQLHOST/DB_HOST и т.д.):
+#   python -m benchmarks.bench_database --database regilda_bench --big-rows 100000 --guilds 200
+# или против встроенного SQLite:
+#   python -m benchmarks.bench_database --backend sqlite --sqlite-path bench_regilda.db
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+from date_normalizer import normalize_date
+from benchmarks.snapshots import generate_rows
+
+
+class QueryCounter:
+    """Считает подключения и обращения к серверу (execute/executemany/commit)"""
+
+    def __init__(self):
+        self.connections = 0
+        self.round_trips = 0
+
+    def reset(self):
+        self.connections = 0
+        self.round_trips = 0
+
+    def wrap_connection(self, connection):
+        if connection is None:
+            return None
+        self.connections += 1
+        return CountingConnection(connection, self)
+
+
+class CountingCursor:
+    def __init__(self, cursor, counter: QueryCounter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter.round_trips += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._counter.round_trips += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CountingConnection:
+    def __init__(self, connection, counter: QueryCounter):
+        self._connection = connection
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._connection.cursor(*args, **kwargs), self._counter)
+
+    def commit(self):
+        self._counter.round_trips += 1
+        return self._connection.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def instrument(manager, counter: QueryCounter):
+    """Подменяет подключения менеджера на считающие обертки"""
+    original_connect = manager.connect
+    manager.connect = lambda: counter.wrap_connection(original_connect())
+
+    # check_database_exists/create_database подключаются к серверу MySQL без выбора базы
+    if hasattr(manager.backend, 'connect_server'):
+        original_server_connect = manager.backend.connect_server
+        manager.backend.connect_server = lambda: counter.wrap_connection(original_server_connect())
+
+
+def to_dataframe(rows):
+    return pd.DataFrame(rows, columns=['Пользователь', 'Сумма', 'Дата'])
+
+
+def seed_guild(manager, guild_name: str, rows):
+    """Быстро заливает донаты пачкой, минуя save_donations; дубликаты по уникальному ключу отбрасываются заранее"""
+    manager.save_guild(guild_name, f"https://remanga.org/guild/{guild_name.lower()}/settings/donations")
+    table_name = manager.get_safe_table_name(guild_name)
+
+    unique = {}
+    for user, amount, date in rows:
+        key = (str(user)[:25], amount, normalize_date(date))
+        unique[key] = key
+
+    connection = manager.connect()
+    try:
+        cursor = connection.cursor()
+        values = list(unique.values())
+        for start in range(0, len(values), 5000):
+            cursor.executemany(
+                f"INSERT INTO `{table_name}` (user_name, sum, date_buster) VALUES (%s, %s, %s)",
+                values[start:start + 5000],
+            )
+        connection.commit()
+    finally:
+        connection.close()
+    return len(unique)
+
+
+def time_call(counter: QueryCounter, func, *args, repeat: int = 3, **kwargs):
+    """Медиана времени вызова и число подключений/обращений за один вызов"""
+    durations = []
+    counts = None
+    for _ in range(repeat):
+        counter.reset()
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        durations.append(time.perf_counter() - start)
+        if counts is None:
+            counts = (counter.connections, counter.round_trips)
+    return {
+        'median_seconds': round(statistics.median(durations), 5),
+        'min_seconds': round(min(durations), 5),
+        'connections': counts[0],
+        'round_trips': counts[1],
+    }
+
+
+def bench_guild(manager, counter, guild_name, new_rows, repeat):
+    """Замеряет все методы чтения и запись новой пачки для одной гильдии"""
+    results = {}
+    df_new = to_dataframe(new_rows)
+
+    results['get_existing_donations_set'] = time_call(counter, manager.get_existing_donations_set, guild_name, repeat=repeat)
+    results['get_all_donations_grouped'] = time_call(counter, manager.get_all_donations_grouped, guild_name, repeat=repeat)
+    results['get_all_donations_grouped_1000'] = time_call(
+        counter, manager.get_all_donations_grouped, guild_name, limit=1000, repeat=repeat)
+    results['get_detailed_stats'] = time_call(counter, manager.get_detailed_stats, guild_name, repeat=repeat)
+    results['get_all_donations'] = time_call(counter, manager.get_all_donations, guild_name, repeat=repeat)
+    results['get_new_donations_stats'] = time_call(counter, manager.get_new_donations_stats, df_new, guild_name, repeat=repeat)
+    # Первый вызов вставляет строки, повторные проверяют путь "все уже есть"
+    results['save_donations'] = time_call(counter, manager.save_donations, df_new, guild_name, repeat=1)
+    results['save_donations_all_duplicates'] = time_call(counter, manager.save_donations, df_new, guild_name, repeat=repeat)
+    return results
+
+
+def print_report(title, results):
+    print(f"\n{title}")
+    print(f"{'метод':<34} {'медиана, с':>11} {'мин, с':>9} {'подкл.':>7} {'запросов':>9}")
+    for method, result in results.items():
+        print(f"{method:<34} {result['median_seconds']:>11.4f} {result['min_seconds']:>9.4f} "
+              f"{result['connections']:>7} {result['round_trips']:>9}")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк DatabaseManager на синтетических данных")
+    arg_parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=os.getenv('DB_BACKEND', 'mysql'))
+    arg_parser.add_argument('--database', default='regilda_bench', help="отдельная база MySQL для бенчмарка")
+    arg_parser.add_argument('--sqlite-path', default='bench_regilda.db', help="файл базы для --backend sqlite")
+    arg_parser.add_argument('--big-rows', type=int, default=100000, help="донатов в самой крупной гильдии")
+    arg_parser.add_argument('--guilds', type=int, default=200, help="сколько всего гильдий (таблиц)")
+    arg_parser.add_argument('--rows-per-guild', type=int, default=500, help="донатов в остальных гильдиях")
+    arg_parser.add_argument('--new-rows', type=int, default=1000, help="размер пачки для save_donations")
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--keep', action='store_true', help="не удалять гильдии после прогона")
+    arg_parser.add_argument('--json', help="куда сохранить результаты в JSON")
+    args = arg_parser.parse_args(argv)
+
+    if args.database == 'railway':
+        arg_parser.error("бенчмарк не запускается на рабочей базе railway")
+
+    # Хранилище выбирается при создании DatabaseManager, поэтому окружение настраиваем до импорта
+    os.environ['DB_BACKEND'] = args.backend
+    os.environ['SQLITE_PATH'] = args.sqlite_path
+    os.environ['MYSQLDATABASE'] = args.database
+    from database import DatabaseManager
+
+    manager = DatabaseManager()
+    counter = QueryCounter()
+    instrument(manager, counter)
+
+    guild_names = ['Bench Big'] + [f"Bench Guild {i:03d}" for i in range(1, args.guilds)]
+    report = {
+        'benchmark': 'database',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'config': vars(args),
+    }
+
+    try:
+        if not manager.setup_database():
+            print("❌ Не удалось подключиться к базе данных для бенчмарка")
+            return None
+
+        print(f"🌱 Наполняем {len(guild_names)} гильдий...")
+        seed_start = time.perf_counter()
+        seeded = {}
+        for i, guild_name in enumerate(guild_names):
+            rows = args.big_rows if i == 0 else args.rows_per_guild
+            seeded[guild_name] = seed_guild(manager, guild_name, generate_rows(rows, seed=i))
+        report['seed_seconds'] = round(time.perf_counter() - seed_start, 2)
+        report['seeded_rows'] = seeded
+
+        # Новая пачка: половина пересекается с уже сохраненными строками
+        big_rows = generate_rows(args.big_rows, seed=0)
+        new_rows = big_rows[:args.new_rows // 2] + generate_rows(args.new_rows - args.new_rows // 2, seed=10 ** 6)
+        report['big_guild'] = bench_guild(manager, counter, guild_names[0], new_rows, args.repeat)
+        print_report(f"Гильдия '{guild_names[0]}' ({seeded[guild_names[0]]} строк)", report['big_guild'])
+
+        small_guild = guild_names[-1]
+        small_new = generate_rows(args.rows_per_guild, seed=len(guild_names) - 1)[:args.new_rows // 2]
+        report['small_guild'] = bench_guild(manager, counter, small_guild, small_new, args.repeat)
+        print_report(f"Гильдия '{small_guild}' ({seeded[small_guild]} строк)", report['small_guild'])
+
+        report['guild_registry'] = {
+            'load_all_guilds': time_call(counter, manager.load_all_guilds, repeat=args.repeat),
+            'load_guild_records': time_call(counter, manager.load_guild_records, repeat=args.repeat),
+        }
+        print_report(f"Реестр ({len(guild_names)} гильдий)", report['guild_registry'])
+    finally:
+        if not args.keep:
+            print("\n🧹 Удаляем гильдии бенчмарка...")
+            for guild_name in guild_names:
+                manager.delete_guild(guild_name)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Результаты сохранены в {args.json}")
+
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+# Офлайн-бенчмарк пути HTML -> строки -> DataFrame из parse_table
+#
+# Запуск из корня репозитория:
+#   python -m benchmarks.bench_parsing
+#   python -m benchmarks.bench_parsing --sizes 100 1000 --repeat 5 --json bench_parsing.json
+#   python -m benchmarks.bench_parsing --snapshot debug_page.html
+#   python -m benchmarks.bench_parsing --engines lxml_subtree --workers 4
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from bs4 import BeautifulSoup
+from lxml import html as lxml_html
+
+from parser import find_table_container, extract_rows, build_donations_dataframe
+from table_extract import find_container, extract_container_rows, extract_table_rows, TABLE_SELECTORS
+from benchmarks.snapshots import generate_page
+
+DEFAULT_SIZES = [100, 1000, 10000]
+
+# html.parser - прежний путь через BeautifulSoup по всей странице;
+# lxml - вся страница через lxml; lxml_subtree - только outerHTML контейнера таблицы, как в parse_table
+ENGINES = ['html.parser', 'lxml', 'lxml_subtree']
+
+
+def subtree_html(page_html):
+    """outerHTML контейнера таблицы, который parse_table получает из браузера"""
+    container, _ = find_container(lxml_html.fromstring(page_html))
+    if container is None:
+        raise ValueError("В снимке не найдена таблица донатов")
+    return lxml_html.tostring(container, encoding='unicode')
+
+
+def run_pipeline(page_html, engine='html.parser'):
+    """Один прогон пайплайна; возвращает (число строк, длительности стадий)"""
+    timings = {}
+
+    start = time.perf_counter()
+    if engine == 'html.parser':
+        soup = BeautifulSoup(page_html, 'html.parser')
+        table_container, _ = find_table_container(soup)
+    else:
+        root = lxml_html.fromstring(page_html)
+        table_container = root if engine == 'lxml_subtree' else find_container(root)[0]
+    timings['parse_html'] = time.perf_counter() - start
+    if table_container is None:
+        raise ValueError("В снимке не найдена таблица донатов")
+
+    start = time.perf_counter()
+    if engine == 'html.parser':
+        rows, _ = extract_rows(table_container)
+    else:
+        rows, _ = extract_container_rows(table_container)
+    timings['extract_rows'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df = build_donations_dataframe(rows)
+    timings['normalize'] = time.perf_counter() - start
+
+    timings['total'] = sum(timings.values())
+    return len(df), len(rows), timings
+
+
+def measure_peak_memory(page_html, engine):
+    """Пиковое потребление памяти одним прогоном (по tracemalloc), в МБ"""
+    tracemalloc.start()
+    try:
+        run_pipeline(page_html, engine)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def bench_snapshot(name, page_html, repeat, engine='html.parser'):
+    """Прогоняет снимок repeat раз и считает медианы по стадиям"""
+    if engine == 'lxml_subtree':
+        page_html = subtree_html(page_html)
+
+    runs = []
+    rows = extracted = 0
+    for _ in range(repeat):
+        rows, extracted, timings = run_pipeline(page_html, engine)
+        runs.append(timings)
+
+    medians = {stage: statistics.median(run[stage] for run in runs) for stage in runs[0]}
+    return {
+        'snapshot': name,
+        'engine': engine,
+        'html_bytes': len(page_html.encode('utf-8')),
+        'rows_extracted': extracted,
+        'rows_unique': rows,
+        'repeat': repeat,
+        'median_seconds': {stage: round(value, 6) for stage, value in medians.items()},
+        'rows_per_sec': round(extracted / medians['total'], 1) if medians['total'] else None,
+        'peak_memory_mb': round(measure_peak_memory(page_html, engine), 2),
+    }
+
+
+def bench_pool(page_html, workers, pages):
+    """Пропускная способность разбора: pages страниц в текущем процессе и в пуле из workers процессов"""
+    fragment = subtree_html(page_html)
+    selector = TABLE_SELECTORS[0]
+
+    start = time.perf_counter()
+    for _ in range(pages):
+        extract_table_rows(fragment, selector)
+    inline_seconds = time.perf_counter() - start
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        # Прогрев: запуск процессов не входит в замер
+        list(pool.map(extract_table_rows, [fragment] * workers, [selector] * workers))
+        start = time.perf_counter()
+        list(pool.map(extract_table_rows, [fragment] * pages, [selector] * pages))
+        pool_seconds = time.perf_counter() - start
+
+        # Разбор по одной странице с ожиданием результата, как шаг прокрутки во вкладке
+        start = time.perf_counter()
+        for _ in range(pages):
+            pool.submit(extract_table_rows, fragment, selector).result()
+        blocking_seconds = time.perf_counter() - start
+
+    return {
+        'workers': workers,
+        'pages': pages,
+        'inline_pages_per_sec': round(pages / inline_seconds, 1),
+        'pool_pages_per_sec': round(pages / pool_seconds, 1),
+        'blocking_pages_per_sec': round(pages / blocking_seconds, 1),
+    }
+
+
+def print_report(results):
+    header = f"{'снимок':<24} {'движок':<13} {'строк':>7} {'html, КБ':>9} {'parse':>8} {'extract':>8} {'norm':>8} {'строк/с':>10} {'пик, МБ':>8}"
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        median = result['median_seconds']
+        print(
+            f"{result['snapshot']:<24} {result['engine']:<13} {result['rows_extracted']:>7} {result['html_bytes'] / 1024:>9.0f} "
+            f"{median['parse_html']:>8.3f} {median['extract_rows']:>8.3f} {median['normalize']:>8.3f} "
+            f"{result['rows_per_sec']:>10.0f} {result['peak_memory_mb']:>8.1f}"
+        )
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк извлечения и нормализации строк донатов без сети")
+    arg_parser.add_argument('--sizes', type=int, nargs='*', default=DEFAULT_SIZES,
+                            help="размеры синтетических страниц в строках")
+    arg_parser.add_argument('--snapshot', action='append', default=[],
+                            help="сохраненная страница (например, debug_page.html); можно указать несколько раз")
+    arg_parser.add_argument('--repeat', type=int, default=3, help="число прогонов на снимок")
+    arg_parser.add_argument('--engines', nargs='*', choices=ENGINES, default=ENGINES, help="какие пути разбора сравнить")
+    arg_parser.add_argument('--workers', type=int, default=0,
+                            help="замерить разбор в пуле из N процессов на самом крупном снимке")
+    arg_parser.add_argument('--json', help="куда сохранить результаты в JSON")
+    args = arg_parser.parse_args(argv)
+
+    snapshots = []
+    for path in args.snapshot:
+        with open(path, encoding='utf-8') as f:
+            snapshots.append((os.path.basename(path), f.read()))
+    for size in args.sizes:
+        snapshots.append((f"synthetic_{size}", generate_page(size)))
+
+    results = [
+        bench_snapshot(name, page_html, args.repeat, engine)
+        for name, page_html in snapshots
+        for engine in args.engines
+    ]
+    print_report(results)
+
+    pool = None
+    if args.workers:
+        largest = max(snapshots, key=lambda snapshot: len(snapshot[1]))[1]
+        pool = bench_pool(largest, args.workers, pages=args.workers * 4)
+        print(f"\n🧵 Пул из {pool['workers']} процессов: {pool['pool_pages_per_sec']} стр/с "
+              f"(в одном процессе: {pool['inline_pages_per_sec']} стр/с, "
+              f"по одной с ожиданием: {pool['blocking_pages_per_sec']} стр/с)")
+
+    if args.json:
+        report = {
+            'benchmark': 'parsing',
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'results': results,
+            'pool': pool,
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Результаты сохранены в {args.json}")
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
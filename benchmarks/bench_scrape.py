@@ -0,0 +1,114 @@
+# Сквозной бенчмарк parse_table против локального стенда remanga с локальным headless Chrome
+#
+# Запуск из корня репозитория (нужен установленный Chrome; без сети укажите CHROMEDRIVER_PATH):
+#   python -m benchmarks.bench_scrape --rows 500 --guilds 2 --concurrency 2 --json bench_scrape.json
+#   python -m benchmarks.bench_scrape --rows 5000 --http   # быстрый путь через API, Chrome не нужен
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_remanga import FakeRemangaServer
+
+
+def configure_environment(server: FakeRemangaServer, remote_url: str = None, http: bool = False):
+    """Направляет парсер на стенд; вызывать до импорта parser"""
+    os.environ['REMANGA_BASE_URL'] = server.base_url
+    os.environ['REMANGALOGIN_USERNAME'] = server.state.username
+    os.environ['REMANGALOGIN_PASSWORD'] = server.state.password
+    # Без --remote сразу идем в локальный Chrome, не дожидаясь таймаута standalone-сервиса
+    os.environ['STANDALONE_CHROME_URL'] = remote_url or 'http://127.0.0.1:9'
+    os.environ.pop('RUSSIAN_PROXY_URL', None)
+
+    # Быстрый путь получает готовую сессию стенда, как будто cookies сохранены из браузера
+    os.environ['HTTP_FAST_PATH'] = '1' if http else '0'
+    if http:
+        cookies_path = os.path.join(tempfile.mkdtemp(prefix='bench_scrape_'), 'cookies.json')
+        with open(cookies_path, 'w', encoding='utf-8') as f:
+            json.dump([{'domain': server.httpd.server_address[0], 'name': 'token', 'value': server.state.new_session()}], f)
+        os.environ['REMANGA_COOKIES_PATH'] = cookies_path
+
+
+def run_scrape(parse_table, url: str):
+    start = time.perf_counter()
+    df = parse_table(url)
+    return {'url': url, 'rows': len(df), 'seconds': time.perf_counter() - start}
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Сквозной замер parse_table на локальном стенде")
+    arg_parser.add_argument('--rows', type=int, default=500, help="донатов в каждой гильдии")
+    arg_parser.add_argument('--page-size', type=int, default=50)
+    arg_parser.add_argument('--window', type=int, default=100)
+    arg_parser.add_argument('--render-latency-ms', type=int, default=200)
+    arg_parser.add_argument('--guilds', type=int, default=1, help="сколько гильдий парсить")
+    arg_parser.add_argument('--concurrency', type=int, default=1, help="одновременных parse_table")
+    arg_parser.add_argument('--remote', help="URL Selenium Grid вместо локального Chrome")
+    arg_parser.add_argument('--http', action='store_true', help="парсить через API с cookies сессии, без браузера")
+    arg_parser.add_argument('--json', help="куда сохранить результаты в JSON")
+    args = arg_parser.parse_args(argv)
+
+    server = FakeRemangaServer(rows=args.rows, page_size=args.page_size, window=args.window,
+                               render_latency_ms=args.render_latency_ms).start()
+    configure_environment(server, args.remote, args.http)
+
+    # Импортируем после настройки окружения: parser читает REMANGA_BASE_URL при импорте
+    from parser import parse_table
+    from metrics import histogram_summary
+
+    urls = [server.guild_url(f"bench-guild-{i}") for i in range(args.guilds)]
+    print(f"🧪 Стенд: {server.base_url}, гильдий: {len(urls)}, параллельно: {args.concurrency}")
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            scrapes = list(executor.map(lambda url: run_scrape(parse_table, url), urls))
+        # Замер до остановки стенда: shutdown() ждет до интервала опроса сервера (0.5 с)
+        wall_seconds = time.perf_counter() - started
+    finally:
+        server.stop()
+
+    total_rows = sum(scrape['rows'] for scrape in scrapes)
+    durations = [scrape['seconds'] for scrape in scrapes]
+    phases = {
+        name: {'p50': summary['p50'], 'max': summary['max']}
+        for name, summary in histogram_summary().items()
+        if name.startswith('scrape')
+    }
+
+    report = {
+        'benchmark': 'scrape',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'config': vars(args),
+        'wall_seconds': round(wall_seconds, 2),
+        'rows_expected': args.rows * args.guilds,
+        'rows_scraped': total_rows,
+        'rows_per_sec': round(total_rows / wall_seconds, 1) if wall_seconds else None,
+        'scrape_seconds_median': round(statistics.median(durations), 2) if durations else None,
+        'server_requests': server.state.requests,
+        'scrapes': scrapes,
+        'phases': phases,
+    }
+
+    print(f"\n⏱️ Общее время: {report['wall_seconds']} с, медиана одной гильдии: {report['scrape_seconds_median']} с")
+    print(f"📊 Строк: {total_rows} из {report['rows_expected']}, {report['rows_per_sec']} строк/с")
+    for name, summary in sorted(phases.items()):
+        print(f"  {name:<60} p50={summary['p50']:.2f} с  max={summary['max']:.2f} с")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+        print(f"💾 Результаты сохранены в {args.json}")
+
+    return report
+
+
+if __name__ == '__main__':
+    main()
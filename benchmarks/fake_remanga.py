@@ -0,0 +1,325 @@
+# Локальный стенд remanga для воспроизводимых замеров parse_table без сети
+#
+# Повторяет то, на что опирается парсер: кнопку UserAuthButtonMenuItem с модальным окном входа,
+# страницу /guild/<slug>/settings/donations с VirtualizedDataTable, которая догружает строки
+# при прокрутке и держит в DOM только окно последних строк, и JSON-эндпоинт с донатами.
+#
+# Запуск отдельно:
+#   python -m benchmarks.fake_remanga --rows 2000 --page-size 50 --render-latency-ms 300
+import argparse
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.snapshots import generate_donations, format_site_date, render_row, ROW_HEIGHT
+
+SESSION_COOKIE = 'token'
+
+MAIN_PAGE = """<!DOCTYPE html>
+<html lang="ru">
+<head><meta charset="utf-8"><title>Remanga (локальный стенд)</title></head>
+<body>
+<header>
+{auth_block}
+</header>
+<main><h1>Каталог</h1></main>
+<div id="modal-root"></div>
+<script>
+  const button = document.querySelector("button[data-sentry-component='UserAuthButtonMenuItem']");
+  if (button) {{
+    button.addEventListener('click', () => {{
+      setTimeout(() => {{
+        document.getElementById('modal-root').innerHTML = `
+          <div role="dialog" data-sentry-component="AuthModal">
+            <form method="post" action="/api/v2/auth/login/">
+              <input name="login" type="text" placeholder="Логин или email">
+              <input name="password" type="password" placeholder="Пароль">
+              <button type="submit">Войти</button>
+            </form>
+          </div>`;
+      }}, {modal_delay_ms});
+    }});
+  }}
+</script>
+</body>
+</html>
+"""
+
+DONATIONS_PAGE = """<!DOCTYPE html>
+<html lang="ru">
+<head><meta charset="utf-8"><title>Бусты гильдии {slug}</title></head>
+<body>
+<main>
+<div data-sentry-component="GuildDonationsList" style="height: 600px; overflow-y: auto; position: relative">
+<div data-sentry-component="VirtualizedDataTable">
+<table class="w-full caption-bottom text-sm">
+<thead><tr><th>Пользователь</th><th>Сумма</th><th>Дата</th></tr></thead>
+<tbody id="rows" style="height: 0px; position: relative; display: block"></tbody>
+</table>
+</div>
+</div>
+</main>
+<script>
+  const list = document.querySelector("div[data-sentry-component='GuildDonationsList']");
+  const body = document.getElementById('rows');
+  const windowSize = {window};
+  const rowHeight = {row_height};
+  const renderLatency = {render_latency_ms};
+  let nextPage = 1;
+  let loading = false;
+  let finished = false;
+
+  async function loadPage() {{
+    if (loading || finished) return;
+    loading = true;
+    const response = await fetch(`/guild/{slug}/settings/donations/rows?page=${{nextPage}}`);
+    const data = await response.json();
+    setTimeout(() => {{
+      body.insertAdjacentHTML('beforeend', data.html);
+      body.style.height = `${{data.loaded * rowHeight}}px`;
+      // Виртуализация: в DOM остаются только последние windowSize строк
+      while (body.children.length > windowSize) body.removeChild(body.firstElementChild);
+      finished = !data.has_more;
+      nextPage += 1;
+      loading = false;
+    }}, renderLatency);
+  }}
+
+  list.addEventListener('scroll', () => {{
+    if (list.scrollTop + list.clientHeight >= list.scrollHeight - rowHeight * 2) loadPage();
+  }});
+  loadPage();
+</script>
+</body>
+</html>
+"""
+
+
+class FakeRemangaState:
+    """Данные и настройки стенда"""
+
+    def __init__(self, rows: int = 1000, page_size: int = 50, window: int = 100,
+                 render_latency_ms: int = 200, response_latency_ms: int = 0, modal_delay_ms: int = 300,
+                 username: str = 'bench', password: str = 'bench', seed: int = 42):
+        self.page_size = page_size
+        self.window = window
+        self.render_latency_ms = render_latency_ms
+        self.response_latency_ms = response_latency_ms
+        self.modal_delay_ms = modal_delay_ms
+        self.username = username
+        self.password = password
+        self.donations = generate_donations(rows, seed=seed)
+        self.sessions = set()
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def new_session(self) -> str:
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.sessions.add(token)
+        return token
+
+    def page(self, page: int, count: int = None):
+        count = count or self.page_size
+        start = (page - 1) * count
+        return self.donations[start:start + count], start, start + count < len(self.donations)
+
+
+class FakeRemangaHandler(BaseHTTPRequestHandler):
+    state: FakeRemangaState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _session(self):
+        cookies = self.headers.get('Cookie', '')
+        for part in cookies.split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == SESSION_COOKIE and value in self.state.sessions:
+                return value
+        auth = self.headers.get('Authorization', '')
+        if auth.startswith('bearer ') or auth.startswith('Bearer '):
+            token = auth.split(' ', 1)[1]
+            if token in self.state.sessions:
+                return token
+        return None
+
+    def _send(self, status: int, body: str, content_type: str = 'text/html; charset=utf-8', headers=None):
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, status: int, data):
+        self._send(status, json.dumps(data, ensure_ascii=False), 'application/json; charset=utf-8')
+
+    def _redirect(self, location: str, headers=None):
+        self.send_response(303)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_GET(self):
+        with self.state.lock:
+            self.state.requests += 1
+        if self.state.response_latency_ms:
+            time.sleep(self.state.response_latency_ms / 1000)
+
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        query = parse_qs(url.query)
+        session = self._session()
+
+        if not parts:
+            if session:
+                auth_block = '<button data-sentry-component="UserProfileMenu">Профиль</button>'
+            else:
+                auth_block = '<button data-sentry-component="UserAuthButtonMenuItem">Вход/Регистрация</button>'
+            self._send(200, MAIN_PAGE.format(auth_block=auth_block, modal_delay_ms=self.state.modal_delay_ms))
+            return
+
+        if parts[0] == 'signin':
+            self._send(200, '<html><body><h1>Вход</h1></body></html>')
+            return
+
+        # /guild/<slug>/settings/donations[/rows]
+        if len(parts) >= 4 and parts[0] == 'guild' and parts[2:4] == ['settings', 'donations']:
+            slug = parts[1]
+            if not session:
+                self._redirect(f"/signin?next={url.path}")
+                return
+            if len(parts) == 4:
+                self._send(200, DONATIONS_PAGE.format(
+                    slug=slug,
+                    window=self.state.window,
+                    row_height=ROW_HEIGHT,
+                    render_latency_ms=self.state.render_latency_ms,
+                ))
+                return
+            if parts[4] == 'rows':
+                page = int(query.get('page', ['1'])[0])
+                donations, start, has_more = self.state.page(page)
+                html_rows = ''.join(
+                    render_row(start + i, d['user'], d['amount'], format_site_date(d['created_at']))
+                    for i, d in enumerate(donations)
+                )
+                self._send_json(200, {'html': html_rows, 'loaded': start + len(donations), 'has_more': has_more})
+                return
+
+        # /api/v2/guilds/<slug>/donations/?page=N&count=M
+        if parts[:2] == ['api', 'v2'] and len(parts) >= 4 and parts[2] == 'guilds' and parts[4:5] == ['donations']:
+            if not session:
+                self._send_json(401, {'msg': 'Учетные данные не были предоставлены.'})
+                return
+            page = int(query.get('page', ['1'])[0])
+            count = int(query.get('count', [str(self.state.page_size)])[0])
+            donations, _, has_more = self.state.page(page, count)
+            total = len(self.state.donations)
+            self._send_json(200, {
+                'content': [
+                    {
+                        'user': {'username': d['user']},
+                        'amount': d['amount'],
+                        'created_at': d['created_at'].strftime('%Y-%m-%dT%H:%M:%S+03:00'),
+                    }
+                    for d in donations
+                ],
+                'props': {
+                    'page': page,
+                    'count': count,
+                    'total_items': total,
+                    'total_pages': (total + count - 1) // count,
+                    'has_next': has_more,
+                },
+            })
+            return
+
+        self._send(404, '<html><body>Не найдено</body></html>')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/api/v2/auth/login':
+            self._send(404, '')
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        login = form.get('login', [''])[0]
+        password = form.get('password', [''])[0]
+
+        if login != self.state.username or password != self.state.password:
+            self._redirect('/signin?error=1')
+            return
+
+        token = self.state.new_session()
+        self._redirect('/', headers={'Set-Cookie': f"{SESSION_COOKIE}={token}; Path=/; HttpOnly"})
+
+
+class FakeRemangaServer:
+    """HTTP-сервер стенда в фоновом потоке"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, **state_options):
+        self.state = FakeRemangaState(**state_options)
+        handler = type('BoundFakeRemangaHandler', (FakeRemangaHandler,), {'state': self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def guild_url(self, slug: str) -> str:
+        return f"{self.base_url}/guild/{slug}/settings/donations"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='fake-remanga', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Локальный стенд remanga")
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8765)
+    arg_parser.add_argument('--rows', type=int, default=1000, help="число донатов в гильдии")
+    arg_parser.add_argument('--page-size', type=int, default=50, help="строк за одну догрузку")
+    arg_parser.add_argument('--window', type=int, default=100, help="сколько строк таблица держит в DOM")
+    arg_parser.add_argument('--render-latency-ms', type=int, default=200, help="задержка отрисовки догруженных строк")
+    arg_parser.add_argument('--response-latency-ms', type=int, default=0, help="задержка каждого GET-ответа")
+    args = arg_parser.parse_args(argv)
+
+    server = FakeRemangaServer(
+        host=args.host, port=args.port, rows=args.rows, page_size=args.page_size, window=args.window,
+        render_latency_ms=args.render_latency_ms, response_latency_ms=args.response_latency_ms,
+    )
+    print(f"🧪 Стенд remanga: {server.base_url} (логин/пароль: {server.state.username}/{server.state.password})")
+    print(f"🔗 Пример гильдии: {server.guild_url('bench-guild')}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# Синтетические HTML-снимки страницы донатов remanga для офлайн-бенчмарков
+import datetime
+import html
+import random
+
+MONTHS = ['янв.', 'фев.', 'мар.', 'апр.', 'мая', 'июн.', 'июл.', 'авг.', 'сен.', 'окт.', 'нояб.', 'дек.']
+
+ROW_HEIGHT = 52
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ru">
+<head><meta charset="utf-8"><title>Бусты гильдии</title></head>
+<body>
+<header><nav>{nav}</nav></header>
+<main>
+<div data-sentry-component="GuildDonationsList" class="flex flex-col gap-4">
+<div data-sentry-component="VirtualizedDataTable" class="relative overflow-auto" style="height: 600px">
+<table class="w-full caption-bottom text-sm">
+<thead><tr><th>Пользователь</th><th>Сумма</th><th>Дата</th></tr></thead>
+<tbody style="height: {height}px; position: relative">
+{rows}
+</tbody>
+</table>
+</div>
+</div>
+</main>
+<footer>{footer}</footer>
+</body>
+</html>
+"""
+
+ROW_TEMPLATE = (
+    '<tr data-index="{index}" style="position: absolute; transform: translateY({offset}px); width: 100%">'
+    '<td class="p-2"><div class="flex items-center gap-2">'
+    '<img src="/media/users/{user_id}/avatar.webp" alt="" class="size-8 rounded-full">'
+    '<span class="font-medium">{user}</span></div></td>'
+    '<td class="p-2"><div data-slot="badge" class="inline-flex items-center">{amount}'
+    '<svg viewBox="0 0 24 24" class="size-4"><path d="M13 2 3 14h9l-1 8 10-12h-9l1-8z"></path></svg>'
+    '</div></td>'
+    '<td class="p-2"><span class="text-muted-foreground">{date}</span></td>'
+    '</tr>'
+)
+
+
+def format_amount(amount: int) -> str:
+    """1500 -> '1 500' с неразрывным пробелом, как на сайте"""
+    return f"{amount:,}".replace(',', ' ')
+
+
+def format_site_date(created_at: datetime.datetime) -> str:
+    """datetime -> '24 мая 2024, 07:08', как дата отображается на сайте"""
+    return f"{created_at.day} {MONTHS[created_at.month - 1]} {created_at.year}, {created_at:%H:%M}"
+
+
+def generate_donations(count: int, seed: int = 42, users: int = None):
+    """Генерирует донаты в виде словарей {user, amount, created_at}, от новых к старым"""
+    rng = random.Random(seed)
+    users = users or max(1, count // 5)
+    created_at = datetime.datetime(2025, 10, 1, 12, 0)
+    donations = []
+    for _ in range(count):
+        created_at -= datetime.timedelta(minutes=rng.randint(1, 600))
+        donations.append({
+            'user': f"Бустер_{rng.randrange(users):05d}",
+            'amount': rng.choice([10, 50, 100, 250, 500, 1000, 1500, 5000]),
+            'created_at': created_at,
+        })
+    return donations
+
+
+def generate_rows(count: int, seed: int = 42, users: int = None):
+    """Генерирует строки [пользователь, сумма, дата] в формате страницы remanga"""
+    return [
+        [donation['user'], donation['amount'], format_site_date(donation['created_at'])]
+        for donation in generate_donations(count, seed=seed, users=users)
+    ]
+
+
+def render_row(index: int, user: str, amount: int, date: str) -> str:
+    """HTML одной строки виртуализированной таблицы"""
+    return ROW_TEMPLATE.format(
+        index=index,
+        offset=index * ROW_HEIGHT,
+        user_id=1000 + index,
+        user=html.escape(user),
+        amount=format_amount(amount),
+        date=html.escape(date),
+    )
+
+
+def render_page(rows, chrome_nodes: int = 200) -> str:
+    """Рендерит HTML-страницу с таблицей; chrome_nodes имитирует остальную разметку сайта"""
+    rendered_rows = [render_row(index, user, amount, date) for index, (user, amount, date) in enumerate(rows)]
+
+    nav = ''.join(f'<a href="/catalog/{i}" class="px-2">Раздел {i}</a>' for i in range(chrome_nodes // 2))
+    footer = ''.join(f'<p class="text-xs">Ссылка {i}</p>' for i in range(chrome_nodes // 2))
+    return PAGE_TEMPLATE.format(
+        nav=nav,
+        footer=footer,
+        height=len(rows) * ROW_HEIGHT,
+        rows='\n'.join(rendered_rows),
+    )
+
+
+def generate_page(count: int, seed: int = 42) -> str:
+    """Синтетическая страница донатов с count строками"""
+    return render_page(generate_rows(count, seed=seed))
@@ -0,0 +1,43 @@
+# Компактный протокол callback_data: "<опкод>:<число>:<число>..."
+# Telegram ограничивает callback_data 64 байтами, поэтому вместо названий гильдий передаем guilds.id
+
+MAX_CALLBACK_BYTES = 64
+SEPARATOR = ':'
+
+SHOW_ALL = 'sa'
+REFRESH = 'rf'
+HISTORY = 'hs'
+HISTORY_PAGE = 'hp'
+SKIP_HISTORY = 'sk'
+CLOSE = 'cl'
+DELETE = 'dl'
+DELETE_PAGE = 'dp'
+CONFIRM_DELETE = 'cd'
+CANCEL_DELETE = 'cx'
+SUBSCRIBE = 'sb'
+UNSUBSCRIBE = 'us'
+PERIOD = 'pd'
+PERIOD_SWITCH = 'ps'
+CHART = 'ch'
+CHART_SWITCH = 'cs'
+
+
+def encode(op: str, *args: int) -> str:
+    """Собирает callback_data из опкода и целочисленных аргументов"""
+    data = SEPARATOR.join([op, *(str(int(arg)) for arg in args)])
+    if len(data.encode('utf-8')) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"callback_data длиннее {MAX_CALLBACK_BYTES} байт: {data}")
+    return data
+
+
+def decode(data: str):
+    """Разбирает callback_data. Возвращает (опкод, [аргументы]) или None для неизвестного формата"""
+    if not data:
+        return None
+
+    op, *raw_args = data.split(SEPARATOR)
+    try:
+        args = [int(arg) for arg in raw_args]
+    except ValueError:
+        return None
+    return op, args
@@ -0,0 +1,129 @@
+# Графики бустов гильдии: рендер matplotlib в отдельном процессе, PNG-кэш по (гильдия, тип, версия данных)
+# Бот импортирует только этот модуль; matplotlib загружается в рабочем процессе при первом рендере
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from metrics import PoolUsage
+
+CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR', 'chart_cache')
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', 1))
+CHART_TOP_N = int(os.getenv('CHART_TOP_N', 15))
+# Сколько последних дней на графике бустов по дням
+CHART_DAYS = int(os.getenv('CHART_DAYS', 90))
+
+CUMULATIVE = 'cumulative'
+DAILY = 'daily'
+TOP = 'top'
+CHART_TYPES = (CUMULATIVE, DAILY, TOP)
+
+# Номера типов графиков в callback_data
+CHART_CODES = {CUMULATIVE: 0, DAILY: 1, TOP: 2}
+
+_pool = None
+_pool_usage = PoolUsage('chart_render', CHART_WORKERS)
+# Один рендер на файл: одновременные запросы одного графика ждут общий future
+_inflight = {}
+
+
+def chart_type_by_code(code: int):
+    return next((chart_type for chart_type, value in CHART_CODES.items() if value == code), None)
+
+
+def cache_path(guild_id: int, chart_type: str, version: int) -> str:
+    return os.path.join(CHART_CACHE_DIR, f"{guild_id}_{chart_type}_{version}.png")
+
+
+def prune_cache(guild_id: int, chart_type: str, keep_version: int):
+    """Удаляет PNG прежних версий данных: по ним график уже не запросят"""
+    prefix = f"{guild_id}_{chart_type}_"
+    keep = os.path.basename(cache_path(guild_id, chart_type, keep_version))
+    try:
+        names = os.listdir(CHART_CACHE_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(prefix) and name != keep:
+            try:
+                os.remove(os.path.join(CHART_CACHE_DIR, name))
+            except OSError:
+                pass
+
+
+def render_chart(chart_type: str, title: str, points, path: str) -> str:
+    """Рисует график и атомарно пишет PNG. Выполняется в рабочем процессе.
+    points: [(дата, сумма)] для cumulative/daily, [(ник, сумма)] для top"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    figure, axes = plt.subplots(figsize=(9, 5), dpi=100)
+    try:
+        if chart_type == CUMULATIVE:
+            dates = [date for date, _ in points]
+            running, totals = 0, []
+            for _, amount in points:
+                running += amount
+                totals.append(running)
+            axes.plot(dates, totals, color='#f5a623', linewidth=2)
+            axes.fill_between(dates, totals, color='#f5a623', alpha=0.15)
+            axes.set_ylabel('Всего ⚡')
+            figure.autofmt_xdate()
+        elif chart_type == DAILY:
+            axes.bar([date for date, _ in points], [amount for _, amount in points], color='#4a90e2')
+            axes.set_ylabel('За день ⚡')
+            figure.autofmt_xdate()
+        elif chart_type == TOP:
+            names = [name for name, _ in reversed(points)]
+            axes.barh(names, [amount for _, amount in reversed(points)], color='#7ed321')
+            axes.set_xlabel('Сумма ⚡')
+        else:
+            raise ValueError(f"неизвестный тип графика: {chart_type}")
+
+        axes.set_title(title)
+        axes.grid(alpha=0.3)
+        figure.tight_layout()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        figure.savefig(temporary, format='png')
+        os.replace(temporary, path)
+        return path
+    finally:
+        plt.close(figure)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: рабочий процесс не наследует event loop и потоки бота
+        _pool = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+async def render(chart_type: str, title: str, points, path: str) -> str:
+    """Рендерит PNG в пуле процессов, не блокируя event loop. Возвращает путь к файлу"""
+    pending = _inflight.get(path)
+    if pending is None:
+        loop = asyncio.get_running_loop()
+        pending = asyncio.ensure_future(
+            loop.run_in_executor(_get_pool(), render_chart, chart_type, title, points, path))
+        _inflight[path] = pending
+        _pool_usage.submitted()
+        pending.add_done_callback(_pool_usage.finished)
+        pending.add_done_callback(lambda _: _inflight.pop(path, None))
+    try:
+        return await asyncio.shield(pending)
+    except BrokenProcessPool:
+        # Рабочий процесс упал (например, по памяти): следующий рендер поднимет новый пул
+        shutdown()
+        raise
+
+
+def shutdown():
+    """Останавливает пул рендера при завершении бота"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -1,18 +1,50 @@
-import mysql.connector
-from mysql.connector import Error
 import os
+import json
+import zlib
 import logging
 import re
+import datetime
 import idna
 from urllib.parse import urlparse, urlunparse
 from dotenv import load_dotenv
+import metrics
+from date_normalizer import normalize_date_column
+from storage_backends import create_backend, DB_ERRORS as Error
+import partitions
+import scrape_snapshots
+import rollups
 
 load_dotenv()
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def donation_key(user_name, amount, date) -> str:
+    """Уникальный ключ доната для проверки дубликатов"""
+    if isinstance(date, datetime.datetime):
+        date = date.strftime('%Y-%m-%d %H:%M:%S')
+    return f"{user_name}|{amount}|{date}"
+
+
+def legacy_donation_key(user_name, amount, date) -> str:
+    """Ключ доната без времени: так хранились даты до перехода date_buster на DATETIME"""
+    return f"{user_name}|{amount}|{date:%Y-%m-%d}"
+
+
+def normalize_user_name(name) -> str:
+    """Ключ поиска бустера: без регистра и различия е/ё, как ники обычно набирают"""
+    return ' '.join(str(name).casefold().replace('ё', 'е').split())
+
+
+def dedup_window_start(dates):
+    """Граница окна проверки дубликатов: более старые строки БД не могут совпасть ни с одним донатом выгрузки"""
+    known = [date for date in dates if date is not None]
+    if not known:
+        return None
+    # Запасной день: строки старой схемы хранят только дату, а в SQLite '2024-05-24' < '2024-05-24 00:00:00'
+    return datetime.datetime.combine(min(known).date() - datetime.timedelta(days=1), datetime.time())
+
+
 class DatabaseManager:
     def __init__(self):
         # Получаем настройки из переменных окружения Railway
@@ -25,9 +57,14 @@ class DatabaseManager:
             'port': int(os.getenv('MYSQLPORT', os.getenv('DB_PORT', 3306)))
         }
 
+        # Хранилище выбирается через DB_BACKEND: mysql (по умолчанию) или встроенный sqlite
+        self.backend = create_backend(self.config)
+
+        # Таблицы донатов, уже проверенные на миграцию date_buster -> DATETIME
+        self._migrated_tables = set()
+
         # Логируем настройки подключения (без пароля)
-        logger.info(
-            f"🔧 Настройки БД: host={self.config['host']}, db={self.config['database']}, port={self.config['port']}")
+        logger.info(f"🔧 Настройки БД: {self.backend.describe()}")
 
     def url_to_punycode(self, url):
         """Конвертирует URL в Punycode формат"""
@@ -62,12 +99,13 @@ class DatabaseManager:
     def connect(self):
         """Подключается к базе данных"""
         try:
-            connection = mysql.connector.connect(**self.config)
+            connection = self.backend.connect()
+            metrics.inc('db_connections_total')
             if connection.is_connected():
-                logger.info("✅ Успешное подключение к MySQL")
+                logger.info(f"✅ Успешное подключение к {self.backend.name}")
                 return connection
         except Error as e:
-            logger.error(f"❌ Ошибка подключения к MySQL: {e}")
+            logger.error(f"❌ Ошибка подключения к {self.backend.name}: {e}")
             return None
 
     def setup_database(self):
@@ -83,6 +121,34 @@ class DatabaseManager:
         if not self.setup_guilds_table():
             return False
 
+        # Подписки на новые бусты и очередь уведомлений
+        if not self.setup_notifications_tables():
+            return False
+
+        # Аренда гильдий репликами сервиса парсинга
+        if not self.setup_sharding_tables():
+            return False
+
+        # Снимки результатов парсинга для сверки удаленных донатов
+        if not self.setup_snapshots_table():
+            return False
+
+        # Сводка бустер -> гильдии для поиска по нику
+        if not self.setup_booster_index_table():
+            return False
+
+        # Итоги гильдий по дням, неделям и месяцам
+        if not self.setup_rollup_tables():
+            return False
+
+        # Места бустеров в лидерборде и их изменение за последний проход
+        if not self.setup_ranks_table():
+            return False
+
+        # Версии данных гильдий и file_id отправленных графиков
+        if not self.setup_charts_tables():
+            return False
+
         logger.info("✅ База данных настроена")
         return True
 
@@ -90,7 +156,174 @@ class DatabaseManager:
         """Гарантирует, что таблица для гильдии существует (создает если нет)"""
         if not self.check_donation_table_exists(guild_name):
             return self.create_donation_table(guild_name)
-        return True
+        return self.migrate_donation_table(guild_name)
+
+    def migrate_donation_table(self, guild_name: str):
+        """Переводит date_buster старых таблиц с DATE на DATETIME (один раз за процесс)"""
+        table_name = self.get_safe_table_name(guild_name)
+        if table_name in self._migrated_tables:
+            return True
+
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute(self.backend.column_type_sql(), (table_name, 'date_buster'))
+            result = cursor.fetchone()
+            migrate_sql = self.backend.modify_column_sql(table_name, 'date_buster', 'datetime DEFAULT NULL')
+
+            if result and str(result[0]).lower() == 'date' and migrate_sql:
+                logger.info(f"🔧 Переводим {table_name}.date_buster на DATETIME")
+                cursor.execute(migrate_sql)
+                connection.commit()
+
+            cursor.execute(self.backend.column_type_sql(), (table_name, 'fingerprint'))
+            if cursor.fetchone() is None:
+                logger.info(f"🔧 Добавляем {table_name}.fingerprint")
+                cursor.execute(f"ALTER TABLE `{table_name}` ADD COLUMN `fingerprint` bigint DEFAULT NULL")
+            self._ensure_index(cursor, table_name, scrape_snapshots.fingerprint_index_name(table_name), 'fingerprint')
+
+            self._ensure_index(cursor, table_name, partitions.date_index_name(table_name), 'date_buster')
+            if self.backend.supports_partitioning and partitions.PARTITIONING_ENABLED \
+                    and not self._table_partitions(cursor, table_name):
+                try:
+                    self._partition_existing_table(cursor, table_name)
+                except Error as e:
+                    # Таблица остается рабочей и без партиций
+                    logger.error(f"❌ Не удалось партиционировать {table_name}: {e}")
+            connection.commit()
+
+            self._migrated_tables.add(table_name)
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка миграции таблицы {table_name}: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def _ensure_index(self, cursor, table_name: str, index_name: str, *columns):
+        """Вторичный индекс, если его еще нет: date_buster, fingerprint, сводки по guild_id"""
+        cursor.execute(self.backend.index_exists_sql(), (table_name, index_name))
+        if cursor.fetchone() is None:
+            logger.info(f"🔧 Создаем индекс {index_name}")
+            cursor.execute(self.backend.create_index_sql(table_name, index_name, list(columns)))
+
+    def _table_partitions(self, cursor, table_name: str):
+        cursor.execute(self.backend.partitions_sql(), (table_name,))
+        return [row[0] for row in cursor.fetchall()]
+
+    def _partition_existing_table(self, cursor, table_name: str):
+        """Переводит старую таблицу на помесячные партиции (один раз, перестраивает таблицу)"""
+        # date_buster входит в первичный ключ, поэтому строки без даты получают дату-заглушку (попадут в p_old)
+        cursor.execute(f"UPDATE `{table_name}` SET date_buster = %s WHERE date_buster IS NULL",
+                       (partitions.MISSING_DATE,))
+        if cursor.rowcount:
+            logger.warning(f"⚠️ {table_name}: строк без даты: {cursor.rowcount}, перенесены в {partitions.OLD_PARTITION}")
+
+        cursor.execute(f"SELECT MIN(date_buster) FROM `{table_name}` WHERE date_buster > %s",
+                       (partitions.MISSING_DATE,))
+        oldest = cursor.fetchone()[0]
+        current = partitions.month_start(datetime.date.today())
+        first = min(partitions.month_start(oldest), current) if oldest else current
+
+        logger.info(f"🔧 Партиционируем {table_name} по месяцам с {first:%Y-%m}")
+        cursor.execute(f"""
+            ALTER TABLE `{table_name}`
+              MODIFY `date_buster` datetime NOT NULL,
+              DROP PRIMARY KEY,
+              ADD PRIMARY KEY (`id`, `date_buster`)
+        """)
+        cursor.execute(f"ALTER TABLE `{table_name}` "
+                       f"{partitions.partition_by_sql(first, partitions.add_months(current, partitions.FUTURE_MONTHS))}")
+
+    def maintain_partitions(self):
+        """Создает партиции на FUTURE_MONTHS вперед и архивирует месяцы старше RETENTION_MONTHS.
+        Возвращает {'created', 'archived'}"""
+        summary = {'created': 0, 'archived': 0}
+        if not self.backend.supports_partitioning or not partitions.PARTITIONING_ENABLED:
+            return summary
+
+        guild_names = list(self.load_all_guilds())
+        for guild_name in guild_names:
+            self.ensure_guild_table_exists(guild_name)
+
+        connection = self.connect()
+        if not connection:
+            return summary
+
+        current = partitions.month_start(datetime.date.today())
+        last_needed = partitions.add_months(current, partitions.FUTURE_MONTHS)
+        cutoff = partitions.retention_cutoff()
+
+        try:
+            cursor = connection.cursor()
+            for guild_name in guild_names:
+                table_name = self.get_safe_table_name(guild_name)
+                names = self._table_partitions(cursor, table_name)
+                if not names:
+                    continue
+                months = sorted(month for month in map(partitions.partition_month, names) if month)
+
+                if months:
+                    # Новая таблица создается с партицией текущего месяца, и вся история первой выгрузки
+                    # ложится в p_old: нарезаем ее по месяцам от самого старого доната
+                    cursor.execute(f"SELECT MIN(date_buster) FROM `{table_name}` PARTITION ({partitions.OLD_PARTITION}) "
+                                   f"WHERE date_buster > %s", (partitions.MISSING_DATE,))
+                    oldest = cursor.fetchone()[0]
+                    if oldest and partitions.month_start(oldest) < months[0]:
+                        history = list(partitions.month_range(partitions.month_start(oldest),
+                                                              partitions.add_months(months[0], -1)))
+                        cursor.execute(partitions.split_old_sql(table_name, history))
+                        summary['created'] += len(history)
+                        logger.info(f"📅 {table_name}: история из {partitions.OLD_PARTITION} разложена по "
+                                    f"{len(history)} партициям с {history[0]:%Y-%m}")
+                        months = history + months
+
+                # Новые месяцы отрезаются от p_future заранее, чтобы вставки не копились в ней
+                start = partitions.add_months(max(months), 1) if months else current
+                missing = list(partitions.month_range(start, last_needed))
+                if missing:
+                    cursor.execute(partitions.split_future_sql(table_name, missing))
+                    summary['created'] += len(missing)
+                    logger.info(f"📅 {table_name}: добавлены партиции {', '.join(map(partitions.partition_name, missing))}")
+
+                if cutoff is not None:
+                    expired = partitions.expired_partitions(months, cutoff.date())
+                    if expired:
+                        summary['archived'] += self._archive_partitions(cursor, table_name, expired)
+                connection.commit()
+
+            metrics.inc('db_partitions_created_total', summary['created'])
+            metrics.inc('db_partitions_archived_total', summary['archived'])
+            return summary
+        except Error as e:
+            logger.error(f"❌ Ошибка обслуживания партиций: {e}")
+            return summary
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def _archive_partitions(self, cursor, table_name: str, names):
+        """Копирует партиции в таблицу-архив и удаляет их из основной таблицы целиком, без построчного DELETE"""
+        archive = partitions.archive_table_name(table_name)
+        if not self._table_exists(cursor, archive):
+            cursor.execute(f"CREATE TABLE `{archive}` LIKE `{table_name}`")
+            cursor.execute(f"ALTER TABLE `{archive}` REMOVE PARTITIONING")
+
+        archived = 0
+        for name in names:
+            cursor.execute(f"INSERT IGNORE INTO `{archive}` SELECT * FROM `{table_name}` PARTITION ({name})")
+            if name == partitions.OLD_PARTITION:
+                # Нижнюю партицию диапазона удалить нельзя, только очистить
+                cursor.execute(f"ALTER TABLE `{table_name}` TRUNCATE PARTITION {name}")
+            else:
+                cursor.execute(f"ALTER TABLE `{table_name}` DROP PARTITION {name}")
+                archived += 1
+        logger.info(f"🗄️ {table_name}: в архив {archive} перенесены партиции {', '.join(names)}")
+        return archived
 
     def setup_guilds_table(self):
         """Создает таблицу для гильдий"""
@@ -100,9 +333,9 @@ class DatabaseManager:
 
         try:
             cursor = connection.cursor()
-            create_table_sql = """
+            create_table_sql = f"""
             CREATE TABLE IF NOT EXISTS guilds (
-                id INT AUTO_INCREMENT PRIMARY KEY,
+                id {self.backend.autoincrement_pk()},
                 name VARCHAR(100) NOT NULL UNIQUE,
                 url VARCHAR(500) NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -119,6 +352,357 @@ class DatabaseManager:
             if connection.is_connected():
                 connection.close()
 
+    def setup_notifications_tables(self):
+        """Создает таблицы подписок чатов на гильдии и очереди уведомлений (outbox)"""
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                id {self.backend.autoincrement_pk()},
+                chat_id BIGINT NOT NULL,
+                guild_id INT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                CONSTRAINT unique_subscription UNIQUE (chat_id, guild_id)
+            );
+            """)
+            # Одна строка на пару (чат, гильдия) за проход парсера; бот удаляет строку после доставки
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS notification_outbox (
+                id {self.backend.autoincrement_pk()},
+                chat_id BIGINT NOT NULL,
+                guild_id INT NOT NULL,
+                new_count INT NOT NULL,
+                new_amount INT NOT NULL,
+                new_users INT NOT NULL,
+                top_boosters VARCHAR(1000) DEFAULT NULL,
+                attempts INT NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            """)
+            connection.commit()
+            logger.info("✅ Таблицы subscriptions и notification_outbox созданы/проверены")
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка при создании таблиц уведомлений: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def setup_charts_tables(self):
+        """Создает таблицы версий данных гильдий и file_id графиков, уже загруженных в Telegram"""
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            # Версия растет с каждым проходом, который вставил или удалил донаты; по ней устаревают графики
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS guild_data_versions (
+                guild_id INT NOT NULL PRIMARY KEY,
+                version INT NOT NULL
+            );
+            """)
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chart_files (
+                guild_id INT NOT NULL,
+                chart_type VARCHAR(20) NOT NULL,
+                data_version INT NOT NULL,
+                file_id VARCHAR(255) NOT NULL,
+                PRIMARY KEY (guild_id, chart_type)
+            );
+            """)
+            connection.commit()
+            logger.info("✅ Таблицы guild_data_versions и chart_files созданы/проверены")
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка при создании таблиц графиков: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def setup_ranks_table(self):
+        """Создает таблицу мест бустеров в лидерборде гильдии (порядок: сумма по убыванию, затем ник)"""
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            # prev_rank - место до прохода rank_version; последний проход гильдии - ее MAX(rank_version)
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS guild_ranks (
+                guild_id INT NOT NULL,
+                user_name VARCHAR(25) NOT NULL,
+                total BIGINT NOT NULL,
+                donations INT NOT NULL,
+                user_rank INT NOT NULL,
+                prev_rank INT DEFAULT NULL,
+                rank_version INT NOT NULL,
+                PRIMARY KEY (guild_id, user_name)
+            );
+            """)
+            # Не UNIQUE: во время сдвига мест два бустера на мгновение делят одно место
+            self._ensure_index(cursor, 'guild_ranks', 'idx_guild_ranks_rank', 'guild_id', 'user_rank')
+            self._ensure_index(cursor, 'guild_ranks', 'idx_guild_ranks_total', 'guild_id', 'total', 'user_name')
+            connection.commit()
+            logger.info("✅ Таблица guild_ranks создана/проверена")
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка при создании таблицы guild_ranks: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def setup_rollup_tables(self):
+        """Создает таблицы предагрегатов: итоги гильдии и вклад каждого бустера за день/неделю/месяц"""
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS guild_rollups (
+                guild_id INT NOT NULL,
+                period VARCHAR(5) NOT NULL,
+                bucket DATE NOT NULL,
+                total BIGINT NOT NULL,
+                donations INT NOT NULL,
+                boosters INT NOT NULL,
+                PRIMARY KEY (guild_id, period, bucket)
+            );
+            """)
+            # Число строк бакета здесь - число уникальных бустеров за период
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS guild_rollup_users (
+                guild_id INT NOT NULL,
+                period VARCHAR(5) NOT NULL,
+                bucket DATE NOT NULL,
+                user_name VARCHAR(25) NOT NULL,
+                total BIGINT NOT NULL,
+                donations INT NOT NULL,
+                PRIMARY KEY (guild_id, period, bucket, user_name)
+            );
+            """)
+            connection.commit()
+            logger.info("✅ Таблицы guild_rollups и guild_rollup_users созданы/проверены")
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка при создании таблиц предагрегатов: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def setup_booster_index_table(self):
+        """Создает сводную таблицу бустеров по всем гильдиям: поиск /user без обхода таблиц donations_*"""
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            # Первичный ключ начинается с name_norm: поиск по префиксу ника - один диапазон индекса
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS booster_index (
+                name_norm VARCHAR(50) NOT NULL,
+                guild_id INT NOT NULL,
+                user_name VARCHAR(25) NOT NULL,
+                total BIGINT NOT NULL,
+                donations INT NOT NULL,
+                last_date DATETIME DEFAULT NULL,
+                PRIMARY KEY (name_norm, guild_id, user_name)
+            );
+            """)
+            # Сводка одной гильдии: пересборка, удаление гильдии, места в лидерборде
+            self._ensure_index(cursor, 'booster_index', 'idx_booster_index_guild', 'guild_id', 'user_name')
+            connection.commit()
+            logger.info("✅ Таблица booster_index создана/проверена")
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка при создании таблицы booster_index: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def setup_snapshots_table(self):
+        """Создает таблицу последних снимков парсинга по таблицам донатов"""
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS scrape_snapshots (
+                table_name VARCHAR(100) NOT NULL PRIMARY KEY,
+                row_count INT NOT NULL,
+                data MEDIUMBLOB NOT NULL,
+                updated_at {self.backend.on_update_timestamp()}
+            );
+            """)
+            connection.commit()
+            logger.info("✅ Таблица scrape_snapshots создана/проверена")
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка при создании таблицы scrape_snapshots: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def setup_sharding_tables(self):
+        """Создает таблицы реплик сервиса парсинга и аренды гильдий"""
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS parser_replicas (
+                replica_id VARCHAR(100) NOT NULL PRIMARY KEY,
+                heartbeat_at DATETIME NOT NULL
+            );
+            """)
+            # claimed_by = NULL или истекший lease_until: гильдию может забрать любая реплика
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS guild_leases (
+                guild_id INT NOT NULL PRIMARY KEY,
+                claimed_by VARCHAR(100) DEFAULT NULL,
+                lease_until DATETIME DEFAULT NULL
+            );
+            """)
+            connection.commit()
+            logger.info("✅ Таблицы parser_replicas и guild_leases созданы/проверены")
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка при создании таблиц аренды гильдий: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def heartbeat_replica(self, replica_id: str, lease_seconds: int):
+        """Отмечает реплику живой и продлевает ее аренды. Возвращает число продленных аренд или None"""
+        connection = self.connect()
+        if not connection:
+            return None
+
+        try:
+            cursor = connection.cursor()
+            now = self.backend.now_offset_sql()
+            cursor.execute(
+                f"UPDATE parser_replicas SET heartbeat_at = {now} WHERE replica_id = %s", (0, replica_id))
+            if cursor.rowcount == 0:
+                cursor.execute(
+                    f"{self.backend.insert_ignore()} INTO parser_replicas (replica_id, heartbeat_at) VALUES (%s, {now})",
+                    (replica_id, 0))
+            cursor.execute(
+                f"UPDATE guild_leases SET lease_until = {now} WHERE claimed_by = %s", (lease_seconds, replica_id))
+            renewed = cursor.rowcount
+            connection.commit()
+            return renewed
+        except Error as e:
+            logger.error(f"❌ Ошибка heartbeat реплики {replica_id}: {e}")
+            return None
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def claim_guild_leases(self, replica_id: str, lease_seconds: int, replica_ttl: int):
+        """Доводит число гильдий реплики до справедливой доли ceil(гильдий / живых реплик):
+        отпускает лишние и забирает свободные или просроченные. Возвращает id гильдий реплики или None"""
+        connection = self.connect()
+        if not connection:
+            return None
+
+        try:
+            cursor = connection.cursor()
+            now = self.backend.now_offset_sql()
+
+            # Аренды появляются для новых гильдий и исчезают вместе с удаленными
+            cursor.execute(f"{self.backend.insert_ignore()} INTO guild_leases (guild_id) SELECT id FROM guilds")
+            cursor.execute("DELETE FROM guild_leases WHERE guild_id NOT IN (SELECT id FROM guilds)")
+
+            cursor.execute(f"DELETE FROM parser_replicas WHERE heartbeat_at < {now}", (-replica_ttl,))
+            cursor.execute("SELECT COUNT(*) FROM parser_replicas")
+            live_replicas = max(1, cursor.fetchone()[0])
+            cursor.execute("SELECT COUNT(*) FROM guild_leases")
+            total = cursor.fetchone()[0]
+            share = -(-total // live_replicas)
+
+            cursor.execute("SELECT guild_id FROM guild_leases WHERE claimed_by = %s ORDER BY guild_id", (replica_id,))
+            owned = [row[0] for row in cursor.fetchall()]
+
+            if len(owned) > share:
+                # Отпускаем лишнее, чтобы новые реплики получили свою долю
+                released = owned[share:]
+                owned = owned[:share]
+                cursor.execute(
+                    f"UPDATE guild_leases SET claimed_by = NULL, lease_until = NULL "
+                    f"WHERE claimed_by = %s AND guild_id IN ({', '.join(['%s'] * len(released))})",
+                    [replica_id, *released])
+            elif len(owned) < share:
+                cursor.execute(
+                    f"SELECT guild_id FROM guild_leases WHERE claimed_by IS NULL OR lease_until < {now} "
+                    f"ORDER BY guild_id", (0,))
+                candidates = [row[0] for row in cursor.fetchall()]
+                # Разные реплики начинают с разных гильдий, чтобы реже конкурировать за одни и те же строки
+                offset = hash(replica_id) % len(candidates) if candidates else 0
+                for guild_id in candidates[offset:] + candidates[:offset]:
+                    if len(owned) >= share:
+                        break
+                    # Атомарный захват: строку получает только одна реплика, даже при одновременных попытках
+                    cursor.execute(
+                        f"UPDATE guild_leases SET claimed_by = %s, lease_until = {now} "
+                        f"WHERE guild_id = %s AND (claimed_by IS NULL OR lease_until < {now})",
+                        (replica_id, lease_seconds, guild_id, 0))
+                    if cursor.rowcount == 1:
+                        owned.append(guild_id)
+
+            cursor.execute(f"UPDATE guild_leases SET lease_until = {now} WHERE claimed_by = %s",
+                           (lease_seconds, replica_id))
+            connection.commit()
+            metrics.set_gauge('parser_live_replicas', live_replicas)
+            return sorted(owned)
+        except Error as e:
+            logger.error(f"❌ Ошибка распределения гильдий для реплики {replica_id}: {e}")
+            return None
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def release_guild_leases(self, replica_id: str):
+        """Отпускает все гильдии реплики и удаляет ее из списка живых (при остановке)"""
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute("UPDATE guild_leases SET claimed_by = NULL, lease_until = NULL WHERE claimed_by = %s",
+                           (replica_id,))
+            cursor.execute("DELETE FROM parser_replicas WHERE replica_id = %s", (replica_id,))
+            connection.commit()
+            logger.info(f"👋 Реплика {replica_id} отпустила свои гильдии")
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка освобождения гильдий реплики {replica_id}: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
     def save_guild(self, guild_name: str, url: str):
         """Сохраняет гильдию в БД и создает для нее таблицу донатов"""
         connection = self.connect()
@@ -130,7 +714,7 @@ class DatabaseManager:
             url = self.url_to_punycode(url)
 
             cursor = connection.cursor()
-            sql = "INSERT INTO guilds (name, url) VALUES (%s, %s) ON DUPLICATE KEY UPDATE url = VALUES(url)"
+            sql = self.backend.upsert_sql('guilds', ['name', 'url'], ['name'], {'url': self.backend.excluded('url')})
             cursor.execute(sql, (guild_name, url))
             connection.commit()
             logger.info(f"✅ Гильдия '{guild_name}' сохранена в БД (URL в Punycode)")
@@ -171,6 +755,26 @@ class DatabaseManager:
             if connection.is_connected():
                 connection.close()
 
+    def load_guild_records(self):
+        """Загружает гильдии из БД вместе с их id"""
+        connection = self.connect()
+        if not connection:
+            return []
+
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("SELECT id, name, url FROM guilds ORDER BY name")
+            guilds = cursor.fetchall()
+            for guild in guilds:
+                guild['url'] = self.url_to_punycode(guild['url'])
+            return guilds
+        except Error as e:
+            logger.error(f"❌ Ошибка загрузки гильдий из БД: {e}")
+            return []
+        finally:
+            if connection.is_connected():
+                connection.close()
+
     def get_safe_table_name(self, guild_name: str) -> str:
         """Создает безопасное имя таблицы из названия гильдии"""
         try:
@@ -220,22 +824,14 @@ class DatabaseManager:
     def check_database_exists(self):
         """Проверяет существование базы данных"""
         try:
-            temp_config = self.config.copy()
-            temp_config.pop('database', None)
-
-            connection = mysql.connector.connect(**temp_config)
-            cursor = connection.cursor()
-
-            cursor.execute("SHOW DATABASES LIKE 'railway'")
-            result = cursor.fetchone()
-            exists = result is not None
+            database_name = self.config['database']
+            exists = self.backend.database_exists()
 
             if exists:
-                logger.info("✅ База данных railway существует")
+                logger.info(f"✅ База данных {database_name} существует")
             else:
-                logger.info("❌ База данных railway не существует")
+                logger.info(f"❌ База данных {database_name} не существует")
 
-            connection.close()
             return exists
 
         except Error as e:
@@ -245,17 +841,8 @@ class DatabaseManager:
     def create_database(self):
         """Создает базу данных"""
         try:
-            temp_config = self.config.copy()
-            temp_config.pop('database', None)
-
-            connection = mysql.connector.connect(**temp_config)
-            cursor = connection.cursor()
-
-            cursor.execute("CREATE DATABASE IF NOT EXISTS railway")
-            connection.commit()
-            logger.info("✅ База данных railway создана")
-
-            connection.close()
+            self.backend.create_database()
+            logger.info(f"✅ База данных {self.config['database']} создана")
             return True
 
         except Error as e:
@@ -271,7 +858,7 @@ class DatabaseManager:
         try:
             table_name = self.get_safe_table_name(guild_name)
             cursor = connection.cursor()
-            cursor.execute("SHOW TABLES LIKE %s", (table_name,))
+            cursor.execute(self.backend.table_exists_sql(), (table_name,))
             result = cursor.fetchone()
             exists = result is not None
 
@@ -300,19 +887,43 @@ class DatabaseManager:
             # Создаем безопасное имя таблицы
             table_name = self.get_safe_table_name(guild_name)
 
-            create_table_sql = f"""
-            CREATE TABLE IF NOT EXISTS `{table_name}` (
-              `id` int NOT NULL AUTO_INCREMENT,
-              `user_name` varchar(25) DEFAULT NULL,
-              `sum` int DEFAULT NULL,
-              `date_buster` date DEFAULT NULL,
-              `last_updated` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-              PRIMARY KEY (`id`),
-              UNIQUE KEY `unique_buster_{table_name}` (`user_name`, `sum`, `date_buster`)
-            );
-            """
-            cursor.execute(create_table_sql)
+            if self.backend.supports_partitioning and partitions.PARTITIONING_ENABLED:
+                # Помесячные партиции: каждый уникальный ключ партиционированной таблицы включает date_buster
+                month = partitions.month_start(datetime.date.today())
+                create_table_sql = f"""
+                CREATE TABLE IF NOT EXISTS `{table_name}` (
+                  `id` int NOT NULL AUTO_INCREMENT,
+                  `user_name` varchar(25) DEFAULT NULL,
+                  `sum` int DEFAULT NULL,
+                  `date_buster` datetime NOT NULL,
+                  `last_updated` {self.backend.on_update_timestamp()},
+                  `fingerprint` bigint DEFAULT NULL,
+                  PRIMARY KEY (`id`, `date_buster`),
+                  KEY `{partitions.date_index_name(table_name)}` (`date_buster`),
+                  KEY `{scrape_snapshots.fingerprint_index_name(table_name)}` (`fingerprint`),
+                  CONSTRAINT `unique_buster_{table_name}` UNIQUE (`user_name`, `sum`, `date_buster`)
+                )
+                {partitions.partition_by_sql(month, partitions.add_months(month, partitions.FUTURE_MONTHS))};
+                """
+                cursor.execute(create_table_sql)
+            else:
+                create_table_sql = f"""
+                CREATE TABLE IF NOT EXISTS `{table_name}` (
+                  `id` {self.backend.autoincrement_pk()},
+                  `user_name` varchar(25) DEFAULT NULL,
+                  `sum` int DEFAULT NULL,
+                  `date_buster` datetime DEFAULT NULL,
+                  `last_updated` {self.backend.on_update_timestamp()},
+                  `fingerprint` bigint DEFAULT NULL,
+                  CONSTRAINT `unique_buster_{table_name}` UNIQUE (`user_name`, `sum`, `date_buster`)
+                );
+                """
+                cursor.execute(create_table_sql)
+                self._ensure_index(cursor, table_name, partitions.date_index_name(table_name), 'date_buster')
+                self._ensure_index(cursor, table_name, scrape_snapshots.fingerprint_index_name(table_name),
+                                   'fingerprint')
             connection.commit()
+            self._migrated_tables.add(table_name)
             logger.info(f"✅ Таблица донатов {table_name} создана для гильдии '{guild_name}'")
             return True
 
@@ -348,7 +959,11 @@ class DatabaseManager:
             stats = cursor.fetchone()
 
             if stats and stats['last_update']:
-                stats['last_update'] = stats['last_update'].strftime("%d.%m.%Y %H:%M")
+                last_update = stats['last_update']
+                # SQLite возвращает результат агрегата строкой
+                if isinstance(last_update, str):
+                    last_update = datetime.datetime.fromisoformat(last_update)
+                stats['last_update'] = last_update.strftime("%d.%m.%Y %H:%M")
             else:
                 stats['last_update'] = "неизвестно"
 
@@ -362,7 +977,9 @@ class DatabaseManager:
                 connection.close()
 
     def save_donations(self, df, guild_name: str):
-        """Сохраняет донаты в таблицу указанной гильдии (автоматически создает таблицу если нужно)"""
+        """Сохраняет донаты в таблицу указанной гильдии (автоматически создает таблицу если нужно).
+        Сверяет выгрузку с предыдущим снимком: вставляет только добавленные и удаляет исчезнувшие с сайта донаты.
+        Возвращает {'saved', 'skipped', 'errors', 'removed', 'inserted'} или False при ошибке"""
         logger.info(f"💾 Сохраняем {len(df)} записей в таблицу гильдии {guild_name}")
 
         if not self.setup_database():
@@ -381,47 +998,124 @@ class DatabaseManager:
         try:
             table_name = self.get_safe_table_name(guild_name)
             cursor = connection.cursor()
-            saved_count = 0
             skipped_count = 0
             error_count = 0
 
-            # Получаем существующие донаты для проверки дубликатов
-            existing_donations = self.get_existing_donations_set(guild_name)
+            dates = normalize_date_column(df['Дата'])
+            cutoff = partitions.retention_cutoff()
 
-            for _, row in df.iterrows():
+            # Отпечаток -> (пользователь, сумма, дата) для каждого доната выгрузки
+            rows = {}
+            for user, amount, date in zip(df['Пользователь'], df['Сумма'], dates):
+                user_name = str(user)[:25]
+                if date is None:
+                    logger.warning(f"⚠️ Пропущен донат {user_name}: не распознана дата")
+                    error_count += 1
+                    continue
+
+                # Донаты старше срока хранения уже в архиве: не вставляем их заново
+                if cutoff is not None and date < cutoff:
+                    skipped_count += 1
+                    continue
+
+                fingerprint = scrape_snapshots.fingerprint(donation_key(user_name, amount, date))
+                if fingerprint in rows:
+                    skipped_count += 1
+                    continue
+                rows[fingerprint] = (user_name, int(amount), date)
+
+            current = [(scrape_snapshots.to_minute(date), fingerprint) for fingerprint, (_, _, date) in rows.items()]
+            previous = self._load_snapshot(cursor, table_name)
+            removed = set()
+            removed_by_fingerprint = {}
+            moved = {}
+
+            if previous is None:
+                # Первый проход: сверяем с историей в БД (в том числе со строками, сохраненными без времени)
+                existing_donations = self.get_existing_donations_set(guild_name, since=dedup_window_start(dates))
+                added = [
+                    fingerprint for fingerprint, (user_name, amount, date) in rows.items()
+                    if donation_key(user_name, amount, date) not in existing_donations
+                    and legacy_donation_key(user_name, amount, date) not in existing_donations
+                ]
+                self._backfill_fingerprints(cursor, table_name)
+                snapshot = current
+            else:
+                # Дальше сверка стоит столько, сколько изменилось: история из БД не читается
+                added_fingerprints, removed, window = scrape_snapshots.diff(previous, current)
+                added = [fingerprint for fingerprint in rows if fingerprint in added_fingerprints]
+
+                # Донат, у которого сместилось показанное время (или другой источник - API/страница),
+                # выглядит как удаление + добавление: это обновление, без вставки и уведомления
+                removed_by_fingerprint = self._fingerprint_rows(cursor, table_name, removed)
+                moved = scrape_snapshots.pair_moved(
+                    [(fingerprint, *row) for fingerprint, row in removed_by_fingerprint.items()],
+                    [(fingerprint, *rows[fingerprint]) for fingerprint in added])
+                added = [fingerprint for fingerprint in added if fingerprint not in set(moved.values())]
+                removed -= moved.keys()
+
+                snapshot = None
+                if removed and not scrape_snapshots.removals_look_safe(len(removed), window):
+                    # Снимок не обновляем: следующая полная выгрузка сверится с прежним
+                    logger.warning(f"⚠️ {guild_name}: исчезло {len(removed)} из {window} донатов окна, "
+                                   f"похоже на неполную выгрузку - удаления не применяются")
+                    metrics.inc('snapshot_removals_blocked_total', 1, {'guild': guild_name})
+                    removed = set()
+                    moved = {}
+                elif current:
+                    # Строки старше окна выгрузки остаются в снимке как были
+                    oldest = min(minute for minute, _ in current)
+                    snapshot = [entry for entry in previous if entry[0] <= oldest and entry[1] not in rows] + current
+
+            skipped_count += len(rows) - len(added)
+            saved_count = 0
+            inserted = []
+            insert_sql = (f"{self.backend.insert_ignore()} INTO `{table_name}` "
+                          f"(user_name, sum, date_buster, fingerprint) VALUES (%s, %s, %s, %s)")
+            for fingerprint in added:
+                user_name, amount, date = rows[fingerprint]
                 try:
-                    user_name = str(row['Пользователь'])[:25]
-                    amount = row['Сумма']
-                    date = self.parse_date(row['Дата'])
-
-                    # Создаем уникальный идентификатор доната
-                    donation_id = f"{user_name}|{amount}|{date}"
-
-                    # Проверяем, есть ли уже такой донат в БД
-                    if donation_id in existing_donations:
-                        skipped_count += 1
-                        continue
-
-                    # Сохраняем только новый донат
-                    insert_sql = f"""
-                    INSERT INTO `{table_name}` (user_name, sum, date_buster)
-                    VALUES (%s, %s, %s)
-                    """
-                    cursor.execute(insert_sql, (user_name, amount, date))
-                    saved_count += 1
-
-                    # Добавляем в множество, чтобы избежать дубликатов в текущей сессии
-                    existing_donations.add(donation_id)
-
-                except Exception as e:
-                    logger.error(f"❌ Ошибка сохранения {row['Пользователь']}: {e}")
+                    cursor.execute(insert_sql, (user_name, amount, date, fingerprint))
+                except Error as e:
+                    logger.error(f"❌ Ошибка сохранения {user_name}: {e}")
                     error_count += 1
+                    continue
+                if cursor.rowcount == 1:
+                    saved_count += 1
+                    inserted.append((user_name, amount, date))
+                else:
+                    skipped_count += 1
+
+            removed_rows = [removed_by_fingerprint[fingerprint] for fingerprint in removed
+                            if fingerprint in removed_by_fingerprint]
+            removed_count = self._delete_fingerprints(cursor, table_name, removed)
+            self._move_fingerprints(cursor, table_name, moved)
+            if snapshot is not None:
+                self._store_snapshot(cursor, table_name, snapshot)
+
+            # Сводки по гильдии обновляются в той же транзакции, что и сами донаты
+            guild_id = self._guild_id(cursor, guild_name)
+            if guild_id is not None:
+                touched_users = {user_name for user_name, _, _ in inserted}
+                removed_users = {user_name for user_name, _, _ in removed_rows}
+                self._update_booster_index(cursor, guild_id, table_name, inserted, removed_users)
+                self._update_rollups(cursor, guild_id, table_name, inserted, removed_rows)
+                self._update_ranks(cursor, guild_id, touched_users | removed_users)
+                if inserted or removed_rows:
+                    self._bump_data_version(cursor, guild_id)
 
             connection.commit()
             logger.info(
-                f"✅ В таблицу {guild_name} сохранено: {saved_count} новых, пропущено: {skipped_count} дубликатов, ошибок: {error_count}")
+                f"✅ В таблицу {guild_name} сохранено: {saved_count} новых, пропущено: {skipped_count} дубликатов, "
+                f"удалено: {removed_count}, ошибок: {error_count}")
+            metrics.inc('db_rows_inserted_total', saved_count, {'guild': guild_name})
+            metrics.inc('db_rows_skipped_total', skipped_count, {'guild': guild_name})
+            metrics.inc('db_rows_failed_total', error_count, {'guild': guild_name})
+            metrics.inc('db_rows_removed_total', removed_count, {'guild': guild_name})
 
-            return True
+            # Дельта прохода: по ней parser_service ставит уведомления подписчикам
+            return {'saved': saved_count, 'skipped': skipped_count, 'errors': error_count,
+                    'removed': removed_count, 'inserted': inserted}
 
         except Error as e:
             logger.error(f"❌ Общая ошибка БД: {e}")
@@ -431,8 +1125,429 @@ class DatabaseManager:
             if connection.is_connected():
                 connection.close()
 
-    def get_existing_donations_set(self, guild_name: str):
-        """Получает множество существующих донатов для конкретной гильдии"""
+    def _load_snapshot(self, cursor, table_name: str):
+        """Последний снимок таблицы; None, если его нет или он не читается (тогда снимок строится заново)"""
+        cursor.execute("SELECT data FROM scrape_snapshots WHERE table_name = %s", (table_name,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        try:
+            return scrape_snapshots.decode(bytes(row[0]))
+        except (ValueError, zlib.error) as e:
+            logger.warning(f"⚠️ Снимок {table_name} поврежден, строим заново: {e}")
+            return None
+
+    def _store_snapshot(self, cursor, table_name: str, entries):
+        data = scrape_snapshots.encode(entries)
+        sql = self.backend.upsert_sql('scrape_snapshots', ['table_name', 'row_count', 'data'], ['table_name'], {
+            'row_count': self.backend.excluded('row_count'),
+            'data': self.backend.excluded('data'),
+        })
+        cursor.execute(sql, (table_name, len(entries), data))
+        metrics.set_gauge('snapshot_bytes', len(data), {'table': table_name})
+
+    def _delete_fingerprints(self, cursor, table_name: str, fingerprints, chunk_size: int = 500):
+        """Удаляет донаты по отпечаткам через индекс fingerprint. Возвращает число удаленных строк"""
+        fingerprints = list(fingerprints)
+        deleted = 0
+        for start in range(0, len(fingerprints), chunk_size):
+            chunk = fingerprints[start:start + chunk_size]
+            cursor.execute(
+                f"DELETE FROM `{table_name}` WHERE fingerprint IN ({', '.join(['%s'] * len(chunk))})", chunk)
+            deleted += cursor.rowcount
+        if deleted:
+            logger.info(f"🧹 {table_name}: удалено донатов, исчезнувших с сайта: {deleted}")
+        return deleted
+
+    def _fingerprint_rows(self, cursor, table_name: str, fingerprints, chunk_size: int = 500):
+        """{отпечаток: (ник, сумма, дата)} исчезнувших из выгрузки донатов, которые есть в БД"""
+        fingerprints = list(fingerprints)
+        rows = {}
+        for start in range(0, len(fingerprints), chunk_size):
+            chunk = fingerprints[start:start + chunk_size]
+            cursor.execute(f"SELECT fingerprint, user_name, sum, date_buster FROM `{table_name}` "
+                           f"WHERE fingerprint IN ({', '.join(['%s'] * len(chunk))})", chunk)
+            for fingerprint, user_name, amount, date in cursor.fetchall():
+                rows[fingerprint] = (user_name, amount, date)
+        return rows
+
+    def _move_fingerprints(self, cursor, table_name: str, moved: dict):
+        """Переносит отпечатки сдвинувшихся по времени донатов на строки БД; дата остается первой увиденной"""
+        if moved:
+            cursor.executemany(f"UPDATE `{table_name}` SET fingerprint = %s WHERE fingerprint = %s",
+                               [(new, old) for old, new in moved.items()])
+            logger.info(f"🔁 {table_name}: время на сайте сдвинулось у {len(moved)} донатов, строки обновлены")
+
+    def _guild_id(self, cursor, guild_name: str):
+        cursor.execute("SELECT id FROM guilds WHERE name = %s", (guild_name,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _update_booster_index(self, cursor, guild_id: int, table_name: str, inserted, removed_users=()):
+        """Поддерживает booster_index: новые донаты прибавляются инкрементом,
+        ники с удаленными донатами пересчитываются по таблице гильдии"""
+        cursor.execute("SELECT 1 FROM booster_index WHERE guild_id = %s LIMIT 1", (guild_id,))
+        if cursor.fetchone() is None:
+            # Гильдия еще не проиндексирована: строим ее сводку по всей таблице
+            self._rebuild_booster_index(cursor, table_name, guild_id)
+            return
+
+        totals = {}
+        for user_name, amount, date in inserted:
+            total, count, last_date = totals.get(user_name, (0, 0, date))
+            totals[user_name] = (total + amount, count + 1, max(last_date, date))
+        if totals:
+            sql = self.backend.upsert_sql(
+                'booster_index', ['name_norm', 'guild_id', 'user_name', 'total', 'donations', 'last_date'],
+                ['name_norm', 'guild_id', 'user_name'], {
+                    'total': f"`total` + {self.backend.excluded('total')}",
+                    'donations': f"`donations` + {self.backend.excluded('donations')}",
+                    'last_date': self.backend.greatest(
+                        f"COALESCE(`last_date`, {self.backend.excluded('last_date')})",
+                        self.backend.excluded('last_date')),
+                })
+            cursor.executemany(sql, [
+                (normalize_user_name(user_name), guild_id, user_name, total, count, last_date)
+                for user_name, (total, count, last_date) in totals.items()
+            ])
+
+        if removed_users:
+            self._rebuild_booster_index(cursor, table_name, guild_id, removed_users)
+
+    def _rebuild_booster_index(self, cursor, table_name: str, guild_id: int, user_names=None):
+        """Пересчитывает сводку гильдии (или только указанных ников) агрегатом по таблице донатов"""
+        if user_names is None:
+            cursor.execute("DELETE FROM booster_index WHERE guild_id = %s", (guild_id,))
+            cursor.execute(f"SELECT user_name, SUM(sum), COUNT(*), MAX(date_buster) FROM `{table_name}` "
+                           f"WHERE user_name IS NOT NULL GROUP BY user_name")
+        else:
+            user_names = list(user_names)
+            placeholders = ', '.join(['%s'] * len(user_names))
+            cursor.execute(f"DELETE FROM booster_index WHERE guild_id = %s AND user_name IN ({placeholders})",
+                           [guild_id] + user_names)
+            cursor.execute(f"SELECT user_name, SUM(sum), COUNT(*), MAX(date_buster) FROM `{table_name}` "
+                           f"WHERE user_name IN ({placeholders}) GROUP BY user_name", user_names)
+
+        rows = [
+            (normalize_user_name(user_name), guild_id, user_name, int(total or 0), count, last_date)
+            for user_name, total, count, last_date in cursor.fetchall()
+        ]
+        if rows:
+            cursor.executemany(
+                "INSERT INTO booster_index "
+                "(name_norm, guild_id, user_name, total, donations, last_date) VALUES (%s, %s, %s, %s, %s, %s)",
+                rows)
+
+    def _bump_data_version(self, cursor, guild_id: int):
+        sql = self.backend.upsert_sql('guild_data_versions', ['guild_id', 'version'], ['guild_id'], {
+            'version': "`version` + 1",
+        })
+        cursor.execute(sql, (guild_id, 1))
+
+    def get_chart_file(self, guild_id: int, chart_type: str):
+        """Версия данных гильдии и file_id графика этой версии одним запросом.
+        Возвращает (версия, file_id или None) или None при ошибке"""
+        connection = self.connect()
+        if not connection:
+            return None
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+                SELECT v.version, c.file_id
+                FROM guild_data_versions v
+                LEFT JOIN chart_files c
+                    ON c.guild_id = v.guild_id AND c.chart_type = %s AND c.data_version = v.version
+                WHERE v.guild_id = %s
+            """, (chart_type, guild_id))
+            row = cursor.fetchone()
+            return (row[0], row[1]) if row else (0, None)
+        except Error as e:
+            logger.error(f"Ошибка получения графика {chart_type} гильдии {guild_id}: {e}")
+            return None
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def save_chart_file_id(self, guild_id: int, chart_type: str, data_version: int, file_id: str):
+        """Запоминает file_id загруженного графика: повторный показ той же версии обходится без рендера и загрузки"""
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            sql = self.backend.upsert_sql(
+                'chart_files', ['guild_id', 'chart_type', 'data_version', 'file_id'], ['guild_id', 'chart_type'], {
+                    'data_version': self.backend.excluded('data_version'),
+                    'file_id': self.backend.excluded('file_id'),
+                })
+            cursor.execute(sql, (guild_id, chart_type, data_version, file_id))
+            connection.commit()
+            return True
+        except Error as e:
+            logger.error(f"Ошибка сохранения file_id графика {chart_type} гильдии {guild_id}: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def get_daily_totals(self, guild_id: int, since: datetime.date = None):
+        """Суммы бустов гильдии по дням из предагрегатов: [(день, сумма)] по возрастанию дат или None при ошибке"""
+        connection = self.connect()
+        if not connection:
+            return None
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+                SELECT bucket, total FROM guild_rollups
+                WHERE guild_id = %s AND period = %s AND bucket >= %s
+                ORDER BY bucket
+            """, (guild_id, rollups.DAY, since or datetime.date(1970, 1, 1)))
+            return [(bucket, int(total)) for bucket, total in cursor.fetchall()]
+        except Error as e:
+            logger.error(f"Ошибка получения сумм по дням гильдии {guild_id}: {e}")
+            return None
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def _update_ranks(self, cursor, guild_id: int, user_names):
+        """Переставляет в guild_ranks только затронутых проходом бустеров.
+        Каждый бустер переезжает на новое место, а стоящие между старым и новым местом сдвигаются на одно;
+        у сдвинутых впервые за проход запоминается prev_rank"""
+        cursor.execute("SELECT MAX(rank_version) FROM guild_ranks WHERE guild_id = %s", (guild_id,))
+        version = cursor.fetchone()[0]
+        if version is None:
+            # Мест еще нет: расставляем всех по booster_index
+            self._rebuild_ranks(cursor, guild_id)
+            return
+
+        user_names = sorted(user_names)
+        if not user_names:
+            return
+        version += 1
+
+        # Актуальные суммы затронутых бустеров уже посчитаны в booster_index
+        placeholders = ', '.join(['%s'] * len(user_names))
+        cursor.execute(f"SELECT user_name, total, donations FROM booster_index "
+                       f"WHERE guild_id = %s AND user_name IN ({placeholders})", [guild_id] + user_names)
+        totals = {user_name: (int(total), donations) for user_name, total, donations in cursor.fetchall()}
+        cursor.execute("SELECT COUNT(*) FROM guild_ranks WHERE guild_id = %s", (guild_id,))
+        count = cursor.fetchone()[0]
+
+        shift_sql = """
+            UPDATE guild_ranks SET
+                prev_rank = CASE WHEN rank_version < %s THEN user_rank ELSE prev_rank END,
+                rank_version = %s,
+                user_rank = user_rank + %s
+            WHERE guild_id = %s AND user_rank >= %s AND user_rank <= %s
+        """
+        for user_name in user_names:
+            # Место читается заново: его могли сдвинуть перестановки предыдущих бустеров
+            cursor.execute("SELECT user_rank FROM guild_ranks WHERE guild_id = %s AND user_name = %s",
+                           (guild_id, user_name))
+            row = cursor.fetchone()
+            old_rank = row[0] if row else None
+            if user_name not in totals:
+                # Донатов у бустера не осталось: все ниже него поднимаются на место
+                if old_rank is not None:
+                    cursor.execute("DELETE FROM guild_ranks WHERE guild_id = %s AND user_name = %s",
+                                   (guild_id, user_name))
+                    cursor.execute(shift_sql, (version, version, -1, guild_id, old_rank + 1, count))
+                    count -= 1
+                continue
+
+            total, donations = totals[user_name]
+            cursor.execute("""
+                SELECT COUNT(*) FROM guild_ranks
+                WHERE guild_id = %s AND user_name <> %s AND (total > %s OR (total = %s AND user_name < %s))
+            """, (guild_id, user_name, total, total, user_name))
+            new_rank = cursor.fetchone()[0] + 1
+
+            if old_rank is None:
+                cursor.execute(shift_sql, (version, version, 1, guild_id, new_rank, count))
+                cursor.execute("""
+                    INSERT INTO guild_ranks (guild_id, user_name, total, donations, user_rank, prev_rank, rank_version)
+                    VALUES (%s, %s, %s, %s, %s, NULL, %s)
+                """, (guild_id, user_name, total, donations, new_rank, version))
+                count += 1
+                continue
+
+            if new_rank < old_rank:
+                cursor.execute(shift_sql, (version, version, 1, guild_id, new_rank, old_rank - 1))
+            elif new_rank > old_rank:
+                cursor.execute(shift_sql, (version, version, -1, guild_id, old_rank + 1, new_rank))
+            cursor.execute("""
+                UPDATE guild_ranks SET
+                    prev_rank = CASE WHEN rank_version < %s THEN user_rank ELSE prev_rank END,
+                    rank_version = %s,
+                    total = %s, donations = %s, user_rank = %s
+                WHERE guild_id = %s AND user_name = %s
+            """, (version, version, total, donations, new_rank, guild_id, user_name))
+
+    def _rebuild_ranks(self, cursor, guild_id: int):
+        """Расставляет места гильдии заново; без истории движения (prev_rank = текущее место)"""
+        cursor.execute("DELETE FROM guild_ranks WHERE guild_id = %s", (guild_id,))
+        cursor.execute("SELECT user_name, total, donations FROM booster_index WHERE guild_id = %s "
+                       "ORDER BY total DESC, user_name", (guild_id,))
+        rows = [
+            (guild_id, user_name, int(total), donations, rank, rank, 1)
+            for rank, (user_name, total, donations) in enumerate(cursor.fetchall(), 1)
+        ]
+        if rows:
+            cursor.executemany("""
+                INSERT INTO guild_ranks (guild_id, user_name, total, donations, user_rank, prev_rank, rank_version)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+
+    def _update_rollups(self, cursor, guild_id: int, table_name: str, inserted, removed_rows=()):
+        """Прибавляет к предагрегатам вставленные донаты и вычитает удаленные"""
+        cursor.execute("SELECT 1 FROM guild_rollups WHERE guild_id = %s LIMIT 1", (guild_id,))
+        if cursor.fetchone() is None:
+            # Предагрегатов гильдии еще нет: считаем их по всей таблице
+            self._rebuild_rollups(cursor, table_name, guild_id)
+            return
+
+        changes = rollups.merge(rollups.deltas(inserted), rollups.deltas(removed_rows, -1))
+        self._apply_rollup_deltas(cursor, guild_id, changes)
+
+    def _rebuild_rollups(self, cursor, table_name: str, guild_id: int):
+        for table in ('guild_rollups', 'guild_rollup_users'):
+            cursor.execute(f"DELETE FROM {table} WHERE guild_id = %s", (guild_id,))
+        # Строки без даты (заглушка партиционированной таблицы) ни в один период не попадают
+        cursor.execute(f"SELECT user_name, sum, date_buster FROM `{table_name}` "
+                       f"WHERE user_name IS NOT NULL AND date_buster > %s", (partitions.MISSING_DATE,))
+        self._apply_rollup_deltas(cursor, guild_id, rollups.deltas(cursor.fetchall()))
+
+    def _apply_rollup_deltas(self, cursor, guild_id: int, changes: dict):
+        """Применяет {(период, бакет, ник): [сумма, число]} к guild_rollup_users
+        и пересчитывает итоги только затронутых бакетов"""
+        changes = {key: value for key, value in changes.items() if value[1]}
+        if not changes:
+            return
+
+        sql = self.backend.upsert_sql(
+            'guild_rollup_users', ['guild_id', 'period', 'bucket', 'user_name', 'total', 'donations'],
+            ['guild_id', 'period', 'bucket', 'user_name'], {
+                'total': f"`total` + {self.backend.excluded('total')}",
+                'donations': f"`donations` + {self.backend.excluded('donations')}",
+            })
+        cursor.executemany(sql, [
+            (guild_id, period, bucket, user_name, total, count)
+            for (period, bucket, user_name), (total, count) in changes.items()
+        ])
+
+        touched = {(period, bucket) for period, bucket, _ in changes}
+        has_removals = any(count < 0 for _, count in changes.values())
+        upsert_totals = self.backend.upsert_sql(
+            'guild_rollups', ['guild_id', 'period', 'bucket', 'total', 'donations', 'boosters'],
+            ['guild_id', 'period', 'bucket'], {
+                column: self.backend.excluded(column) for column in ('total', 'donations', 'boosters')
+            })
+        for period, bucket in touched:
+            if has_removals:
+                cursor.execute("DELETE FROM guild_rollup_users "
+                               "WHERE guild_id = %s AND period = %s AND bucket = %s AND donations <= 0",
+                               (guild_id, period, bucket))
+            # Бакет читается по префиксу первичного ключа: это строки одного дня/недели/месяца
+            cursor.execute("SELECT COALESCE(SUM(total), 0), COALESCE(SUM(donations), 0), COUNT(*) "
+                           "FROM guild_rollup_users WHERE guild_id = %s AND period = %s AND bucket = %s",
+                           (guild_id, period, bucket))
+            total, count, boosters = cursor.fetchone()
+            if boosters:
+                cursor.execute(upsert_totals, (guild_id, period, bucket, int(total), int(count), boosters))
+            else:
+                cursor.execute("DELETE FROM guild_rollups WHERE guild_id = %s AND period = %s AND bucket = %s",
+                               (guild_id, period, bucket))
+
+    def get_period_summary(self, guild_id: int, period: str, top_n: int = 10, today: datetime.date = None):
+        """Итоги гильдии за текущий и прошлый день/неделю/месяц и топ бустеров текущего периода из предагрегатов.
+        Возвращает словарь или None при ошибке"""
+        bucket = rollups.bucket_start(period, today or rollups.site_today())
+        previous = rollups.previous_bucket(period, bucket)
+        empty = {'total': 0, 'donations': 0, 'boosters': 0}
+
+        connection = self.connect()
+        if not connection:
+            return None
+
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT bucket, total, donations, boosters FROM guild_rollups
+                WHERE guild_id = %s AND period = %s AND bucket IN (%s, %s)
+            """, (guild_id, period, bucket, previous))
+            totals = {row['bucket']: row for row in cursor.fetchall()}
+
+            cursor.execute("""
+                SELECT user_name, total, donations FROM guild_rollup_users
+                WHERE guild_id = %s AND period = %s AND bucket = %s
+                ORDER BY total DESC, user_name
+                LIMIT %s
+            """, (guild_id, period, bucket, top_n))
+            top = [(row['user_name'], int(row['total']), row['donations']) for row in cursor.fetchall()]
+
+            return {
+                'period': period,
+                'bucket': bucket,
+                'current': totals.get(bucket, empty),
+                'previous': totals.get(previous, empty),
+                'top': top,
+            }
+        except Error as e:
+            logger.error(f"Ошибка получения итогов гильдии {guild_id} за период {period}: {e}")
+            return None
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def search_boosters(self, query: str, limit: int = 50):
+        """Бустеры, чей ник начинается с query, по всем гильдиям: одна выборка по диапазону первичного ключа.
+        Точное совпадение ника идет первым. Возвращает список словарей или None при ошибке"""
+        prefix = normalize_user_name(query)
+        if not prefix:
+            return []
+
+        connection = self.connect()
+        if not connection:
+            return None
+
+        try:
+            cursor = connection.cursor(dictionary=True)
+            # '!' экранирует % и _ из ника одинаково в MySQL и SQLite
+            pattern = prefix.replace('!', '!!').replace('%', '!%').replace('_', '!_') + '%'
+            cursor.execute("""
+                SELECT b.user_name, g.name AS guild_name, b.total, b.donations, b.last_date
+                FROM booster_index b
+                JOIN guilds g ON g.id = b.guild_id
+                WHERE b.name_norm LIKE %s ESCAPE '!'
+                ORDER BY b.name_norm <> %s, b.name_norm, b.user_name, b.total DESC
+                LIMIT %s
+            """, (pattern, prefix, limit))
+            return cursor.fetchall()
+        except Error as e:
+            logger.error(f"Ошибка поиска бустера '{query}': {e}")
+            return None
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def _backfill_fingerprints(self, cursor, table_name: str):
+        """Проставляет отпечатки строкам, сохраненным до их появления (или залитым в обход save_donations)"""
+        cursor.execute(f"SELECT id, user_name, sum, date_buster FROM `{table_name}` "
+                       f"WHERE fingerprint IS NULL AND date_buster IS NOT NULL")
+        updates = [
+            (scrape_snapshots.fingerprint(donation_key(user_name, amount, date)), row_id)
+            for row_id, user_name, amount, date in cursor.fetchall()
+        ]
+        if updates:
+            cursor.executemany(f"UPDATE `{table_name}` SET fingerprint = %s WHERE id = %s", updates)
+            logger.info(f"🔧 {table_name}: проставлены отпечатки {len(updates)} строкам")
+
+    def get_existing_donations_set(self, guild_name: str, since: datetime.datetime = None):
+        """Получает множество существующих донатов для конкретной гильдии (начиная с since, если задано)"""
         # Гарантируем, что таблица существует
         if not self.ensure_guild_table_exists(guild_name):
             return set()
@@ -444,13 +1559,22 @@ class DatabaseManager:
         try:
             table_name = self.get_safe_table_name(guild_name)
             cursor = connection.cursor()
-            cursor.execute(f"SELECT user_name, sum, date_buster FROM `{table_name}`")
+            if since is None:
+                cursor.execute(f"SELECT user_name, sum, date_buster FROM `{table_name}`")
+            else:
+                # Окно по date_buster читает только нужные партиции (или диапазон индекса в SQLite)
+                cursor.execute(f"SELECT user_name, sum, date_buster FROM `{table_name}` WHERE date_buster >= %s",
+                               (since,))
             existing_records = cursor.fetchall()
 
             existing_donations = set()
             for user_name, amount, date in existing_records:
-                donation_id = f"{user_name}|{amount}|{date}"
-                existing_donations.add(donation_id)
+                if date is None:
+                    continue
+                existing_donations.add(donation_key(user_name, amount, date))
+                # Строки до миграции на DATETIME хранят полночь: сверяем их только по дню
+                if not isinstance(date, datetime.datetime) or date.time() == datetime.time():
+                    existing_donations.add(legacy_donation_key(user_name, amount, date))
 
             logger.info(f"📊 Загружено {len(existing_donations)} существующих донатов для гильдии {guild_name}")
             return existing_donations
@@ -468,20 +1592,22 @@ class DatabaseManager:
             return None
 
         try:
-            existing_donations = self.get_existing_donations_set(guild_name)
+            dates = normalize_date_column(df['Дата'])
+            existing_donations = self.get_existing_donations_set(guild_name, since=dedup_window_start(dates))
 
             new_donations_count = 0
             new_donations_amount = 0
             new_donations_users = set()
 
-            for _, row in df.iterrows():
-                user_name = str(row['Пользователь'])[:25]
-                amount = row['Сумма']
-                date = self.parse_date(row['Дата'])
+            for user, amount, date in zip(df['Пользователь'], df['Сумма'], dates):
+                if date is None:
+                    continue
+                user_name = str(user)[:25]
 
-                donation_id = f"{user_name}|{amount}|{date}"
+                donation_id = donation_key(user_name, amount, date)
 
-                if donation_id not in existing_donations:
+                if donation_id not in existing_donations and \
+                        legacy_donation_key(user_name, amount, date) not in existing_donations:
                     new_donations_count += 1
                     new_donations_amount += amount
                     new_donations_users.add(user_name)
@@ -496,36 +1622,6 @@ class DatabaseManager:
             logger.error(f"Ошибка при получении статистики новых донатов: {e}")
             return None
 
-    def parse_date(self, date_str):
-        """Преобразует дату в формат MySQL DATE"""
-        try:
-            # Проверяем, что date_str не None и не пустой
-            if not date_str or date_str is None:
-                return "2025-01-01"
-
-            # Если это уже дата в правильном формате
-            if isinstance(date_str, str) and re.match(r'\d{4}-\d{2}-\d{2}', date_str):
-                return date_str
-
-            months = {
-                'янв.': '01', 'фев.': '02', 'мар.': '03', 'апр.': '04',
-                'мая': '05', 'июн.': '06', 'июл.': '07', 'авг.': '08',
-                'сен.': '09', 'окт.': '10', 'нояб.': '11', 'дек.': '12'
-            }
-
-            date_part = date_str.split(',')[0].strip()
-            parts = date_part.split()
-
-            if len(parts) == 3:
-                day, month_ru, year = parts
-                month = months.get(month_ru, '01')
-                return f"{year}-{month}-{day.zfill(2)}"
-
-            return "2025-01-01"
-        except Exception as e:
-            logger.error(f"Ошибка парсинга даты '{date_str}': {e}")
-            return "2025-01-01"
-
     def get_all_donations(self, guild_name: str):
         """Получает все донаты из таблицы гильдии"""
         # Гарантируем, что таблица существует
@@ -551,6 +1647,61 @@ class DatabaseManager:
             if connection.is_connected():
                 connection.close()
 
+    def get_donations_page(self, guild_name: str, offset: int = 0, limit: int = 25):
+        """Страница истории донатов (новые сверху). Возвращает (записи, всего записей)"""
+        if not self.ensure_guild_table_exists(guild_name):
+            return [], 0
+
+        connection = self.connect()
+        if not connection:
+            return [], 0
+
+        try:
+            table_name = self.get_safe_table_name(guild_name)
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(f"SELECT COUNT(*) AS total FROM `{table_name}`")
+            total = cursor.fetchone()['total']
+            cursor.execute(
+                f"SELECT user_name, sum, date_buster FROM `{table_name}` "
+                f"ORDER BY date_buster DESC, user_name ASC LIMIT %s OFFSET %s",
+                (limit, offset),
+            )
+            return cursor.fetchall(), total
+        except Error as e:
+            logger.error(f"Ошибка при получении страницы истории {guild_name}: {e}")
+            return [], 0
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def get_recent_donations(self, guild_name: str, days: int = 7, limit: int = None):
+        """Донаты за последние days дней, новые сверху; читаются только партиции этого периода"""
+        if not self.ensure_guild_table_exists(guild_name):
+            return []
+
+        connection = self.connect()
+        if not connection:
+            return []
+
+        try:
+            table_name = self.get_safe_table_name(guild_name)
+            cursor = connection.cursor(dictionary=True)
+            since = datetime.datetime.now() - datetime.timedelta(days=days)
+            sql = (f"SELECT user_name, sum, date_buster FROM `{table_name}` "
+                   f"WHERE date_buster >= %s ORDER BY date_buster DESC, user_name ASC")
+            params = [since]
+            if limit is not None:
+                sql += " LIMIT %s"
+                params.append(limit)
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        except Error as e:
+            logger.error(f"Ошибка при получении недавних донатов {guild_name}: {e}")
+            return []
+        finally:
+            if connection.is_connected():
+                connection.close()
+
     def delete_guild(self, guild_name: str):
         """Удаляет гильдию из БД и её таблицу донатов"""
         connection = self.connect()
@@ -560,14 +1711,23 @@ class DatabaseManager:
         try:
             cursor = connection.cursor()
 
-            # 1. Удаляем запись из таблицы guilds
+            # 1. Удаляем подписки и неотправленные уведомления, затем запись из таблицы guilds
+            for table in ('subscriptions', 'notification_outbox', 'guild_leases', 'booster_index',
+                          'guild_rollups', 'guild_rollup_users', 'guild_ranks', 'guild_data_versions',
+                          'chart_files'):
+                if self._table_exists(cursor, table):
+                    cursor.execute(
+                        f"DELETE FROM {table} WHERE guild_id IN (SELECT id FROM guilds WHERE name = %s)", (guild_name,))
             delete_sql = "DELETE FROM guilds WHERE name = %s"
             cursor.execute(delete_sql, (guild_name,))
 
-            # 2. Удаляем таблицу донатов этой гильдии
+            # 2. Удаляем таблицу донатов этой гильдии и ее архив
             table_name = self.get_safe_table_name(guild_name)
             drop_table_sql = f"DROP TABLE IF EXISTS `{table_name}`"
             cursor.execute(drop_table_sql)
+            cursor.execute(f"DROP TABLE IF EXISTS `{partitions.archive_table_name(table_name)}`")
+            if self._table_exists(cursor, 'scrape_snapshots'):
+                cursor.execute("DELETE FROM scrape_snapshots WHERE table_name = %s", (table_name,))
 
             connection.commit()
             logger.info(f"✅ Гильдия '{guild_name}' и её таблица удалены из БД")
@@ -580,8 +1740,174 @@ class DatabaseManager:
             if connection.is_connected():
                 connection.close()
 
+    def _table_exists(self, cursor, table_name: str) -> bool:
+        cursor.execute(self.backend.table_exists_sql(), (table_name,))
+        return cursor.fetchone() is not None
+
+    def subscribe(self, chat_id: int, guild_id: int):
+        """Подписывает чат на уведомления о новых бустах гильдии"""
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                f"{self.backend.insert_ignore()} INTO subscriptions (chat_id, guild_id) VALUES (%s, %s)",
+                (chat_id, guild_id),
+            )
+            connection.commit()
+            logger.info(f"🔔 Чат {chat_id} подписан на гильдию {guild_id}")
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка подписки чата {chat_id}: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def unsubscribe(self, chat_id: int, guild_id: int = None):
+        """Отписывает чат от гильдии (или от всех гильдий, если guild_id не указан)"""
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            if guild_id is None:
+                cursor.execute("DELETE FROM subscriptions WHERE chat_id = %s", (chat_id,))
+                cursor.execute("DELETE FROM notification_outbox WHERE chat_id = %s", (chat_id,))
+            else:
+                cursor.execute("DELETE FROM subscriptions WHERE chat_id = %s AND guild_id = %s", (chat_id, guild_id))
+            connection.commit()
+            logger.info(f"🔕 Чат {chat_id} отписан от гильдии {guild_id if guild_id is not None else '(все)'}")
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка отписки чата {chat_id}: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def is_subscribed(self, chat_id: int, guild_id: int):
+        """Проверяет, подписан ли чат на гильдию"""
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1 FROM subscriptions WHERE chat_id = %s AND guild_id = %s", (chat_id, guild_id))
+            return cursor.fetchone() is not None
+        except Error as e:
+            logger.error(f"Ошибка проверки подписки чата {chat_id}: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def enqueue_notifications(self, guild_name: str, inserted, top_n: int = 5):
+        """Ставит в outbox дельту прохода парсера для каждого подписанного чата. Возвращает число строк очереди"""
+        if not inserted:
+            return 0
+
+        totals = {}
+        for user_name, amount, _ in inserted:
+            totals[user_name] = totals.get(user_name, 0) + amount
+        top_boosters = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:top_n]
+
+        connection = self.connect()
+        if not connection:
+            return 0
+
+        try:
+            cursor = connection.cursor()
+            # Раскладываем по подписчикам одним запросом: чаты без подписки строк не получают
+            cursor.execute("""
+                INSERT INTO notification_outbox (chat_id, guild_id, new_count, new_amount, new_users, top_boosters)
+                SELECT s.chat_id, g.id, %s, %s, %s, %s
+                FROM subscriptions s
+                JOIN guilds g ON g.id = s.guild_id
+                WHERE g.name = %s
+            """, (
+                len(inserted),
+                sum(totals.values()),
+                len(totals),
+                json.dumps(top_boosters, ensure_ascii=False),
+                guild_name,
+            ))
+            queued = cursor.rowcount
+            connection.commit()
+            if queued:
+                logger.info(f"📬 Гильдия {guild_name}: {len(inserted)} новых бустов, уведомлений в очереди: {queued}")
+            metrics.inc('notifications_enqueued_total', queued, {'guild': guild_name})
+            return queued
+        except Error as e:
+            logger.error(f"❌ Ошибка постановки уведомлений для {guild_name}: {e}")
+            return 0
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def fetch_pending_notifications(self, limit: int = 500):
+        """Неотправленные уведомления вместе с названием гильдии, сгруппированные по чатам"""
+        connection = self.connect()
+        if not connection:
+            return []
+
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT o.id, o.chat_id, o.guild_id, g.name AS guild_name, o.new_count, o.new_amount,
+                       o.new_users, o.top_boosters, o.attempts
+                FROM notification_outbox o
+                JOIN guilds g ON g.id = o.guild_id
+                ORDER BY o.chat_id, o.id
+                LIMIT %s
+            """, (limit,))
+            notifications = cursor.fetchall()
+            for notification in notifications:
+                notification['top_boosters'] = json.loads(notification['top_boosters'] or '[]')
+            return notifications
+        except Error as e:
+            logger.error(f"Ошибка чтения очереди уведомлений: {e}")
+            return []
+        finally:
+            if connection.is_connected():
+                connection.close()
+
+    def complete_notifications(self, delivered_ids, failed_ids=(), max_attempts: int = 5):
+        """Удаляет доставленные уведомления; у неудачных увеличивает attempts и отбрасывает исчерпавшие попытки"""
+        if not delivered_ids and not failed_ids:
+            return True
+
+        connection = self.connect()
+        if not connection:
+            return False
+
+        try:
+            cursor = connection.cursor()
+            for ids, sql in (
+                (list(delivered_ids), "DELETE FROM notification_outbox WHERE id IN ({})"),
+                (list(failed_ids), "UPDATE notification_outbox SET attempts = attempts + 1 WHERE id IN ({})"),
+            ):
+                if ids:
+                    cursor.execute(sql.format(', '.join(['%s'] * len(ids))), ids)
+            if failed_ids:
+                cursor.execute("DELETE FROM notification_outbox WHERE attempts >= %s", (max_attempts,))
+            connection.commit()
+            return True
+        except Error as e:
+            logger.error(f"❌ Ошибка обновления очереди уведомлений: {e}")
+            return False
+        finally:
+            if connection.is_connected():
+                connection.close()
+
     def get_all_donations_grouped(self, guild_name: str, limit=50):
-        """Получает донаты из таблицы гильдии с группировкой по пользователям"""
+        """Получает лидерборд гильдии: [(ник, сумма, число бустов, движение)].
+        Движение - на сколько мест бустер поднялся за последний проход (отрицательное - опустился),
+        None - новый бустер. Читается из guild_ranks по индексу мест; пока мест нет - группировкой таблицы"""
         # Гарантируем, что таблица существует
         if not self.ensure_guild_table_exists(guild_name):
             return None
@@ -593,6 +1919,25 @@ class DatabaseManager:
         try:
             table_name = self.get_safe_table_name(guild_name)
             cursor = connection.cursor()
+
+            if self._table_exists(cursor, 'guild_ranks'):
+                cursor.execute("""
+                SELECT r.user_name, r.total, r.donations, r.user_rank, r.prev_rank,
+                       r.rank_version = (SELECT MAX(rank_version) FROM guild_ranks WHERE guild_id = g.id)
+                FROM guilds g
+                JOIN guild_ranks r ON r.guild_id = g.id
+                WHERE g.name = %s
+                ORDER BY r.user_rank
+                LIMIT %s
+                """, (guild_name, limit))
+                ranked = cursor.fetchall()
+                if ranked:
+                    return [
+                        (user_name, int(total), donations,
+                         (None if prev_rank is None else prev_rank - rank) if last_pass else 0)
+                        for user_name, total, donations, rank, prev_rank, last_pass in ranked
+                    ]
+
             sql = f"""
             SELECT 
                 user_name,
@@ -604,7 +1949,7 @@ class DatabaseManager:
             LIMIT %s
             """
             cursor.execute(sql, (limit,))
-            donations = cursor.fetchall()
+            donations = [(user_name, total, count, 0) for user_name, total, count in cursor.fetchall()]
             logger.info(f"📊 Получено {len(donations)} группированных записей из таблицы {guild_name}")
             return donations
         except Error as e:
@@ -628,7 +1973,7 @@ class DatabaseManager:
             # Создаем временную таблицу без дубликатов
             cursor.execute(f"""
                 CREATE TEMPORARY TABLE temp_{table_name} AS
-                SELECT DISTINCT user_name, sum, date_buster 
+                SELECT DISTINCT user_name, sum, date_buster, fingerprint
                 FROM `{table_name}`
             """)
 
@@ -637,10 +1982,17 @@ class DatabaseManager:
 
             # Восстанавливаем данные без дубликатов
             cursor.execute(f"""
-                INSERT INTO `{table_name}` (user_name, sum, date_buster)
-                SELECT user_name, sum, date_buster FROM temp_{table_name}
+                INSERT INTO `{table_name}` (user_name, sum, date_buster, fingerprint)
+                SELECT user_name, sum, date_buster, fingerprint FROM temp_{table_name}
             """)
 
+            guild_id = self._guild_id(cursor, guild_name)
+            if guild_id is not None:
+                self._rebuild_booster_index(cursor, table_name, guild_id)
+                self._rebuild_rollups(cursor, table_name, guild_id)
+                self._rebuild_ranks(cursor, guild_id)
+                self._bump_data_version(cursor, guild_id)
+
             connection.commit()
 
             cursor.execute(f"SELECT COUNT(*) FROM `{table_name}`")
@@ -657,5 +2009,11 @@ class DatabaseManager:
                 connection.close()
 
 
+# Замеряем латентность всех методов, которые ходят в БД
+_NON_DB_METHODS = {'url_to_punycode', 'get_safe_table_name'}
+for _name, _method in list(vars(DatabaseManager).items()):
+    if callable(_method) and not _name.startswith('_') and _name not in _NON_DB_METHODS:
+        setattr(DatabaseManager, _name, metrics.timed('db_query_seconds', method=_name)(_method))
+
 # Создаем экземпляр менеджера базы данных
 db_manager = DatabaseManager()
\ No newline at end of file
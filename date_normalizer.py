@@ -0,0 +1,165 @@
+import re
+import logging
+import datetime
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Время на сайте отображается по Москве; даты с часовым поясом (из API) приводятся к нему
+SITE_TIMEZONE = datetime.timezone(datetime.timedelta(hours=3))
+
+# Месяц по первым трем буквам: покрывает "янв.", "января", "мая", "май", "нояб.", "сент." и т.д.
+MONTHS = {
+    'янв': 1, 'фев': 2, 'мар': 3, 'апр': 4, 'мая': 5, 'май': 5,
+    'июн': 6, 'июл': 7, 'авг': 8, 'сен': 9, 'окт': 10, 'ноя': 11, 'дек': 12,
+}
+
+RELATIVE_DAYS = {'сегодня': 0, 'вчера': 1, 'позавчера': 2}
+
+MINUTE = datetime.timedelta(minutes=1)
+HOUR = datetime.timedelta(hours=1)
+DAY = datetime.timedelta(days=1)
+
+# Основа единицы -> (длина, до чего округлять результат). "Час назад" держится на сайте целый час,
+# поэтому время округляется вниз до единицы: иначе тот же донат получает новое время в каждом проходе
+RELATIVE_UNITS = {
+    'сек': (datetime.timedelta(seconds=1), MINUTE),
+    'мин': (MINUTE, MINUTE),
+    'час': (HOUR, HOUR),
+    'дн': (DAY, DAY),
+    'ден': (DAY, DAY),
+    'нед': (datetime.timedelta(weeks=1), DAY),
+}
+# Календарные единицы в месяцах: "месяц назад", "2 года назад", "5 лет назад"; результат округляется до дня
+RELATIVE_MONTHS = {'мес': 1, 'год': 12, 'лет': 12}
+
+_TIME = r'(?:,?\s*(?:в\s+)?(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?)?'
+
+# "24 мая 2024, 07:08", "3 нояб. 2024 г. в 12:00", "24 мая, 07:08" (текущий год)
+TEXT_DATE_RE = re.compile(
+    r'^(?P<day>\d{1,2})\s+(?P<month>[а-яё]+)\.?(?:\s+(?P<year>\d{4})(?:\s*г\.?)?)?' + _TIME + r'$'
+)
+# "24.05.2024", "24.05.2024 07:08"
+NUMERIC_DATE_RE = re.compile(r'^(?P<day>\d{1,2})\.(?P<month>\d{1,2})\.(?P<year>\d{4})' + _TIME + r'$')
+# "2024-05-24", "2024-05-24 07:08:00", "2024-05-24T07:08:00+03:00"
+ISO_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}(?:[ t]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?(?:z|[+-]\d{2}:?\d{2})?$')
+# "сегодня, 07:08", "вчера в 23:15", "позавчера"
+RELATIVE_DAY_RE = re.compile(r'^(?P<word>сегодня|вчера|позавчера)' + _TIME + r'$')
+# "5 минут назад", "час назад", "2 дня назад"
+RELATIVE_AGO_RE = re.compile(r'^(?:(?P<count>\d+)\s+)?(?P<unit>[а-яё]+)\s+назад$')
+JUST_NOW_RE = re.compile(r'^(?:только что|сейчас)$')
+
+
+def _clean(value: str) -> str:
+    return ' '.join(value.replace('\xa0', ' ').split()).lower()
+
+
+def _time_parts(match):
+    hour = int(match.group('hour') or 0)
+    minute = int(match.group('minute') or 0)
+    second = int(match.group('second') or 0)
+    return hour, minute, second
+
+
+def _floor(value: datetime.datetime, precision: datetime.timedelta) -> datetime.datetime:
+    midnight = datetime.datetime.combine(value.date(), datetime.time())
+    return midnight + (value - midnight) // precision * precision
+
+
+def _subtract_months(value: datetime.datetime, months: int) -> datetime.datetime:
+    """То же число months месяцев назад; 31-е в коротком месяце становится его последним днем"""
+    index = value.year * 12 + value.month - 1 - months
+    year, month = index // 12, index % 12 + 1
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    return value.replace(year=year, month=month, day=min(value.day, (next_month - DAY).day))
+
+
+def _parse_relative(text: str, now: datetime.datetime):
+    """Относительные даты зависят от момента парсинга, поэтому не кэшируются"""
+    if JUST_NOW_RE.match(text):
+        return now.replace(second=0, microsecond=0)
+
+    match = RELATIVE_DAY_RE.match(text)
+    if match:
+        day = now.date() - datetime.timedelta(days=RELATIVE_DAYS[match.group('word')])
+        return datetime.datetime.combine(day, datetime.time(*_time_parts(match)))
+
+    match = RELATIVE_AGO_RE.match(text)
+    if match:
+        count = int(match.group('count') or 1)
+        unit = next((value for stem, value in RELATIVE_UNITS.items() if match.group('unit').startswith(stem)), None)
+        if unit is not None:
+            length, precision = unit
+            return _floor(now - length * count, precision)
+        months = next((value for stem, value in RELATIVE_MONTHS.items() if match.group('unit').startswith(stem)), None)
+        if months is not None:
+            return _floor(_subtract_months(now, months * count), DAY)
+
+    return None
+
+
+@lru_cache(maxsize=65536)
+def _parse_absolute(text: str, year: int):
+    """Абсолютные даты; year подставляется, если на сайте год не указан (текущий год)"""
+    # text уже приведен к нижнему регистру
+    match = TEXT_DATE_RE.match(text)
+    if match:
+        month = MONTHS.get(match.group('month')[:3])
+        if month is None:
+            return None
+        return datetime.datetime(int(match.group('year') or year), month, int(match.group('day')), *_time_parts(match))
+
+    match = NUMERIC_DATE_RE.match(text)
+    if match:
+        return datetime.datetime(int(match.group('year')), int(match.group('month')), int(match.group('day')),
+                                 *_time_parts(match))
+
+    if ISO_DATE_RE.match(text):
+        parsed = datetime.datetime.fromisoformat(text.upper().replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(SITE_TIMEZONE).replace(tzinfo=None)
+        return parsed
+
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _warn_unknown(text: str):
+    logger.warning(f"⚠️ Неизвестный формат даты: '{text}'")
+
+
+def normalize_date(value, now: datetime.datetime = None):
+    """Приводит дату с сайта к datetime; None, если формат не распознан"""
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+
+    text = _clean(str(value))
+    if not text or text in ('nan', 'none', 'nat'):
+        return None
+
+    now = now or datetime.datetime.now()
+    try:
+        parsed = _parse_relative(text, now) or _parse_absolute(text, now.year)
+    except ValueError:
+        parsed = None
+
+    if parsed is None:
+        _warn_unknown(text)
+        return None
+
+    # Дата без года в будущем относится к прошлому году ("31 дек." в январе)
+    if parsed > now + datetime.timedelta(days=1) and not re.search(r'\d{4}', text):
+        parsed = parsed.replace(year=parsed.year - 1)
+    return parsed
+
+
+def normalize_date_column(values, now: datetime.datetime = None):
+    """Нормализует колонку дат: каждое уникальное значение разбирается один раз"""
+    texts = ['' if value is None else str(value) for value in values]
+    now = now or datetime.datetime.now()
+    parsed = {text: normalize_date(text, now) for text in set(texts)}
+    return [parsed[text] for text in texts]
@@ -0,0 +1,146 @@
+# Выбор бэкенда Selenium: standalone Chrome или локальный Chrome, у каждого свой circuit breaker
+# Упавший бэкенд пропускается без ожидания таймаута, пока не истечет cooldown; путь к chromedriver кэшируется
+import os
+import time
+import threading
+from selenium import webdriver
+from metrics import inc, set_gauge
+
+STANDALONE_CHROME_URL = os.getenv('STANDALONE_CHROME_URL', 'http://standalone-chrome.railway.internal:4444')
+# Сколько ошибок подряд открывает breaker и через сколько секунд пробуем бэкенд снова
+DRIVER_FAILURE_THRESHOLD = int(os.getenv('DRIVER_FAILURE_THRESHOLD', 1))
+DRIVER_COOLDOWN = float(os.getenv('DRIVER_COOLDOWN_SECONDS', 120))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Значения гейджа driver_circuit_state
+STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """closed -> open после failure_threshold ошибок подряд; после cooldown одна пробная попытка (half_open)"""
+
+    def __init__(self, name: str, failure_threshold: int = 1, cooldown: float = 120.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str):
+        self.state = state
+        set_gauge('driver_circuit_state', STATE_GAUGE[state], {'backend': self.name})
+
+    def allow(self) -> bool:
+        """Можно ли сейчас обращаться к бэкенду. В half_open пропускает только один пробный вызов"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self._set_state(HALF_OPEN)
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                if self.state != OPEN:
+                    inc('driver_circuit_opened_total', labels={'backend': self.name})
+                self._set_state(OPEN)
+
+    def retry_in(self) -> float:
+        """Через сколько секунд открытый breaker пропустит пробный вызов"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+
+_chromedriver_path = None
+_chromedriver_lock = threading.Lock()
+
+
+def resolve_chromedriver_path() -> str:
+    """Путь к chromedriver: CHROMEDRIVER_PATH или webdriver_manager, один раз на процесс"""
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path is None:
+            path = os.getenv('CHROMEDRIVER_PATH')
+            if not path:
+                from webdriver_manager.chrome import ChromeDriverManager
+                path = ChromeDriverManager().install()
+            _chromedriver_path = path
+        return _chromedriver_path
+
+
+class DriverProvider:
+    """Создает драйвер на первом доступном бэкенде: standalone Chrome, затем локальный Chrome"""
+
+    def __init__(self, remote_url: str = STANDALONE_CHROME_URL, failure_threshold: int = 1,
+                 cooldown: float = 120.0):
+        self.remote_url = remote_url
+        self.breakers = {
+            'remote': CircuitBreaker('remote', failure_threshold, cooldown),
+            'local': CircuitBreaker('local', failure_threshold, cooldown),
+        }
+
+    def _connect_remote(self, options):
+        print(f"🔗 Подключаемся к standalone Chrome: {self.remote_url}")
+        driver = webdriver.Remote(command_executor=self.remote_url, options=options)
+        try:
+            driver.set_page_load_timeout(30)
+            driver.implicitly_wait(10)
+            # Маскировка веб-драйвера
+            driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        except Exception:
+            # Сессия на standalone Chrome уже создана: без quit она занимает слот до таймаута grid
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            raise
+        print("✅ Успешно подключились к standalone Chrome")
+        return driver
+
+    def _connect_local(self, options):
+        from selenium.webdriver.chrome.service import Service
+        print("🔄 Пробуем локальный Chrome...")
+        service = Service(resolve_chromedriver_path())
+        driver = webdriver.Chrome(service=service, options=options)
+        print("✅ Успешно запущен локальный Chrome")
+        return driver
+
+    def get_driver(self, options):
+        """Драйвер с первого бэкенда, чей breaker не открыт; None, если недоступны все"""
+        for backend, connect in (('remote', self._connect_remote), ('local', self._connect_local)):
+            breaker = self.breakers[backend]
+            if not breaker.allow():
+                print(f"⏭️ Бэкенд {backend} недавно не отвечал, пропускаем еще {breaker.retry_in():.0f} с")
+                continue
+            try:
+                driver = connect(options)
+            except Exception as e:
+                breaker.record_failure()
+                print(f"❌ Бэкенд {backend} недоступен: {e}")
+                continue
+            breaker.record_success()
+            inc('driver_sessions_total', labels={'backend': backend})
+            return driver
+        return None
+
+
+driver_provider = DriverProvider(
+    failure_threshold=DRIVER_FAILURE_THRESHOLD,
+    cooldown=DRIVER_COOLDOWN,
+)
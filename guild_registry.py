@@ -0,0 +1,162 @@
+import logging
+from database import db_manager
+import callback_data as cb
+
+logger = logging.getLogger(__name__)
+
+ADD_GUILD_BUTTON = "➕ Добавить гильдию"
+DELETE_GUILD_BUTTON = "🗑️ Удалить гильдию"
+PREV_PAGE_BUTTON = "◀️ Назад"
+NEXT_PAGE_BUTTON = "Далее ▶️"
+
+
+class GuildRegistry:
+    """Единый реестр гильдий: имя -> URL, id <-> имя и закэшированные клавиатуры с версионированием"""
+
+    def __init__(self, db, page_size: int = 20):
+        self.db = db
+        self.page_size = page_size
+        self._urls = {}
+        self._ids = {}
+        self._names_by_id = {}
+        self.version = 0
+        # (тип клавиатуры, страница) -> разметка для текущей версии
+        self._markup_cache = {}
+
+    def _set_guilds(self, records):
+        """Заменяет набор гильдий и сбрасывает кэш, только если набор действительно изменился"""
+        ids = {record['name']: record['id'] for record in records}
+        urls = {record['name']: record['url'] for record in records}
+        if urls == self._urls and ids == self._ids:
+            return False
+        self._urls = urls
+        self._ids = ids
+        self._names_by_id = {guild_id: name for name, guild_id in ids.items()}
+        self.invalidate()
+        return True
+
+    def invalidate(self):
+        """Сбрасывает закэшированные клавиатуры"""
+        self.version += 1
+        self._markup_cache.clear()
+
+    def load(self):
+        """Загружает гильдии из БД"""
+        self._set_guilds(self.db.load_guild_records())
+        logger.info(f"📊 Реестр гильдий: {len(self._urls)} гильдий, версия {self.version}")
+        return self
+
+    def reload(self):
+        """Перечитывает гильдии из БД (например, добавленные ботом в другом процессе)"""
+        return self._set_guilds(self.db.load_guild_records())
+
+    def add(self, guild_name: str, url: str) -> bool:
+        """Сохраняет гильдию в БД и перечитывает реестр, чтобы получить ее id"""
+        if not self.db.save_guild(guild_name, url):
+            return False
+        self.reload()
+        return True
+
+    def delete(self, guild_name: str) -> bool:
+        """Удаляет гильдию из БД и из реестра"""
+        if not self.db.delete_guild(guild_name):
+            return False
+        self._set_guilds([
+            {'id': self._ids[name], 'name': name, 'url': url}
+            for name, url in self._urls.items() if name != guild_name
+        ])
+        return True
+
+    def __contains__(self, guild_name):
+        return guild_name in self._urls
+
+    def __len__(self):
+        return len(self._urls)
+
+    def __bool__(self):
+        return bool(self._urls)
+
+    def get_url(self, guild_name: str):
+        return self._urls.get(guild_name)
+
+    def get_id(self, guild_name: str):
+        return self._ids.get(guild_name)
+
+    def get_name(self, guild_id: int):
+        return self._names_by_id.get(guild_id)
+
+    def names(self):
+        return list(self._urls.keys())
+
+    def items(self):
+        return list(self._urls.items())
+
+    @property
+    def page_count(self) -> int:
+        return max(1, (len(self._urls) + self.page_size - 1) // self.page_size)
+
+    def _page_names(self, page: int):
+        page = min(max(page, 0), self.page_count - 1)
+        start = page * self.page_size
+        return page, self.names()[start:start + self.page_size]
+
+    def _cached(self, key, build):
+        markup = self._markup_cache.get(key)
+        if markup is None:
+            markup = build()
+            self._markup_cache[key] = markup
+        return markup
+
+    def reply_keyboard(self, page: int = 0):
+        """Клавиатура с кнопками гильдий (по две в ряд) с постраничной навигацией"""
+        page, names = self._page_names(page)
+
+        def build():
+            from telegram import ReplyKeyboardMarkup, KeyboardButton
+
+            buttons = []
+            for i in range(0, len(names), 2):
+                buttons.append([KeyboardButton(name) for name in names[i:i + 2]])
+
+            if self.page_count > 1:
+                nav = []
+                if page > 0:
+                    nav.append(KeyboardButton(PREV_PAGE_BUTTON))
+                if page < self.page_count - 1:
+                    nav.append(KeyboardButton(NEXT_PAGE_BUTTON))
+                buttons.append(nav)
+
+            buttons.append([KeyboardButton(ADD_GUILD_BUTTON)])
+            buttons.append([KeyboardButton(DELETE_GUILD_BUTTON)])
+            return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+
+        return self._cached(('reply', page), build)
+
+    def delete_keyboard(self, page: int = 0):
+        """Inline-клавиатура выбора гильдии для удаления с постраничной навигацией"""
+        page, names = self._page_names(page)
+
+        def build():
+            from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+            keyboard = [
+                [InlineKeyboardButton(f"🗑️ {name}", callback_data=cb.encode(cb.DELETE, self._ids[name]))]
+                for name in names
+            ]
+
+            if self.page_count > 1:
+                nav = []
+                if page > 0:
+                    nav.append(InlineKeyboardButton(PREV_PAGE_BUTTON, callback_data=cb.encode(cb.DELETE_PAGE, page - 1)))
+                if page < self.page_count - 1:
+                    nav.append(InlineKeyboardButton(NEXT_PAGE_BUTTON, callback_data=cb.encode(cb.DELETE_PAGE, page + 1)))
+                keyboard.append(nav)
+
+            keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data=cb.encode(cb.CANCEL_DELETE))])
+            return InlineKeyboardMarkup(keyboard)
+
+        return self._cached(('delete', page), build)
+
+
+# Общий реестр для бота и сервиса парсинга
+guild_registry = GuildRegistry(db_manager)
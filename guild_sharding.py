@@ -0,0 +1,82 @@
+# Распределение гильдий между репликами parser_service через аренды в БД (guild_leases)
+# Каждая реплика держит ceil(гильдий / живых реплик) гильдий, продлевает аренды heartbeat'ом
+# и забирает гильдии упавших реплик, когда их аренда истекает
+import os
+import socket
+import logging
+import threading
+from database import db_manager
+from metrics import set_gauge
+
+logger = logging.getLogger(__name__)
+
+SHARDING_ENABLED = os.getenv('PARSER_SHARDING', '1') != '0'
+REPLICA_ID = os.getenv('PARSER_REPLICA_ID') or f"{socket.gethostname()}-{os.getpid()}"
+# Аренда должна пережить несколько пропущенных heartbeat'ов; после нее гильдию забирает другая реплика
+LEASE_SECONDS = int(os.getenv('GUILD_LEASE_SECONDS', 300))
+HEARTBEAT_INTERVAL = int(os.getenv('PARSER_HEARTBEAT_SECONDS', 30))
+
+
+class GuildShard:
+    """Доля гильдий текущей реплики; без шардинга реплика парсит все гильдии"""
+
+    def __init__(self, db, replica_id: str, lease_seconds: int = 300, heartbeat_interval: int = 30,
+                 enabled: bool = True):
+        self.db = db
+        self.replica_id = replica_id
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        # Реплика без heartbeat'а дольше трех интервалов считается упавшей
+        self.replica_ttl = heartbeat_interval * 3
+        self.enabled = enabled
+        self._owned = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Регистрирует реплику и запускает поток heartbeat'ов"""
+        if not self.enabled or self._thread is not None:
+            return
+        self.db.heartbeat_replica(self.replica_id, self.lease_seconds)
+        self._thread = threading.Thread(target=self._heartbeat_loop, name='guild-shard-heartbeat', daemon=True)
+        self._thread.start()
+        logger.info(f"🧩 Реплика {self.replica_id}: аренда {self.lease_seconds} с, heartbeat {self.heartbeat_interval} с")
+
+    def _heartbeat_loop(self):
+        # Аренды продлеваются и во время долгого прохода парсера
+        while not self._stop.wait(self.heartbeat_interval):
+            renewed = self.db.heartbeat_replica(self.replica_id, self.lease_seconds)
+            if renewed is None:
+                logger.warning(f"⚠️ Реплика {self.replica_id}: heartbeat не записан")
+
+    def assign(self, guild_ids):
+        """Перераспределяет гильдии в начале прохода. Возвращает id гильдий, которые парсит эта реплика"""
+        guild_ids = set(guild_ids)
+        if not self.enabled:
+            return guild_ids
+
+        self.db.heartbeat_replica(self.replica_id, self.lease_seconds)
+        owned = self.db.claim_guild_leases(self.replica_id, self.lease_seconds, self.replica_ttl)
+        if owned is None:
+            # БД недоступна: продолжаем с прежней долей, чужие аренды не трогаем
+            logger.warning(f"⚠️ Реплика {self.replica_id}: не удалось обновить аренды, парсим прежние гильдии")
+        else:
+            self._owned = set(owned)
+
+        set_gauge('parser_owned_guilds', len(self._owned & guild_ids))
+        return self._owned & guild_ids
+
+    def stop(self):
+        """Останавливает heartbeat и отпускает гильдии, чтобы другие реплики забрали их сразу"""
+        self._stop.set()
+        if self.enabled and self._thread is not None:
+            self.db.release_guild_leases(self.replica_id)
+
+
+guild_shard = GuildShard(
+    db_manager,
+    REPLICA_ID,
+    lease_seconds=LEASE_SECONDS,
+    heartbeat_interval=HEARTBEAT_INTERVAL,
+    enabled=SHARDING_ENABLED,
+)
@@ -0,0 +1,218 @@
+# Быстрый путь без браузера: донаты гильдии через API сайта с cookies сессии и пулом keep-alive подключений
+# Модуль не импортирует selenium/pandas; при ошибке авторизации или формата parse_table переходит на Selenium
+import os
+import re
+import json
+import time
+import threading
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlencode
+import urllib3
+from date_normalizer import SITE_TIMEZONE
+from metrics import PoolUsage
+
+REMANGA_BASE_URL = os.getenv('REMANGA_BASE_URL', 'https://remanga.org').rstrip('/')
+# Домен cookies указывается без порта
+REMANGA_HOST = urlparse(REMANGA_BASE_URL).hostname or ''
+
+# Включается явно: API и формат его ответа не документированы, по умолчанию парсим через Selenium
+HTTP_FAST_PATH = os.getenv('HTTP_FAST_PATH', '0') == '1'
+# Шаблон URL списка донатов; {base} - REMANGA_BASE_URL, {slug} - slug гильдии из ее URL
+DONATIONS_API_URL = os.getenv('REMANGA_DONATIONS_API_URL', '{base}/api/v2/guilds/{slug}/donations/')
+COOKIES_PATH = os.getenv('REMANGA_COOKIES_PATH', 'cookies.json')
+HTTP_PAGE_SIZE = int(os.getenv('HTTP_PAGE_SIZE', 100))
+HTTP_CONCURRENCY = int(os.getenv('HTTP_CONCURRENCY', 4))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT_SECONDS', 10))
+# Предохранитель от бесконечной пагинации при неверном has_next
+HTTP_MAX_PAGES = int(os.getenv('HTTP_MAX_PAGES', 500))
+
+# Cookie с токеном сессии; API принимает его и в заголовке Authorization
+TOKEN_COOKIE = 'token'
+
+GUILD_SLUG_RE = re.compile(r'/guild/([^/?#]+)')
+
+
+class FastPathError(Exception):
+    """Быстрый путь недоступен: сеть, неожиданный статус или ответ"""
+
+
+class AuthError(FastPathError):
+    """Сессия не принята API (401/403 или нет cookies)"""
+
+
+class FormatError(FastPathError):
+    """Ответ API не похож на список донатов"""
+
+
+_pool = urllib3.PoolManager(
+    maxsize=HTTP_CONCURRENCY,
+    block=True,
+    timeout=urllib3.Timeout(total=HTTP_TIMEOUT),
+    retries=urllib3.Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), raise_on_status=False),
+)
+# block=True: запросы сверх maxsize ждут свободного подключения, это и есть очередь пула
+_pool_usage = PoolUsage('http', HTTP_CONCURRENCY)
+
+_cookies = None
+_cookies_lock = threading.Lock()
+
+
+def _matches_host(domain: str) -> bool:
+    domain = (domain or REMANGA_HOST).lstrip('.')
+    return REMANGA_HOST == domain or REMANGA_HOST.endswith('.' + domain)
+
+
+def _cookie_dict(cookies) -> dict:
+    """Cookies в формате Selenium (список словарей) -> {имя: значение} для хоста сайта, без просроченных"""
+    now = time.time()
+    result = {}
+    for cookie in cookies:
+        if not _matches_host(cookie.get('domain')):
+            continue
+        if cookie.get('expiry') and cookie['expiry'] < now:
+            continue
+        result[cookie['name']] = cookie['value']
+    return result
+
+
+def load_cookies(path: str = COOKIES_PATH) -> dict:
+    """Cookies сессии из файла, сохраненного из браузера"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return _cookie_dict(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def get_cookies() -> dict:
+    global _cookies
+    with _cookies_lock:
+        if _cookies is None:
+            _cookies = load_cookies()
+        return dict(_cookies)
+
+
+def remember_driver_cookies(driver):
+    """Запоминает cookies сессии после входа через Selenium, чтобы следующие проходы обходились без браузера"""
+    global _cookies
+    try:
+        cookies = _cookie_dict(driver.get_cookies())
+    except Exception as e:
+        print(f"⚠️ Не удалось получить cookies из браузера: {e}")
+        return False
+    if TOKEN_COOKIE not in cookies:
+        return False
+    with _cookies_lock:
+        _cookies = cookies
+    return True
+
+
+def forget_cookies():
+    """Сбрасывает сессию, которую API перестало принимать"""
+    global _cookies
+    with _cookies_lock:
+        _cookies = {}
+
+
+def _headers(cookies: dict) -> dict:
+    headers = {
+        'Accept': 'application/json',
+        'Cookie': '; '.join(f"{name}={value}" for name, value in cookies.items()),
+        'Referer': REMANGA_BASE_URL + '/',
+    }
+    if TOKEN_COOKIE in cookies:
+        headers['Authorization'] = f"bearer {cookies[TOKEN_COOKIE]}"
+    return headers
+
+
+def _api_url(guild_url: str) -> str:
+    match = GUILD_SLUG_RE.search(guild_url)
+    if not match:
+        raise FormatError(f"в URL нет slug гильдии: {guild_url}")
+    return DONATIONS_API_URL.format(base=REMANGA_BASE_URL, slug=match.group(1))
+
+
+def _format_date(value: str) -> str:
+    """ISO-время API -> время сайта с точностью до минуты, как в таблице на странице"""
+    created_at = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(SITE_TIMEZONE).replace(tzinfo=None)
+    return created_at.strftime('%Y-%m-%d %H:%M')
+
+
+def _parse_page(payload):
+    """Тело ответа -> (строки [пользователь, сумма, дата], есть ли следующая страница, всего страниц)"""
+    try:
+        data = json.loads(payload)
+        props = data.get('props') or {}
+        rows = [
+            [item['user']['username'], int(item['amount']), _format_date(item['created_at'])]
+            for item in data['content']
+        ]
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise FormatError(f"неожиданный ответ API: {e}")
+    return rows, bool(props.get('has_next')), props.get('total_pages')
+
+
+def fetch_page(api_url: str, page: int, headers: dict):
+    query = urlencode({'page': page, 'count': HTTP_PAGE_SIZE})
+    _pool_usage.submitted()
+    try:
+        response = _pool.request('GET', f"{api_url}?{query}", headers=headers, redirect=False)
+    except urllib3.exceptions.HTTPError as e:
+        raise FastPathError(f"сеть: {e}")
+    finally:
+        _pool_usage.finished()
+
+    if response.status in (401, 403):
+        raise AuthError(f"HTTP {response.status}")
+    if response.status != 200:
+        raise FastPathError(f"HTTP {response.status}")
+    if 'json' not in response.headers.get('Content-Type', ''):
+        # Редирект на страницу входа или HTML вместо API
+        raise FormatError(f"Content-Type {response.headers.get('Content-Type')}")
+    return _parse_page(response.data)
+
+
+def fetch_donations(guild_url: str):
+    """Все донаты гильдии через API: первая страница, затем остальные параллельно. Возвращает (строки, страниц)"""
+    cookies = get_cookies()
+    if TOKEN_COOKIE not in cookies:
+        raise AuthError("нет cookies сессии")
+
+    api_url = _api_url(guild_url)
+    headers = _headers(cookies)
+
+    try:
+        return _fetch_all_pages(api_url, headers)
+    except AuthError:
+        # Сессия протухла на любой странице, а не только на первой: следующий вход возьмет свежие cookies
+        forget_cookies()
+        raise
+
+
+def _fetch_all_pages(api_url: str, headers: dict):
+    rows, has_next, total_pages = fetch_page(api_url, 1, headers)
+
+    pages = 1
+    with ThreadPoolExecutor(max_workers=HTTP_CONCURRENCY) as executor:
+        next_page = 2
+        while has_next and next_page <= HTTP_MAX_PAGES:
+            # Число страниц известно - забираем все сразу; иначе окнами по HTTP_CONCURRENCY
+            if total_pages:
+                last_page = min(int(total_pages), HTTP_MAX_PAGES)
+            else:
+                last_page = min(next_page + HTTP_CONCURRENCY - 1, HTTP_MAX_PAGES)
+            batch = list(range(next_page, last_page + 1))
+            if not batch:
+                break
+
+            has_next = False
+            for page_rows, page_has_next, _ in executor.map(lambda page: fetch_page(api_url, page, headers), batch):
+                rows.extend(page_rows)
+                pages += 1
+                has_next = page_has_next and bool(page_rows)
+            next_page = last_page + 1
+
+    return rows, pages
@@ -1,61 +1,40 @@
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters, CallbackQueryHandler
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import (ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters,
+                          CallbackQueryHandler, TypeHandler)
 import asyncio
+import logging
 from database import db_manager
-from TableToBot import GUILD_URLS, send_data_from_db, handle_table_choice, handle_show_all, gettable
-import time
-from collections import defaultdict
+from TableToBot import (send_data_from_db, handle_show_history, handle_history_page, handle_skip_history,
+                        handle_show_all, handle_subscribe, handle_unsubscribe, gettable, show_guilds_list,
+                        handle_user_search, handle_period, handle_period_switch, handle_chart,
+                        handle_chart_switch)
+from notifications import notification_loop
+from user_state import create_persistence, touch_user_state, eviction_loop
+from guild_registry import (guild_registry, ADD_GUILD_BUTTON, DELETE_GUILD_BUTTON,
+                            PREV_PAGE_BUTTON, NEXT_PAGE_BUTTON)
+from rate_limiter import rate_limited
+import charts
+from metrics import timed, timer, start_metrics_server
+import callback_data as cb
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
-# Система отслеживания времени последних сообщений (антифлуд)
-user_last_message_time = defaultdict(float)
-
-def is_flooding(user_id: int) -> bool:
-    """Проверяет, отправляет ли пользователь сообщения слишком часто"""
-    current_time = time.time()
-    last_time = user_last_message_time.get(user_id, 0)
-
-    # Если прошло меньше 1 секунды с последнего сообщения - это флуд
-    if current_time - last_time < 1.0:
-        return True
-
-    # Обновляем время последнего сообщения
-    user_last_message_time[user_id] = current_time
-    return False
-
-# URL для веб-страниц гильдий
-GUILD_URLS = {}
-
 def load_guilds_from_db():
     """Загружает гильдии из БД при старте"""
-    global GUILD_URLS
-    GUILD_URLS = db_manager.load_all_guilds()
-    print(f"📊 Загружено {len(GUILD_URLS)} гильдий из БД")
-
-def create_guilds_keyboard():
-    """Создает клавиатуру с кнопками гильдий"""
-    buttons = []
-    guild_names = list(GUILD_URLS.keys())
-
-    for i in range(0, len(guild_names), 2):
-        row = [KeyboardButton(guild_names[i])]
-        if i + 1 < len(guild_names):
-            row.append(KeyboardButton(guild_names[i + 1]))
-        buttons.append(row)
+    guild_registry.load()
+    print(f"📊 Загружено {len(guild_registry)} гильдий из БД")
 
-    buttons.append([KeyboardButton("➕ Добавить гильдию")])
-    buttons.append([KeyboardButton("🗑️ Удалить гильдию")])
-
-    return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
+def create_guilds_keyboard(context: ContextTypes.DEFAULT_TYPE = None):
+    """Возвращает закэшированную клавиатуру с кнопками гильдий для текущей страницы пользователя"""
+    page = context.user_data.get('guild_page', 0) if context else 0
+    return guild_registry.reply_keyboard(page)
 
 async def add_new_guild(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_name: str, url: str):
     """Добавляет новую гильдию в систему"""
     try:
-        success = db_manager.save_guild(guild_name, url)
+        success = guild_registry.add(guild_name, url)
         if success:
-            GUILD_URLS[guild_name] = url
             await update.message.reply_text(
                 f"✅ Гильдия '{guild_name}' успешно добавлена!\n\n"
                 f"📝 Название: {guild_name}\n"
@@ -69,14 +48,6 @@ async def add_new_guild(update: Update, context: ContextTypes.DEFAULT_TYPE, guil
         await update.message.reply_text(f"❌ Ошибка при добавлении гильдии: {e}")
         return False
 
-async def show_guilds_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показывает список доступных гильдий"""
-    guilds_text = "📋 Доступные гильдии:\n\n"
-    for i, (guild_name, url) in enumerate(GUILD_URLS.items(), 1):
-        guilds_text += f"{i}. {guild_name}\n"
-    guilds_text += f"\nВсего гильдий: {len(GUILD_URLS)}"
-    await update.message.reply_text(guilds_text)
-
 async def handle_add_guild(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик кнопки добавления гильдии"""
     await update.message.reply_text(
@@ -115,7 +86,7 @@ async def handle_guild_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
             success = await add_new_guild(update, context, guild_name, url)
             if success:
-                markup = create_guilds_keyboard()
+                markup = create_guilds_keyboard(context)
                 await update.message.reply_text(
                     "🎉 Отлично! Теперь вы можете выбрать новую гильдию из списка:",
                     reply_markup=markup
@@ -127,50 +98,47 @@ async def handle_guild_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
     else:
         await handle_other_messages(update, context)
 
+@rate_limited('view')
 async def handle_guild_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик ТОЛЬКО для кнопок гильдий"""
     text = update.message.text
-    user_id = update.effective_user.id
-
-    # Проверка на флуд
-    if is_flooding(user_id):
-        await update.message.reply_text(
-            "⚠️ Слишком быстро! Пожалуйста, отправляйте не более 1 сообщения в секунду."
-        )
-        return
 
     try:
-        if text in GUILD_URLS:
+        if text in guild_registry:
             await send_data_from_db(update, context, text)
-        elif text == "➕ Добавить гильдию":
+        elif text == ADD_GUILD_BUTTON:
             await handle_add_guild(update, context)
-        elif text == "🗑️ Удалить гильдию":
+        elif text == DELETE_GUILD_BUTTON:
             await handle_delete_guild(update, context)
+        elif text in (PREV_PAGE_BUTTON, NEXT_PAGE_BUTTON):
+            await handle_guilds_page(update, context, text)
         else:
-            await update.message.reply_text("Пожалуйста, используйте кнопки для выбора действия")
+            await handle_guild_input(update, context)
     except Exception as e:
         await update.message.reply_text(f"❌ Произошла ошибка: {e}")
 
-async def handle_refresh(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@rate_limited('refresh')
+async def handle_refresh(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int):
     """Запускает парсинг по требованию"""
     query = update.callback_query
     await query.answer()
 
     try:
-        data = query.data
-        guild_name = data.replace('refresh_', '')
-        url = GUILD_URLS[guild_name]
+        guild_name = guild_registry.get_name(guild_id)
+        if guild_name is None:
+            await query.message.reply_text("❌ Гильдия не найдена")
+            return
+        url = guild_registry.get_url(guild_name)
         await gettable(update, context, url, guild_name)
     except Exception as e:
         await query.message.reply_text(f"❌ Ошибка при обновлении: {e}")
 
-async def handle_pagination(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик пагинации для кнопки закрытия"""
+@rate_limited('callback')
+async def handle_close(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик кнопки закрытия"""
     query = update.callback_query
     await query.answer()
-
-    if query.data == "close_table":
-        await query.message.delete()
+    await query.message.delete()
 
 async def handle_other_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик для всех остальных сообщений"""
@@ -181,7 +149,8 @@ async def handle_other_messages(update: Update, context: ContextTypes.DEFAULT_TY
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
-    markup = create_guilds_keyboard()
+    context.user_data['guild_page'] = 0
+    markup = create_guilds_keyboard(context)
     await asyncio.sleep(0.5)
     await update.message.reply_text("Привет! Рада вас видеть!")
     await asyncio.sleep(1.2)
@@ -192,74 +161,157 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_delete_guild(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик кнопки удаления гильдии"""
-    if not GUILD_URLS:
+    if not guild_registry:
         await update.message.reply_text("❌ В базе нет гильдий для удаления")
         return
 
-    keyboard = []
-    for guild_name in GUILD_URLS.keys():
-        keyboard.append([InlineKeyboardButton(f"🗑️ {guild_name}", callback_data=f"delete_{guild_name}")])
-    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel_delete")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     await update.message.reply_text(
         "🗑️ Выберите гильдию для удаления:",
-        reply_markup=reply_markup
+        reply_markup=guild_registry.delete_keyboard()
+    )
+
+async def handle_guilds_page(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    """Листает страницы клавиатуры гильдий"""
+    page = context.user_data.get('guild_page', 0)
+    page += 1 if text == NEXT_PAGE_BUTTON else -1
+    page = min(max(page, 0), guild_registry.page_count - 1)
+    context.user_data['guild_page'] = page
+
+    await update.message.reply_text(
+        f"📄 Страница {page + 1} из {guild_registry.page_count}",
+        reply_markup=create_guilds_keyboard(context)
     )
 
-async def handle_delete_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик callback'ов для удаления гильдий"""
+@rate_limited('callback')
+async def handle_delete_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отмена удаления гильдии"""
     query = update.callback_query
     await query.answer()
+    await query.message.delete()
+    await query.message.reply_text("❌ Удаление отменено")
 
-    data = query.data
+@rate_limited('callback')
+async def handle_delete_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    """Листает страницы клавиатуры удаления"""
+    query = update.callback_query
+    await query.answer()
+    await query.message.edit_reply_markup(reply_markup=guild_registry.delete_keyboard(page))
+
+@rate_limited('callback')
+async def handle_delete_choice(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int):
+    """Запрашивает подтверждение удаления гильдии"""
+    query = update.callback_query
+    await query.answer()
 
-    if data == "cancel_delete":
-        await query.message.delete()
-        await query.message.reply_text("❌ Удаление отменено")
+    guild_name = guild_registry.get_name(guild_id)
+    if guild_name is None:
+        await query.message.reply_text("❌ Гильдия не найдена")
         return
 
-    if data.startswith("delete_"):
-        guild_name = data.replace("delete_", "")
-        if guild_name not in GUILD_URLS:
-            await query.message.reply_text(f"❌ Гильдия '{guild_name}' не найдена")
-            return
+    confirm_keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅ Да, удалить", callback_data=cb.encode(cb.CONFIRM_DELETE, guild_id))],
+        [InlineKeyboardButton("❌ Нет, отменить", callback_data=cb.encode(cb.CANCEL_DELETE))]
+    ])
 
-        confirm_keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("✅ Да, удалить", callback_data=f"confirm_delete_{guild_name}")],
-            [InlineKeyboardButton("❌ Нет, отменить", callback_data="cancel_delete")]
-        ])
+    await query.message.edit_text(
+        f"⚠️ Вы уверены, что хотите удалить гильдию '{guild_name}'?\n\n"
+        f"Это действие нельзя отменить!",
+        reply_markup=confirm_keyboard
+    )
+
+@rate_limited('callback')
+async def handle_delete_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE, guild_id: int):
+    """Удаляет гильдию после подтверждения"""
+    query = update.callback_query
+    await query.answer()
+
+    guild_name = guild_registry.get_name(guild_id)
+    if guild_name is None:
+        await query.message.edit_text("❌ Гильдия не найдена (возможно, уже удалена)")
+        return
 
+    success = guild_registry.delete(guild_name)
+    if success:
         await query.message.edit_text(
-            f"⚠️ Вы уверены, что хотите удалить гильдию '{guild_name}'?\n\n"
-            f"Это действие нельзя отменить!",
-            reply_markup=confirm_keyboard
+            f"✅ Гильдия '{guild_name}' успешно удалена!\n\n"
+            f"Таблица донатов также была удалена из базы данных."
+        )
+        context.user_data['guild_page'] = 0
+        markup = create_guilds_keyboard(context)
+        await query.message.reply_text("Клавиатура обновлена ✅", reply_markup=markup)
+    else:
+        await query.message.edit_text(
+            f"❌ Ошибка при удалении гильдии '{guild_name}'\n"
+            f"Попробуйте еще раз или проверьте логи."
         )
 
-    elif data.startswith("confirm_delete_"):
-        guild_name = data.replace("confirm_delete_", "")
-        success = db_manager.delete_guild(guild_name)
-        if success:
-            del GUILD_URLS[guild_name]
-            await query.message.edit_text(
-                f"✅ Гильдия '{guild_name}' успешно удалена!\n\n"
-                f"Таблица донатов также была удалена из базы данных."
-            )
-            markup = create_guilds_keyboard()
-            await query.message.reply_text("Клавиатура обновлена ✅", reply_markup=markup)
-        else:
-            await query.message.edit_text(
-                f"❌ Ошибка при удалении гильдии '{guild_name}'\n"
-                f"Попробуйте еще раз или проверьте логи."
-            )
+# Таблица диспетчеризации callback'ов: опкод -> (обработчик, число аргументов)
+CALLBACK_HANDLERS = {
+    cb.SHOW_ALL: (handle_show_all, 1),
+    cb.HISTORY: (handle_show_history, 1),
+    cb.HISTORY_PAGE: (handle_history_page, 2),
+    cb.SKIP_HISTORY: (handle_skip_history, 0),
+    cb.REFRESH: (handle_refresh, 1),
+    cb.CLOSE: (handle_close, 0),
+    cb.DELETE: (handle_delete_choice, 1),
+    cb.DELETE_PAGE: (handle_delete_page, 1),
+    cb.CONFIRM_DELETE: (handle_delete_confirm, 1),
+    cb.CANCEL_DELETE: (handle_delete_cancel, 0),
+    cb.SUBSCRIBE: (handle_subscribe, 1),
+    cb.UNSUBSCRIBE: (handle_unsubscribe, 1),
+    cb.PERIOD: (handle_period, 2),
+    cb.PERIOD_SWITCH: (handle_period_switch, 2),
+    cb.CHART: (handle_chart, 2),
+    cb.CHART_SWITCH: (handle_chart_switch, 2),
+}
+
+async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Единая точка входа для inline-кнопок: разбирает callback_data и вызывает обработчик по опкоду"""
+    query = update.callback_query
+    decoded = cb.decode(query.data)
+    entry = CALLBACK_HANDLERS.get(decoded[0]) if decoded else None
+
+    # Неизвестный опкод или кнопка из старого формата (например, show_all_<название>)
+    if entry is None or len(decoded[1]) != entry[1]:
+        await query.answer("⚠️ Кнопка устарела, запросите данные заново", show_alert=True)
+        return
+
+    handler, _ = entry
+    with timer('bot_handler_seconds', {'handler': handler.__name__}):
+        await handler(update, context, *decoded[1])
 
 async def list_guilds(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает список гильдий"""
     await show_guilds_list(update, context)
 
+def instrumented(handler):
+    """Оборачивает обработчик замером латентности bot_handler_seconds"""
+    return timed('bot_handler_seconds', handler=handler.__name__)(handler)
+
+# Фоновые задачи бота; в bot_data не кладем, чтобы они не попадали в persistence
+background_tasks = []
+
+async def post_init(application):
+    """Запускает фоновую доставку уведомлений и очистку устаревших состояний пользователей"""
+    background_tasks.append(asyncio.create_task(notification_loop(application.bot)))
+    background_tasks.append(asyncio.create_task(eviction_loop(application)))
+
+async def post_shutdown(application):
+    """Останавливает фоновые задачи и пул рендера графиков"""
+    for task in background_tasks:
+        task.cancel()
+    charts.shutdown()
+
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
     # Инициализируем БД и загружаем гильдии
     db_manager.setup_guilds_table()
+    db_manager.setup_notifications_tables()
+    db_manager.setup_booster_index_table()
+    db_manager.setup_rollup_tables()
+    db_manager.setup_ranks_table()
+    db_manager.setup_charts_tables()
     load_guilds_from_db()
 
     TOKEN = os.getenv('BOT_TOKEN')
@@ -267,16 +319,23 @@ if __name__ == '__main__':
         print("❌ Ошибка: BOT_TOKEN не установлен в переменных окружения")
         exit(1)
 
-    application = ApplicationBuilder().token(TOKEN).build()
+    application = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .persistence(create_persistence())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+    start_metrics_server()
 
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("guilds", list_guilds))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_guild_buttons))
-    application.add_handler(CallbackQueryHandler(handle_show_all, pattern="^show_all_"))
-    application.add_handler(CallbackQueryHandler(handle_pagination, pattern="^close_table$"))
-    application.add_handler(CallbackQueryHandler(handle_table_choice, pattern="^(show_full|show_partial)$"))
-    application.add_handler(CallbackQueryHandler(handle_refresh, pattern="^refresh_"))
-    application.add_handler(CallbackQueryHandler(handle_delete_callback, pattern="^(delete_|confirm_delete_|cancel_delete)"))
+    application.add_handler(TypeHandler(Update, touch_user_state), group=-1)
+    application.add_handler(CommandHandler("start", instrumented(start)))
+    application.add_handler(CommandHandler("guilds", instrumented(list_guilds)))
+    application.add_handler(CommandHandler("user", instrumented(handle_user_search)))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, instrumented(handle_guild_buttons)))
+    application.add_handler(CallbackQueryHandler(handle_callback))
 
     print("Бот запущен. Ожидаю команды...")
     application.run_polling()
\ No newline at end of file
@@ -0,0 +1,320 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger('metrics')
+
+# Границы бакетов в секундах: от быстрых SQL-запросов до полного прохода по всем гильдиям
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+_lock = threading.Lock()
+# (имя метрики, отсортированные метки) -> значение
+_histograms = {}
+_counters = {}
+_gauges = {}
+
+
+class RollingHistogram:
+    """Гистограмма с кумулятивными бакетами (для Prometheus) и скользящим окном последних значений"""
+
+    def __init__(self, window: int = 500, buckets=DEFAULT_BUCKETS):
+        self.values = deque(maxlen=window)
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.values.append(value)
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+
+    def percentile(self, q: float):
+        if not self.values:
+            return None
+        ordered = sorted(self.values)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> dict:
+        window = list(self.values)
+        return {
+            'count': self.count,
+            'window': len(window),
+            'mean': sum(window) / len(window) if window else None,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': max(window) if window else None,
+        }
+
+
+def _key(name: str, labels: dict = None):
+    return name, tuple(sorted((labels or {}).items()))
+
+
+def observe(name: str, value: float, labels: dict = None):
+    """Добавляет значение в скользящую гистограмму"""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = RollingHistogram()
+        histogram.observe(value)
+
+
+def inc(name: str, value: float = 1, labels: dict = None):
+    """Увеличивает счетчик"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, labels: dict = None):
+    """Устанавливает значение gauge-метрики"""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def add_gauge(name: str, delta: float, labels: dict = None):
+    """Изменяет gauge-метрику на delta (например, число задач в работе)"""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + delta
+
+
+def get_gauge(name: str, labels: dict = None, default: float = 0):
+    """Текущее значение gauge-метрики"""
+    with _lock:
+        return _gauges.get(_key(name, labels), default)
+
+
+class PoolUsage:
+    """Загрузка пула исполнителей: pool_busy - задач в работе, pool_queued - ждут свободного исполнителя.
+    Считается по числу отправленных задач: из родительского процесса не видно, когда воркер взял задачу"""
+
+    def __init__(self, pool: str, size: int):
+        self.labels = {'pool': pool}
+        self.size = size
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        set_gauge('pool_size', size, self.labels)
+
+    def _update(self, delta: int):
+        with self._lock:
+            self.in_flight += delta
+            busy = min(self.in_flight, self.size)
+            set_gauge('pool_busy', busy, self.labels)
+            set_gauge('pool_queued', self.in_flight - busy, self.labels)
+
+    def submitted(self):
+        self._update(1)
+
+    def finished(self, *_):
+        """Принимает лишние аргументы, чтобы служить done-callback у future"""
+        self._update(-1)
+
+
+class timer:
+    """Замер длительности без записи в лог: with timer('db_query_seconds', {'method': ...}): ..."""
+
+    def __init__(self, name: str, labels: dict = None):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        observe(self.name, self.duration, self.labels)
+        if exc_type:
+            inc(f"{self.name.rsplit('_seconds', 1)[0]}_errors_total", labels=self.labels)
+        return False
+
+
+def timed(name: str, **labels):
+    """Декоратор для замера длительности синхронных и асинхронных функций"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timer(name, labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def histogram_summary(name: str = None) -> dict:
+    """Сводка по гистограммам: {'имя{метки}': {'count', 'p50', ...}}"""
+    with _lock:
+        items = list(_histograms.items())
+
+    result = {}
+    for (metric, labels), histogram in items:
+        if name and metric != name:
+            continue
+        label_text = ','.join(f'{k}={v}' for k, v in labels)
+        result[f"{metric}{{{label_text}}}" if label_text else metric] = histogram.summary()
+    return result
+
+
+def log_event(event: str, **fields):
+    """Пишет структурированное событие одной JSON-строкой"""
+    record = {'event': event, 'ts': round(time.time(), 3), **fields}
+    logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+class Span:
+    """Замер одной фазы работы: длительность, счетчики и произвольные поля"""
+
+    def __init__(self, name: str, labels: dict = None, trace_id: str = None, parent: str = None, **fields):
+        self.name = name
+        self.labels = labels or {}
+        self.trace_id = trace_id or uuid.uuid4().hex[:12]
+        self.parent = parent
+        self.fields = fields
+        self.start = None
+        self.duration = None
+
+    def child(self, name: str, **fields):
+        """Создает вложенный span с тем же trace_id и метками"""
+        return Span(f"{self.name}.{name}", labels=self.labels, trace_id=self.trace_id, parent=self.name, **fields)
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def inc(self, field: str, value: float = 1):
+        self.fields[field] = self.fields.get(field, 0) + value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        observe(f"{self.name}.seconds", self.duration, self.labels)
+        log_event(
+            'span',
+            name=self.name,
+            trace_id=self.trace_id,
+            parent=self.parent,
+            duration_ms=round(self.duration * 1000, 1),
+            status='error' if exc_type else 'ok',
+            **self.labels,
+            **self.fields,
+        )
+        return False
+
+
+def span(name: str, labels: dict = None, **fields) -> Span:
+    """Контекстный менеджер для замера фазы: with span('scrape', labels={'guild': ...}) as s: ..."""
+    return Span(name, labels=labels, **fields)
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r'[^a-zA-Z0-9_:]', '_', name)
+
+
+def _format_labels(labels, extra=None) -> str:
+    pairs = list(labels) + list(extra or [])
+    if not pairs:
+        return ''
+    escaped = []
+    for key, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{_metric_name(key)}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def render_prometheus() -> str:
+    """Отдает все метрики в текстовом формате Prometheus"""
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        histograms = sorted(_histograms.items(), key=lambda item: item[0])
+        histogram_data = [(key, h.buckets, list(h.bucket_counts), h.count, h.total) for key, h in histograms]
+
+    lines = []
+    typed = set()
+
+    def declare(metric, kind):
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} {kind}")
+
+    for (name, labels), value in counters:
+        metric = _metric_name(name)
+        declare(metric, 'counter')
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    for (name, labels), value in gauges:
+        metric = _metric_name(name)
+        declare(metric, 'gauge')
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    for (name, labels), buckets, bucket_counts, count, total in histogram_data:
+        metric = _metric_name(name)
+        declare(metric, 'histogram')
+        for bound, bucket_count in zip(buckets, bucket_counts):
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {bucket_count}")
+        lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            body = render_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path.split('?')[0] == '/metrics.json':
+            body = json.dumps(histogram_summary(), ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Не засоряем логи запросами Prometheus
+        pass
+
+
+def start_metrics_server(port: int = None, host: str = None):
+    """Запускает HTTP-эндпоинт /metrics в фоновом потоке, если задан METRICS_PORT"""
+    port = port or os.getenv('METRICS_PORT')
+    if not port:
+        return None
+
+    host = host or os.getenv('METRICS_HOST', '127.0.0.1')
+    server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    logger.info(f"📈 Метрики доступны на http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,99 @@
+# Доставка уведомлений о новых бустах подписанным чатам из очереди notification_outbox
+import os
+import html
+import asyncio
+import logging
+from telegram.error import Forbidden, RetryAfter, TelegramError
+from database import db_manager
+from metrics import inc, span
+
+logger = logging.getLogger(__name__)
+
+# Как часто бот забирает очередь; за это время уведомления нескольких проходов парсера склеиваются в один дайджест
+NOTIFY_INTERVAL = int(os.getenv('NOTIFY_INTERVAL_SECONDS', 60))
+NOTIFY_BATCH = int(os.getenv('NOTIFY_BATCH', 500))
+
+
+def format_amount(amount: int) -> str:
+    return f"{amount:,}".replace(",", " ")
+
+
+def merge_notifications(notifications):
+    """Склеивает строки очереди одного чата по гильдиям"""
+    merged = {}
+    for notification in notifications:
+        guild = merged.setdefault(notification['guild_id'], {
+            'guild_name': notification['guild_name'],
+            'new_count': 0,
+            'new_amount': 0,
+            'top_boosters': {},
+        })
+        guild['new_count'] += notification['new_count']
+        guild['new_amount'] += notification['new_amount']
+        for user_name, amount in notification['top_boosters']:
+            guild['top_boosters'][user_name] = guild['top_boosters'].get(user_name, 0) + amount
+    return list(merged.values())
+
+
+def format_digest(guilds, top_n: int = 5):
+    """Текст дайджеста новых бустов для одного чата"""
+    text = "<b>🔔 Новые бусты</b>\n"
+    for guild in guilds:
+        text += (
+            f"\n<b>{html.escape(guild['guild_name'])}</b>: новых бустов {guild['new_count']} "
+            f"на сумму {format_amount(guild['new_amount'])} ⚡"
+        )
+        top_boosters = sorted(guild['top_boosters'].items(), key=lambda item: (-item[1], item[0]))[:top_n]
+        for user_name, amount in top_boosters:
+            text += f"\n  • {html.escape(user_name)} — {format_amount(amount)} ⚡"
+        text += "\n"
+    return text
+
+
+async def deliver_notifications(bot):
+    """Отправляет по одному дайджесту на чат и удаляет доставленные строки очереди. Возвращает число сообщений"""
+    notifications = await asyncio.to_thread(db_manager.fetch_pending_notifications, NOTIFY_BATCH)
+    if not notifications:
+        return 0
+
+    by_chat = {}
+    for notification in notifications:
+        by_chat.setdefault(notification['chat_id'], []).append(notification)
+
+    delivered, failed, sent = [], [], 0
+    with span('notify.deliver', chats=len(by_chat), rows=len(notifications)) as phase:
+        for chat_id, chat_notifications in by_chat.items():
+            ids = [notification['id'] for notification in chat_notifications]
+            try:
+                await bot.send_message(chat_id, format_digest(merge_notifications(chat_notifications)),
+                                       parse_mode='HTML')
+                delivered.extend(ids)
+                sent += 1
+            except Forbidden:
+                # Бот заблокирован или удален из чата: подписки больше не нужны
+                logger.info(f"🔕 Чат {chat_id} недоступен, удаляем его подписки")
+                await asyncio.to_thread(db_manager.unsubscribe, chat_id)
+            except RetryAfter as e:
+                # Остальные чаты дождутся следующего прохода
+                logger.warning(f"⏳ Лимит Telegram, пауза {e.retry_after} с")
+                await asyncio.sleep(e.retry_after)
+                break
+            except TelegramError as e:
+                logger.error(f"❌ Не удалось отправить уведомление в чат {chat_id}: {e}")
+                failed.extend(ids)
+        phase.set(sent=sent, failed=len(failed))
+
+    await asyncio.to_thread(db_manager.complete_notifications, delivered, failed)
+    inc('notifications_sent_total', sent)
+    return sent
+
+
+async def notification_loop(bot):
+    """Фоновая задача бота: периодически разбирает очередь уведомлений"""
+    logger.info(f"📬 Доставка уведомлений каждые {NOTIFY_INTERVAL} с")
+    while True:
+        try:
+            await deliver_notifications(bot)
+        except Exception as e:
+            logger.error(f"❌ Ошибка доставки уведомлений: {e}")
+        await asyncio.sleep(NOTIFY_INTERVAL)
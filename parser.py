@@ -10,11 +10,92 @@ import json
 import pandas as pd
 import re
 import os
+from urllib.parse import urlparse
 from dotenv import load_dotenv
+from metrics import span, add_gauge
+from driver_provider import driver_provider
+from http_fetch import HTTP_FAST_PATH, FastPathError, fetch_donations, remember_driver_cookies
+from table_extract import (
+    TABLE_SELECTORS, SKIPPED_USER_VALUES, ABSOLUTE_ROW_STYLE, LXML_AVAILABLE,
+    clean_text, extract_table_rows,
+)
 
 # Загружаем переменные из .env файла
 load_dotenv()
 
+# Базовый адрес сайта; переопределяется для локального стенда (benchmarks/fake_remanga.py)
+REMANGA_BASE_URL = os.getenv('REMANGA_BASE_URL', 'https://remanga.org').rstrip('/')
+REMANGA_HOST = urlparse(REMANGA_BASE_URL).netloc
+
+# Облегченный профиль браузера для парсинга: картинки, шрифты, медиа и аналитика парсеру не нужны
+SCRAPE_BLOCK_RESOURCES = os.getenv('SCRAPE_BLOCK_RESOURCES', '1') != '0'
+SCRAPE_PAGE_LOAD_STRATEGY = os.getenv('SCRAPE_PAGE_LOAD_STRATEGY', 'eager')
+SCRAPE_WINDOW_SIZE = os.getenv('SCRAPE_WINDOW_SIZE', '1280,1024')
+
+# Шаблоны URL для CDP Network.setBlockedURLs ("*" - любая подстрока)
+DEFAULT_BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm', '*.mp3', '*.ogg',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*mc.yandex.ru*', '*an.yandex.ru*', '*yandex.ru/ads*', '*top-fwz1.mail.ru*', '*vk.com/rtrg*',
+]
+SCRAPE_BLOCKED_URLS = [
+    pattern.strip() for pattern in os.getenv('SCRAPE_BLOCKED_URLS', ','.join(DEFAULT_BLOCKED_URLS)).split(',')
+    if pattern.strip()
+]
+
+# 2 = запретить: Chrome не загружает картинки, уведомления и медиа-потоки еще до CDP
+BLOCKED_CONTENT_PREFS = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.managed_default_content_settings.media_stream': 2,
+    'profile.default_content_setting_values.notifications': 2,
+    'profile.default_content_setting_values.geolocation': 2,
+}
+
+# Флаги, уменьшающие фоновую работу и память процесса Chrome
+LIGHTWEIGHT_CHROME_ARGS = [
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-translate",
+    "--mute-audio",
+    "--no-first-run",
+    "--disk-cache-size=1",
+    "--blink-settings=imagesEnabled=false",
+]
+
+
+def apply_scraping_profile(chrome_options):
+    """Стратегия загрузки, размер окна и блокировка ресурсов через настройки профиля"""
+    chrome_options.page_load_strategy = SCRAPE_PAGE_LOAD_STRATEGY
+    chrome_options.add_argument(f"--window-size={SCRAPE_WINDOW_SIZE}")
+    if SCRAPE_BLOCK_RESOURCES:
+        for argument in LIGHTWEIGHT_CHROME_ARGS:
+            chrome_options.add_argument(argument)
+        chrome_options.add_experimental_option('prefs', BLOCKED_CONTENT_PREFS)
+
+
+def block_resources(driver):
+    """Блокирует шрифты, медиа и сторонние домены через CDP; без CDP остаются только настройки профиля"""
+    if not SCRAPE_BLOCK_RESOURCES or not SCRAPE_BLOCKED_URLS:
+        return False
+    def send(cmd, params):
+        return driver.execute('executeCdpCommand', {'cmd': cmd, 'params': params})['value']
+
+    try:
+        # webdriver.Remote не регистрирует команду CDP, но standalone Chrome ее поддерживает
+        driver.command_executor._commands.setdefault(
+            'executeCdpCommand', ('POST', '/session/$sessionId/goog/cdp/execute')
+        )
+        send('Network.enable', {})
+        send('Network.setBlockedURLs', {'urls': SCRAPE_BLOCKED_URLS})
+        return True
+    except Exception as e:
+        print(f"⚠️ CDP недоступен, блокируем только картинки через профиль: {e}")
+        return False
+
 
 def setup_driver():
     """Настраивает Selenium драйвер для standalone Chrome на Railway"""
@@ -25,7 +106,6 @@ def setup_driver():
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--window-size=1920,1080")
     chrome_options.add_argument("--disable-extensions")
     chrome_options.add_argument("--ignore-certificate-errors")
     chrome_options.add_argument("--ignore-ssl-errors")
@@ -35,6 +115,11 @@ def setup_driver():
     chrome_options.add_argument("--remote-debugging-port=9222")
     chrome_options.add_argument("--disable-setuid-sandbox")
 
+    # Фоновые вкладки parse_tables должны продолжать подгружать строки, пока читается другая вкладка
+    chrome_options.add_argument("--disable-background-timer-throttling")
+    chrome_options.add_argument("--disable-backgrounding-occluded-windows")
+    chrome_options.add_argument("--disable-renderer-backgrounding")
+
     # Дополнительные опции для стабильности
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_experimental_option('useAutomationExtension', False)
@@ -45,43 +130,16 @@ def setup_driver():
         chrome_options.add_argument(f'--proxy-server={proxy_url}')
         print(f"🔗 Используем прокси для РФ: {proxy_url}")
 
-    try:
-        # Получаем URL standalone Chrome сервиса из переменных окружения
-        chrome_service_url = os.getenv('STANDALONE_CHROME_URL', 'http://standalone-chrome.railway.internal:4444')
+    apply_scraping_profile(chrome_options)
 
-        print(f"🔗 Подключаемся к standalone Chrome: {chrome_service_url}")
+    # Бэкенд с открытым circuit breaker пропускается сразу, без ожидания таймаута подключения
+    driver = driver_provider.get_driver(chrome_options)
+    if driver is None:
+        print("❌ Ни standalone, ни локальный Chrome недоступны")
+        return None
 
-        driver = webdriver.Remote(
-            command_executor=chrome_service_url,
-            options=chrome_options
-        )
-
-        # Устанавливаем таймауты
-        driver.set_page_load_timeout(30)
-        driver.implicitly_wait(10)
-
-        # Добавляем скрипт для маскировки веб-драйвера
-        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-
-        print("✅ Успешно подключились к standalone Chrome")
-        return driver
-
-    except Exception as e:
-        print(f"❌ Ошибка подключения к standalone Chrome: {e}")
-
-        # Fallback: попробуем локальный Chrome
-        try:
-            print("🔄 Пробуем локальный Chrome как fallback...")
-            from selenium.webdriver.chrome.service import Service
-            from webdriver_manager.chrome import ChromeDriverManager
-
-            service = Service(ChromeDriverManager().install())
-            driver = webdriver.Chrome(service=service, options=chrome_options)
-            print("✅ Успешно запущен локальный Chrome")
-            return driver
-        except Exception as e2:
-            print(f"❌ Локальный Chrome также не сработал: {e2}")
-            return None
+    block_resources(driver)
+    return driver
 
 
 def check_browserless_connection():
@@ -118,7 +176,7 @@ def login_to_remanga(driver):
         print("🔐 Выполняем вход на remanga.org...")
 
         # Переходим на главную страницу
-        main_url = "https://remanga.org"
+        main_url = REMANGA_BASE_URL
         driver.get(main_url)
 
         # Ждем полной загрузки DOM
@@ -306,15 +364,6 @@ def login_to_remanga(driver):
         traceback.print_exc()
         return False
 
-def clean_text(text):
-    """Очистка текста от NBSP и лишних пробелов"""
-    if not text:
-        return text
-    text = text.replace('\u00a0', ' ').replace('\u2007', ' ').replace('\u202f', ' ')
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
-
-
 def extract_user_data(user_cell):
     """Извлекает имя пользователя из ячейки"""
     try:
@@ -449,211 +498,352 @@ def extract_guild_name_from_url(url):
         return "Неизвестная гильдия"
 
 
+# Возвращает [селектор, outerHTML] первого найденного контейнера таблицы, чтобы не тянуть и не разбирать всю страницу
+TABLE_HTML_SCRIPT = """
+for (const selector of arguments[0]) {
+    const element = document.querySelector(selector);
+    if (element) return [selector, element.outerHTML];
+}
+return null;
+"""
+
+
+def find_table_container(soup):
+    """Ищет контейнер таблицы бустов. Возвращает (элемент, селектор) или (None, None)"""
+    for selector in TABLE_SELECTORS:
+        table_container = soup.select_one(selector)
+        if table_container:
+            return table_container, selector
+    return None, None
+
+
+def extract_rows(table_container):
+    """Извлекает строки [пользователь, сумма, дата] из контейнера таблицы.
+    Возвращает (строки, число найденных tr)"""
+    rows = table_container.find_all('tr', style=ABSOLUTE_ROW_STYLE)
+
+    # Альтернативный поиск строк
+    if not rows:
+        rows = table_container.find_all('tr')
+        # Фильтруем только видимые строки с данными
+        rows = [row for row in rows if row.find('td')]
+
+    extracted = []
+    for row in rows:
+        try:
+            # Получаем все ячейки
+            cells = row.find_all(['td', 'th'])
+            if len(cells) < 3:
+                continue
+
+            # Извлекаем данные из каждой ячейки
+            user_cell, amount_cell, date_cell = cells[0], cells[1], cells[2]
+
+            user = extract_user_data(user_cell)
+            amount = extract_amount_data(amount_cell)
+            date = extract_date_data(date_cell)
+
+            # Пропускаем заголовки и пустые строки
+            if not user or user in SKIPPED_USER_VALUES:
+                continue
+
+            extracted.append([user, amount, date])
+
+        except Exception as e:
+            print(f"⚠️ Ошибка обработки строки: {e}")
+            continue
+
+    return extracted, len(rows)
+
+
+def extract_rows_from_html(page_html):
+    """HTML страницы -> (строки, число найденных tr, селектор таблицы); строки = None, если таблицы нет"""
+    if LXML_AVAILABLE:
+        return extract_table_rows(page_html)
+
+    soup = BeautifulSoup(page_html, 'html.parser')
+    table_container, selector = find_table_container(soup)
+    if not table_container:
+        return None, 0, None
+
+    rows, rows_seen = extract_rows(table_container)
+    return rows, rows_seen, selector
+
+
+def build_donations_dataframe(rows_data):
+    """Собирает DataFrame из строк [пользователь, сумма, дата] и приводит суммы к int"""
+    df = pd.DataFrame(rows_data, columns=['Пользователь', 'Сумма', 'Дата'])
+    df = df.drop_duplicates()
+    df['Сумма'] = df['Сумма'].apply(convert_amount_to_int)
+    return df
+
+
 def parse_table(url='https://remanga.org/guild/i-g-g-d-r-a-s-i-l--a1172e3f/settings/donations'):
     """
-    Парсит виртуализированную таблицу бустов через Selenium
+    Парсит виртуализированную таблицу бустов через Selenium.
+    Каждая фаза замеряется span'ом и пишется в лог одной JSON-строкой
     """
     print(f"🎯 Начинаем парсинг URL: {url}")
 
-    # Настройка браузера через Selenium
-    driver = setup_driver()
-    if not driver:
-        print("❌ Не удалось подключиться к Selenium")
-        return pd.DataFrame()
-
-    wait = WebDriverWait(driver, 30)
-    rows_data = []
-    seen_records = set()
-    previous_count = 0
-    no_new_count = 0
-    max_scroll_attempts = 20
+    # Получаем название гильдии
+    guild_name = extract_guild_name_from_url(url)
 
+    add_gauge('scrape_in_flight', 1)
     try:
-        # Получаем название гильдии
-        guild_name = extract_guild_name_from_url(url)
+        with span('scrape', labels={'guild': guild_name}, url=url) as scrape_span:
+            df = _parse_table_http(url, scrape_span) if HTTP_FAST_PATH else None
+            if df is None:
+                df = _parse_table(url, guild_name, scrape_span)
+            scrape_span.set(rows=len(df))
+            return df
+    finally:
+        add_gauge('scrape_in_flight', -1)
 
-        # Выполняем вход в систему
-        print("🔐 Выполняем вход на remanga.org...")
-        login_success = login_to_remanga(driver)
 
-        if not login_success:
-            print("❌ Не удалось войти в систему, пробуем продолжить без авторизации...")
+def _parse_table_http(url, scrape_span):
+    """Донаты через API сайта без браузера; None, если нужно идти через Selenium"""
+    with scrape_span.child('http_fetch') as phase:
+        try:
+            rows, pages = fetch_donations(url)
+        except FastPathError as e:
+            phase.set(success=False, error=type(e).__name__)
+            print(f"↩️ Быстрый путь недоступен ({type(e).__name__}: {e}), используем Selenium")
+            return None
+        phase.set(success=True, pages=pages, rows=len(rows))
+
+    print(f"⚡ Получено {len(rows)} записей через API за {pages} запросов")
+    scrape_span.set(mode='http')
+    return build_donations_dataframe(rows)
 
-        # Открываем целевую страницу
-        print(f"📄 Открываем страницу гильдии '{guild_name}'...")
+
+# Элементы, которые прокручиваются, чтобы виртуализированная таблица подгрузила следующие строки
+SCROLL_SELECTORS = [
+    "div[data-sentry-component='GuildDonationsList']",
+    "div[data-sentry-component='VirtualizedDataTable']",
+    ".table-container",
+    "div[class*='virtual']",
+    "body"
+]
+SCROLL_DELAY = 2
+MAX_SCROLL_ATTEMPTS = 20
+
+# Сколько гильдий parse_tables прокручивает одновременно во вкладках одной сессии браузера
+SCRAPE_TABS = int(os.getenv('SCRAPE_TABS', 4))
+
+
+def open_guild_page(driver, url, guild_name, scrape_span):
+    """Открывает страницу гильдии в текущей вкладке (без ожидания загрузки)"""
+    print(f"📄 Открываем страницу гильдии '{guild_name}'...")
+    with scrape_span.child('navigate'):
         driver.get(url)
-        time.sleep(5)
 
-        # Проверяем, загрузилась ли страница
-        current_url = driver.current_url
-        print(f"📄 Текущий URL: {current_url}")
 
-        if "remanga.org" not in current_url:
-            print(f"❌ Не удалось загрузить целевую страницу. Текущий URL: {current_url}")
-            return pd.DataFrame()
+def check_guild_page(driver, scrape_span):
+    """Проверяет, что текущая вкладка открыла таблицу донатов, и ждет ее появления"""
+    current_url = driver.current_url
+    print(f"📄 Текущий URL: {current_url}")
 
-        # Проверяем, не перенаправило ли на страницу входа
-        if "signin" in current_url or "login" in current_url:
-            print("❌ Перенаправлено на страницу входа. Авторизация не удалась.")
-            return pd.DataFrame()
+    if REMANGA_HOST not in current_url:
+        print(f"❌ Не удалось загрузить целевую страницу. Текущий URL: {current_url}")
+        return False
 
-        # Проверяем доступ к странице
-        page_text = driver.page_source.lower()
-        if "доступ запрещен" in page_text or "access denied" in page_text or "недостаточно прав" in page_text:
-            print("❌ Недостаточно прав для доступа к странице")
-            return pd.DataFrame()
+    # Проверяем, не перенаправило ли на страницу входа
+    if "signin" in current_url or "login" in current_url:
+        print("❌ Перенаправлено на страницу входа. Авторизация не удалась.")
+        return False
+
+    # Проверяем доступ к странице
+    page_text = driver.page_source.lower()
+    if "доступ запрещен" in page_text or "access denied" in page_text or "недостаточно прав" in page_text:
+        print("❌ Недостаточно прав для доступа к странице")
+        return False
 
-        # Ждем загрузки таблицы
-        print("⏳ Ожидаем загрузки таблицы...")
+    print("⏳ Ожидаем загрузки таблицы...")
+    with scrape_span.child('wait_table') as phase:
         try:
-            wait.until(EC.presence_of_element_located(
+            WebDriverWait(driver, 30).until(EC.presence_of_element_located(
                 (By.CSS_SELECTOR, "div[data-sentry-component*='Donations'], div[class*='table'], table")))
             print("✅ Таблица найдена")
+            phase.set(found=True)
         except Exception as e:
             print(f"⚠️ Таблица не загрузилась как ожидалось: {e}")
+            phase.set(found=False)
             # Продолжаем в надежде, что данные все равно есть
+    return True
+
+
+class TabScrape:
+    """Сбор строк одной гильдии прокруткой; step() делает одну итерацию в текущей вкладке драйвера"""
+
+    def __init__(self, url, guild_name, scrape_span, handle=None):
+        self.url = url
+        self.guild_name = guild_name
+        self.scrape_span = scrape_span
+        self.handle = handle
+        self.rows_data = []
+        self.seen_records = set()
+        self.previous_count = 0
+        self.no_new_count = 0
+        self.attempt = 0
+        self.done = False
+        # checked - страница проверена после открытия, started - идет прокрутка
+        self.checked = False
+        self.started = False
+        # Когда после прокрутки можно снова читать таблицу
+        self.ready_at = 0.0
+        self.scroll_phase = scrape_span.child('scroll', iterations=0, rows_seen=0, rows_new=0, page_source_bytes=0)
+
+    def step(self, driver):
+        """Читает таблицу, добавляет новые строки и прокручивает дальше; выставляет done, когда данных больше нет"""
+        scroll_phase = self.scroll_phase
+        self.attempt += 1
+
+        # Получаем HTML только контейнера таблицы
+        table_html = driver.execute_script(TABLE_HTML_SCRIPT, TABLE_SELECTORS)
+        scroll_phase.inc('iterations')
+
+        if not table_html:
+            print("❌ Таблица не найдена в HTML")
+            # Сохраняем HTML для отладки
+            with open('debug_page.html', 'w', encoding='utf-8') as f:
+                f.write(driver.page_source)
+            print("✅ Сохранен HTML для отладки: debug_page.html")
+            self.done = True
+            return
+
+        selector, container_html = table_html
+        scroll_phase.inc('page_source_bytes', len(container_html.encode('utf-8')))
+        if LXML_AVAILABLE:
+            extracted_rows, rows_seen, _ = extract_table_rows(container_html, selector)
+        else:
+            extracted_rows, rows_seen = extract_rows(BeautifulSoup(container_html, 'html.parser'))
+
+        print(f"✅ Найдена таблица с селектором: {selector}")
+        print(f"📊 {self.guild_name}, попытка {self.attempt}: найдено {rows_seen} строк")
+        scroll_phase.inc('rows_seen', rows_seen)
+
+        # Оставляем только строки, которых еще не видели на предыдущих прокрутках
+        new_rows_found = 0
+        for user, amount, date in extracted_rows:
+            row_id = f"{user}|{amount}|{date}"
+            if row_id not in self.seen_records:
+                self.rows_data.append([user, amount, date])
+                self.seen_records.add(row_id)
+                new_rows_found += 1
+
+        print(f"📈 Собрано записей: {len(self.rows_data)} (новых: {new_rows_found})")
+        scroll_phase.inc('rows_new', new_rows_found)
+
+        # Проверяем прогресс
+        if len(self.rows_data) == self.previous_count:
+            self.no_new_count += 1
+            if self.no_new_count >= 3:
+                print("🛑 Новых данных нет, завершаем...")
+                self.done = True
+                return
+        else:
+            self.no_new_count = 0
+            self.previous_count = len(self.rows_data)
 
-        print("⏳ Ждем загрузку данных...")
-        time.sleep(3)
-
-        print("🔄 Начинаем сбор данных с прокруткой...")
-
-        for attempt in range(max_scroll_attempts):
-            # Получаем HTML
-            page_html = driver.page_source
-            soup = BeautifulSoup(page_html, 'html.parser')
-
-            # Ищем таблицу разными способами
-            table_selectors = [
-                'div[data-sentry-component="VirtualizedDataTable"]',
-                'div[data-sentry-component="GuildDonationsList"]',
-                'div[class*="table"]',
-                'table'
-            ]
-
-            table_container = None
-            for selector in table_selectors:
-                table_container = soup.select_one(selector)
-                if table_container:
-                    print(f"✅ Найдена таблица с селектором: {selector}")
-                    break
-
-            if not table_container:
-                print("❌ Таблица не найдена в HTML")
-                # Сохраняем HTML для отладки
-                with open('debug_page.html', 'w', encoding='utf-8') as f:
-                    f.write(page_html)
-                print("✅ Сохранен HTML для отладки: debug_page.html")
-                break
-
-            # Ищем строки таблицы
-            rows = table_container.find_all('tr', style=re.compile(r'position:\s*absolute'))
-
-            # Альтернативный поиск строк
-            if not rows:
-                rows = table_container.find_all('tr')
-                # Фильтруем только видимые строки с данными
-                rows = [row for row in rows if row.find('td')]
-
-            print(f"📊 Попытка {attempt + 1}: найдено {len(rows)} строк")
+        if self.attempt >= MAX_SCROLL_ATTEMPTS:
+            self.done = True
+            return
 
-            # Обрабатываем строки
-            new_rows_found = 0
-            for row in rows:
+        # Прокрутка вниз
+        try:
+            for selector in SCROLL_SELECTORS:
                 try:
-                    # Получаем все ячейки
-                    cells = row.find_all(['td', 'th'])
-                    if len(cells) < 3:
-                        continue
+                    element = driver.find_element(By.CSS_SELECTOR, selector)
+                    driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", element)
+                    print(f"⬇️  Прокручен элемент: {selector}")
+                    break
+                except:
+                    continue
+            else:
+                # Если не нашли специфичный элемент, прокручиваем страницу
+                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                print("⬇️  Прокручена вся страница")
+        except Exception as e:
+            print(f"⚠️ Ошибка прокрутки: {e}")
+        self.ready_at = time.monotonic() + SCROLL_DELAY
 
-                    # Извлекаем данные из каждой ячейки
-                    user_cell, amount_cell, date_cell = cells[0], cells[1], cells[2]
+    def begin(self):
+        self.started = True
+        self.scroll_phase.__enter__()
 
-                    user = extract_user_data(user_cell)
-                    amount = extract_amount_data(amount_cell)
-                    date = extract_date_data(date_cell)
+    def finish(self):
+        """Закрывает span прокрутки и собирает DataFrame"""
+        self.scroll_phase.__exit__(None, None, None)
+        return self.to_dataframe()
 
-                    # Пропускаем заголовки и пустые строки
-                    if not user or user in ['Пользователь', 'User', 'Неизвестный']:
-                        continue
+    def to_dataframe(self):
+        """DataFrame собранных строк; пустой, если ничего не собрано"""
+        print(f"\n🎉 ПАРСИНГ ЗАВЕРШЕН: {self.guild_name}")
+        print(f"📋 Всего собрано записей: {len(self.rows_data)}")
 
-                    # Создаем уникальный идентификатор
-                    row_id = f"{user}|{amount}|{date}"
-
-                    if row_id not in seen_records:
-                        rows_data.append([user, amount, date])
-                        seen_records.add(row_id)
-                        new_rows_found += 1
+        if not self.rows_data:
+            print("❌ Не удалось собрать данные бустов")
+            return pd.DataFrame()
 
-                except Exception as e:
-                    print(f"⚠️ Ошибка обработки строки: {e}")
-                    continue
+        with self.scrape_span.child('build_dataframe', rows=len(self.rows_data)):
+            print("🔄 Преобразуем суммы в числовой формат...")
+            df = build_donations_dataframe(self.rows_data)
 
-            print(f"📈 Собрано записей: {len(rows_data)} (новых: {new_rows_found})")
+        print("📊 Статистика собранных бустов:")
+        print(f"  - Всего собрано бустов: {len(df)}")
+        print(f"  - Уникальных бустеров: {df['Пользователь'].nunique()}")
+        print(f"  - Общая сумма бустов: {df['Сумма'].sum():,} ⚡")
+        return df
 
-            # Проверяем прогресс
-            if len(rows_data) == previous_count:
-                no_new_count += 1
-                if no_new_count >= 3:
-                    print("🛑 Новых данных нет, завершаем...")
-                    break
-            else:
-                no_new_count = 0
-                previous_count = len(rows_data)
 
-            # Прокрутка вниз
-            try:
-                # Пробуем разные элементы для прокрутки
-                scroll_selectors = [
-                    "div[data-sentry-component='GuildDonationsList']",
-                    "div[data-sentry-component='VirtualizedDataTable']",
-                    ".table-container",
-                    "div[class*='virtual']",
-                    "body"
-                ]
-
-                for selector in scroll_selectors:
-                    try:
-                        element = driver.find_element(By.CSS_SELECTOR, selector)
-                        driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", element)
-                        print(f"⬇️  Прокручен элемент: {selector}")
-                        break
-                    except:
-                        continue
-                else:
-                    # Если не нашли специфичный элемент, прокручиваем страницу
-                    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    print("⬇️  Прокручена вся страница")
+def login_session(driver, scrape_span):
+    """Вход на сайт; cookies сессии общие для всех вкладок и сохраняются для быстрого пути"""
+    print("🔐 Выполняем вход на remanga.org...")
+    with scrape_span.child('login') as phase:
+        login_success = login_to_remanga(driver)
+        phase.set(success=login_success)
 
-                time.sleep(2)
+    if not login_success:
+        print("❌ Не удалось войти в систему, пробуем продолжить без авторизации...")
+    elif HTTP_FAST_PATH and remember_driver_cookies(driver):
+        print("🍪 Cookies сессии сохранены для быстрого пути")
+    return login_success
 
-            except Exception as e:
-                print(f"⚠️ Ошибка прокрутки: {e}")
 
-        print(f"\n🎉 ПАРСИНГ ЗАВЕРШЕН")
-        print(f"📋 Всего собрано записей: {len(rows_data)}")
+def _parse_table(url, guild_name, scrape_span):
+    """Основная логика parse_table; фазы отмечаются дочерними span'ами scrape_span"""
+    # Настройка браузера через Selenium
+    with scrape_span.child('setup_driver') as phase:
+        driver = setup_driver()
+        phase.set(success=driver is not None)
+    if not driver:
+        print("❌ Не удалось подключиться к Selenium")
+        return pd.DataFrame()
 
-        # Создаем DataFrame
-        if rows_data:
-            df = pd.DataFrame(rows_data, columns=['Пользователь', 'Сумма', 'Дата'])
-            df = df.drop_duplicates()
+    try:
+        login_session(driver, scrape_span)
 
-            print("🔄 Преобразуем суммы в числовой формат...")
-            df['Сумма'] = df['Сумма'].apply(convert_amount_to_int)
+        open_guild_page(driver, url, guild_name, scrape_span)
+        time.sleep(5)
+        if not check_guild_page(driver, scrape_span):
+            return pd.DataFrame()
 
-            print("📊 Статистика собранных бустов:")
-            print(f"  - Всего собрано бустов: {len(df)}")
-            print(f"  - Уникальных бустеров: {df['Пользователь'].nunique()}")
-            print(f"  - Общая сумма бустов: {df['Сумма'].sum():,} ⚡")
+        print("⏳ Ждем загрузку данных...")
+        time.sleep(3)
 
+        print("🔄 Начинаем сбор данных с прокруткой...")
+        tab = TabScrape(url, guild_name, scrape_span)
+        with tab.scroll_phase:
+            while not tab.done:
+                time.sleep(max(0.0, tab.ready_at - time.monotonic()))
+                tab.step(driver)
+
+        df = tab.to_dataframe()
+        if not df.empty:
             # Сохраняем результат в CSV для отладки
             df.to_csv('donations_result.csv', index=False, encoding='utf-8')
             print("💾 Результат сохранен в donations_result.csv")
-
-            return df
-        else:
-            print("❌ Не удалось собрать данные бустов")
-            return pd.DataFrame()
+        return df
 
     except Exception as e:
         print(f"❌ Критическая ошибка при парсинге: {e}")
@@ -668,11 +858,140 @@ def parse_table(url='https://remanga.org/guild/i-g-g-d-r-a-s-i-l--a1172e3f/setti
             pass
 
 
+def _deliver(results, on_result, url, df, scrape_span):
+    # span гильдии закрывается, как только она готова: иначе scrape.seconds копит время всего прохода
+    scrape_span.set(rows=len(df))
+    scrape_span.__exit__(None, None, None)
+    results[url] = df
+    if on_result is not None:
+        on_result(url, df)
+
+
+def parse_tables(urls, tabs: int = None, on_result=None):
+    """
+    Парсит несколько гильдий в одной сессии браузера: один вход, одна гильдия на вкладку.
+    Вкладки прокручиваются по кругу, поэтому пока одна подгружает строки, читается другая.
+    Гильдии, которые удалось получить через API, браузер не открывают.
+    on_result(url, df) вызывается по мере готовности каждой гильдии. Возвращает {url: DataFrame}
+    """
+    tabs = max(1, tabs or SCRAPE_TABS)
+    results = {}
+    pending = []
+
+    spans = {}
+    try:
+        for url in urls:
+            guild_name = extract_guild_name_from_url(url)
+            scrape_span = span('scrape', labels={'guild': guild_name}, url=url)
+            spans[url] = (guild_name, scrape_span)
+            scrape_span.__enter__()
+            df = _parse_table_http(url, scrape_span) if HTTP_FAST_PATH else None
+            if df is None:
+                pending.append(url)
+            else:
+                _deliver(results, on_result, url, df, scrape_span)
+
+        if pending:
+            _parse_tables_in_tabs(pending, spans, tabs, results, on_result)
+    finally:
+        for url, (_, scrape_span) in spans.items():
+            if url not in results:
+                # Гильдия не открылась или сессия браузера оборвалась
+                _deliver(results, on_result, url, pd.DataFrame(), scrape_span)
+
+    return results
+
+
+def _parse_tables_in_tabs(urls, spans, tabs, results, on_result):
+    """Прокручивает гильдии в tabs вкладках одной авторизованной сессии, по гильдии на вкладку"""
+    session_span = span('scrape_session', guilds=len(urls), tabs=tabs)
+    with session_span:
+        with session_span.child('setup_driver') as phase:
+            driver = setup_driver()
+            phase.set(success=driver is not None)
+        if not driver:
+            print("❌ Не удалось подключиться к Selenium")
+            return
+
+        active = []
+        try:
+            login_session(driver, session_span)
+            # Вкладка входа остается открытой: закрытие последней вкладки завершает сессию
+            base_handle = driver.current_window_handle
+
+            queue = list(urls)
+            while queue or active:
+                # Освободившаяся вкладка сразу получает следующую гильдию
+                while queue and len(active) < tabs:
+                    url = queue.pop(0)
+                    guild_name, scrape_span = spans[url]
+                    # Отсчет заново: ожидание свободной вкладки не входит во время гильдии
+                    scrape_span.__enter__()
+                    driver.switch_to.new_window('tab')
+                    tab = TabScrape(url, guild_name, scrape_span, handle=driver.current_window_handle)
+                    try:
+                        open_guild_page(driver, url, guild_name, scrape_span)
+                    except Exception as e:
+                        print(f"❌ Не удалось открыть гильдию {guild_name}: {e}")
+                        driver.close()
+                        driver.switch_to.window(base_handle)
+                        _deliver(results, on_result, url, pd.DataFrame(), scrape_span)
+                        continue
+                    # Страница догружается, пока обрабатываются другие вкладки
+                    tab.ready_at = time.monotonic() + 5
+                    active.append(tab)
+                    # Каждая открытая вкладка - отдельный парсинг в полете
+                    add_gauge('scrape_in_flight', 1)
+
+                # Берем вкладку, которая раньше всех готова к следующему шагу
+                tab = min(active, key=lambda item: item.ready_at)
+                time.sleep(max(0.0, tab.ready_at - time.monotonic()))
+                driver.switch_to.window(tab.handle)
+                try:
+                    if not tab.checked:
+                        tab.checked = True
+                        if check_guild_page(driver, tab.scrape_span):
+                            tab.begin()
+                            tab.ready_at = time.monotonic() + 3
+                            continue
+                        tab.done = True
+                    else:
+                        tab.step(driver)
+                except Exception as e:
+                    print(f"❌ Ошибка парсинга гильдии {tab.guild_name}: {e}")
+                    tab.done = True
+
+                if tab.done:
+                    active.remove(tab)
+                    add_gauge('scrape_in_flight', -1)
+                    df = tab.finish() if tab.started else pd.DataFrame()
+                    driver.close()
+                    driver.switch_to.window(base_handle)
+                    _deliver(results, on_result, tab.url, df, tab.scrape_span)
+
+        except Exception as e:
+            print(f"❌ Критическая ошибка при парсинге во вкладках: {e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            add_gauge('scrape_in_flight', -len(active))
+            print("🔚 Закрываем браузер...")
+            try:
+                driver.quit()
+            except:
+                pass
+
+
 def parse_table_for_service(url):
     """Функция для сервиса парсинга"""
     return parse_table(url)
 
 
+def parse_tables_for_service(urls, on_result=None):
+    """Проход сервиса парсинга: все гильдии в одной сессии браузера"""
+    return parse_tables(urls, on_result=on_result)
+
+
 # Точка входа для тестирования
 if __name__ == "__main__":
     print("🔧 Запуск тестирования Selenium парсера...")
@@ -1,7 +1,12 @@
 import schedule
 import time
+import datetime
+import logging
 from database import db_manager
-from parser import parse_table_for_service
+from guild_registry import guild_registry
+from guild_sharding import guild_shard
+from parser import parse_tables_for_service
+from metrics import span, log_event, histogram_summary, observe, set_gauge, start_metrics_server
 
 print("🔧 Инициализация сервиса парсинга...")
 
@@ -14,71 +19,122 @@ def load_guilds_for_service():
     db_manager.setup_database()
     db_manager.setup_guilds_table()
 
-    guilds = db_manager.load_all_guilds()
-    print(f"📊 Загружено {len(guilds)} гильдий для парсинга")
+    guild_registry.load()
+    print(f"📊 Загружено {len(guild_registry)} гильдий для парсинга")
 
-    if guilds:
-        for i, (name, url) in enumerate(guilds.items(), 1):
+    if guild_registry:
+        for i, name in enumerate(guild_registry.names(), 1):
             print(f"  {i}. {name}")
     else:
         print("❌ В базе данных нет гильдий для парсинга")
         print("💡 Добавьте гильдии через бота командой /start")
 
-    return guilds
+    return guild_registry
+
+def save_guild_result(guild_name, df):
+    """Сохраняет донаты гильдии и ставит уведомления о новых бустах"""
+    try:
+        if not df.empty:
+            with span('scrape.save_donations', labels={'guild': guild_name}, rows=len(df)) as phase:
+                result = db_manager.save_donations(df, guild_name)
+                phase.set(success=bool(result), inserted=result['saved'] if result else 0)
+            if result:
+                print(f"✅ {guild_name}: новых записей {result['saved']} из {len(df)}")
+                # Дельту прохода бот разошлет подписчикам из очереди уведомлений
+                if result['saved']:
+                    queued = db_manager.enqueue_notifications(guild_name, result['inserted'])
+                    if queued:
+                        print(f"📬 {guild_name}: уведомлений в очереди: {queued}")
+            else:
+                print(f"❌ {guild_name}: ошибка сохранения в БД")
+        else:
+            print(f"⚠️ {guild_name}: не удалось получить данные (пустой DataFrame)")
+
+    except Exception as e:
+        print(f"🚨 Критическая ошибка в гильдии {guild_name}: {e}")
+        import traceback
+        traceback.print_exc()
 
 def scheduled_parsing():
     print(f"\n🔄 Начало планового парсинга в {time.strftime('%H:%M:%S')}")
+    pass_started = time.time()
+
+    # Подхватываем гильдии, добавленные или удаленные через бота
+    if guild_registry.reload():
+        print(f"🔄 Список гильдий обновлен: {len(guild_registry)} гильдий")
 
-    if not GUILD_URLS:
+    if not guild_registry:
         print("❌ Нет гильдий для парсинга. Добавьте гильдии через бота.")
         return
 
-    print(f"📊 Начинаем парсинг {len(GUILD_URLS)} гильдий...")
+    # Каждая реплика парсит только свою долю гильдий
+    owned = guild_shard.assign(guild_registry.get_id(name) for name in guild_registry.names())
+    guilds = [(name, url) for name, url in guild_registry.items() if guild_registry.get_id(name) in owned]
 
-    for guild_name, url in GUILD_URLS.items():
-        try:
-            print(f"🎯 Парсим гильдию: {guild_name}")
-            print(f"🔗 URL: {url}")
+    print(f"📊 Начинаем парсинг {len(guilds)} из {len(guild_registry)} гильдий (реплика {guild_shard.replica_id})...")
 
-            # Сохраняем гильдию перед парсингом (на всякий случай)
-            db_manager.save_guild(guild_name, url)
+    names_by_url = {}
+    for guild_name, url in guilds:
+        print(f"🎯 Парсим гильдию: {guild_name}")
+        print(f"🔗 URL: {url}")
+        # Сохраняем гильдию перед парсингом (на всякий случай)
+        db_manager.save_guild(guild_name, url)
+        names_by_url[url] = guild_name
 
-            # Запускаем парсинг
-            df = parse_table_for_service(url)
-
-            if not df.empty:
-                success = db_manager.save_donations(df, guild_name)
-                if success:
-                    print(f"✅ {guild_name}: успешно сохранено {len(df)} записей")
-                else:
-                    print(f"❌ {guild_name}: ошибка сохранения в БД")
-            else:
-                print(f"⚠️ {guild_name}: не удалось получить данные (пустой DataFrame)")
-
-        except Exception as e:
-            print(f"🚨 Критическая ошибка в гильдии {guild_name}: {e}")
-            import traceback
-            traceback.print_exc()
+    # Все гильдии прохода - в одной сессии браузера, по вкладке на гильдию; результаты сохраняются по готовности
+    try:
+        parse_tables_for_service(list(names_by_url),
+                                 on_result=lambda url, df: save_guild_result(names_by_url[url], df))
+    except Exception as e:
+        print(f"🚨 Критическая ошибка прохода парсинга: {e}")
+        import traceback
+        traceback.print_exc()
 
     print(f"✅ Плановый парсинг завершен в {time.strftime('%H:%M:%S')}")
+    pass_duration = time.time() - pass_started
+    observe('scrape_pass_seconds', pass_duration)
+    set_gauge('scrape_pass_last_duration_seconds', pass_duration)
+    set_gauge('scrape_pass_last_finished_timestamp', time.time())
+    set_gauge('scrape_guilds', len(guilds))
+
+    # Скользящая статистика длительности парсинга по гильдиям за последние проходы
+    log_event('scrape_pass_summary', duration_s=round(pass_duration, 1),
+              histograms=histogram_summary('scrape.seconds'))
+
+def record_scheduler_lag():
+    """Записывает, насколько позже запланированного времени стартуют задачи"""
+    now = datetime.datetime.now()
+    lags = [(now - job.next_run).total_seconds() for job in schedule.jobs if job.should_run]
+    # Нет просроченных задач - отставания нет; иначе после одного позднего запуска значение висело бы всегда
+    set_gauge('scheduler_lag_seconds', max(lags, default=0))
 
 # Загружаем гильдии только при запуске скрипта напрямую
 if __name__ == '__main__':
-    GUILD_URLS = load_guilds_for_service()
+    logging.basicConfig(level=logging.INFO)
+
+    start_metrics_server()
+    load_guilds_for_service()
+    guild_shard.start()
 
     # Настраиваем расписание
     print("⏰ Настраиваем расписание...")
     schedule.every(1).minute.do(scheduled_parsing) # для теста 1 по стандарту 10
+    # Партиции донатов на месяцы вперед и архив старых месяцев
+    db_manager.maintain_partitions()
+    schedule.every().day.at("04:00").do(db_manager.maintain_partitions)
 
     print(f"\n🚀 Сервис парсинга запущен!")
-    print(f"📊 Мониторим {len(GUILD_URLS)} гильдий")
+    print(f"📊 Мониторим {len(guild_registry)} гильдий")
     print(f"⏰ Парсинг каждые 2 минуты")
     print(f"⏳ Ожидаем первого запуска...")
 
     # Бесконечный цикл
     try:
         while True:
+            record_scheduler_lag()
             schedule.run_pending()
             time.sleep(60)
     except KeyboardInterrupt:
-        print("\n⏹️ Сервис парсинга остановлен")
\ No newline at end of file
+        print("\n⏹️ Сервис парсинга остановлен")
+    finally:
+        guild_shard.stop()
\ No newline at end of file
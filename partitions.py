@@ -0,0 +1,102 @@
+# Помесячное RANGE-партиционирование таблиц донатов по date_buster (MySQL)
+# Запросы за недавний период читают только свои партиции; старые месяцы архивируются целой партицией
+import os
+import datetime
+
+PARTITION_COLUMN = 'date_buster'
+# Строки старше первой месячной партиции (и даты-заглушки старых строк без даты)
+OLD_PARTITION = 'p_old'
+# Все, что позже последней созданной партиции; maintain_partitions отрезает от нее новые месяцы
+FUTURE_PARTITION = 'p_future'
+
+# На сколько месяцев вперед держать готовые партиции
+FUTURE_MONTHS = int(os.getenv('DONATION_PARTITION_FUTURE_MONTHS', 3))
+# Сколько месяцев хранить в основной таблице; 0 - не архивировать
+RETENTION_MONTHS = int(os.getenv('DONATION_RETENTION_MONTHS', 0))
+PARTITIONING_ENABLED = os.getenv('DONATION_PARTITIONING', '1') != '0'
+
+# Дата для старых строк без даты: первичный ключ партиционированной таблицы включает date_buster
+MISSING_DATE = datetime.datetime(1970, 1, 1)
+
+
+def month_start(value) -> datetime.date:
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month: datetime.date, count: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"p{month:%Y%m}"
+
+
+def partition_month(name: str):
+    """Месяц месячной партиции по имени; None для p_old, p_future и чужих имен"""
+    try:
+        return datetime.datetime.strptime(name, 'p%Y%m').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def month_range(first: datetime.date, last: datetime.date):
+    month = first
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_definition(month: datetime.date) -> str:
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (TO_DAYS('{add_months(month, 1):%Y-%m-%d}'))"
+
+
+def partition_by_sql(first: datetime.date, last: datetime.date) -> str:
+    """PARTITION BY для CREATE/ALTER TABLE: p_old, месяцы first..last, p_future"""
+    definitions = [f"PARTITION {OLD_PARTITION} VALUES LESS THAN (TO_DAYS('{first:%Y-%m-%d}'))"]
+    definitions += [partition_definition(month) for month in month_range(first, last)]
+    definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+    return f"PARTITION BY RANGE (TO_DAYS(`{PARTITION_COLUMN}`)) (\n  " + ",\n  ".join(definitions) + "\n)"
+
+
+def split_future_sql(table: str, months) -> str:
+    """Отрезает месяцы от p_future; обычно она пуста, поэтому перестройка почти бесплатна"""
+    definitions = [partition_definition(month) for month in months]
+    definitions.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+    return (f"ALTER TABLE `{table}` REORGANIZE PARTITION {FUTURE_PARTITION} INTO (\n  "
+            + ",\n  ".join(definitions) + "\n)")
+
+
+def split_old_sql(table: str, months) -> str:
+    """Отрезает от p_old месяцы months, чтобы история первой выгрузки не оставалась в одной партиции.
+    Последний месяц должен заканчиваться там, где начинается первая месячная партиция"""
+    definitions = [f"PARTITION {OLD_PARTITION} VALUES LESS THAN (TO_DAYS('{months[0]:%Y-%m-%d}'))"]
+    definitions += [partition_definition(month) for month in months]
+    return (f"ALTER TABLE `{table}` REORGANIZE PARTITION {OLD_PARTITION} INTO (\n  "
+            + ",\n  ".join(definitions) + "\n)")
+
+
+def expired_partitions(months, cutoff: datetime.date):
+    """Партиции целиком старше cutoff. p_old - только если ее граница (первый месяц) не позже cutoff"""
+    months = sorted(months)
+    expired = [partition_name(month) for month in months if month < cutoff]
+    if months and months[0] <= cutoff:
+        expired.insert(0, OLD_PARTITION)
+    return expired
+
+
+def archive_table_name(table: str) -> str:
+    return f"{table}_archive"
+
+
+def date_index_name(table: str) -> str:
+    # В SQLite имена индексов общие для всей базы, поэтому в имени есть таблица; MySQL ограничивает длину 64
+    return f"idx_{table}_date"[:64]
+
+
+def retention_cutoff(now: datetime.datetime = None):
+    """Начало самого старого хранимого месяца; None, если архивирование выключено"""
+    if RETENTION_MONTHS <= 0:
+        return None
+    month = add_months(month_start(now or datetime.datetime.now()), -RETENTION_MONTHS)
+    return datetime.datetime.combine(month, datetime.time())
@@ -0,0 +1,102 @@
+import os
+import time
+import functools
+from collections import OrderedDict
+
+# Стоимость действий в токенах: обновление запускает полный парсинг,
+# поэтому стоит столько же, сколько весь бакет
+ACTION_COSTS = {
+    'message': 1.0,
+    'view': 1.0,
+    'callback': 1.0,
+    'history': 5.0,
+    'refresh': 30.0,
+}
+
+
+class TokenBucketLimiter:
+    """Token bucket на пользователя с ограниченной памятью и вытеснением по TTL"""
+
+    def __init__(self, capacity: float = 30.0, refill_rate: float = 1.0, ttl: float = 600.0,
+                 max_entries: int = 10000, costs: dict = None):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        # Бакет, который простоял дольше capacity / refill_rate, уже полон,
+        # поэтому вытеснение по TTL не меняет поведение лимитера
+        self.ttl = max(ttl, capacity / refill_rate)
+        self.max_entries = max_entries
+        self.costs = dict(ACTION_COSTS, **(costs or {}))
+        # user_id -> [токены, время последнего обращения]; порядок = порядок обращений
+        self._buckets = OrderedDict()
+
+    def _evict(self, now: float):
+        """Удаляет бакеты, к которым давно не обращались, и держит размер в пределах max_entries"""
+        while self._buckets:
+            user_id, (_, last_seen) = next(iter(self._buckets.items()))
+            if now - last_seen < self.ttl and len(self._buckets) < self.max_entries:
+                break
+            del self._buckets[user_id]
+
+    def _refill(self, user_id: int, now: float):
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = [self.capacity, now]
+            self._buckets[user_id] = bucket
+        else:
+            tokens, last_seen = bucket
+            bucket[0] = min(self.capacity, tokens + (now - last_seen) * self.refill_rate)
+            bucket[1] = now
+            self._buckets.move_to_end(user_id)
+        return bucket
+
+    def consume(self, user_id: int, action: str = 'message') -> bool:
+        """Списывает токены за действие. Возвращает False, если лимит исчерпан"""
+        now = time.monotonic()
+        self._evict(now)
+        bucket = self._refill(user_id, now)
+        cost = min(self.costs.get(action, 1.0), self.capacity)
+
+        if bucket[0] < cost:
+            return False
+
+        bucket[0] -= cost
+        return True
+
+    def retry_after(self, user_id: int, action: str = 'message') -> float:
+        """Через сколько секунд действие снова станет доступно"""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            return 0.0
+        cost = min(self.costs.get(action, 1.0), self.capacity)
+        tokens = min(self.capacity, bucket[0] + (time.monotonic() - bucket[1]) * self.refill_rate)
+        return max(0.0, (cost - tokens) / self.refill_rate)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+limiter = TokenBucketLimiter(
+    capacity=float(os.getenv('RATE_LIMIT_CAPACITY', 30)),
+    refill_rate=float(os.getenv('RATE_LIMIT_REFILL_PER_SEC', 1)),
+    ttl=float(os.getenv('RATE_LIMIT_TTL', 600)),
+    max_entries=int(os.getenv('RATE_LIMIT_MAX_USERS', 10000)),
+)
+
+
+def rate_limited(action: str):
+    """Декоратор для обработчиков Telegram: пропускает вызов, если пользователь превысил лимит"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context, *args, **kwargs):
+            user = update.effective_user
+            if user is None or limiter.consume(user.id, action):
+                return await handler(update, context, *args, **kwargs)
+
+            wait_seconds = max(1, round(limiter.retry_after(user.id, action)))
+            text = f"⚠️ Слишком часто! Попробуйте снова через {wait_seconds} с."
+            if update.callback_query:
+                await update.callback_query.answer(text, show_alert=True)
+            elif update.message:
+                await update.message.reply_text(text)
+        return wrapper
+    return decorator
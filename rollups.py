@@ -0,0 +1,54 @@
+# Предагрегаты донатов гильдии по дням, неделям и месяцам (guild_rollups, guild_rollup_users)
+# save_donations прибавляет к ним дельту прохода; отчеты за период читают несколько строк вместо сырых донатов
+import datetime
+from date_normalizer import SITE_TIMEZONE
+
+DAY = 'day'
+WEEK = 'week'
+MONTH = 'month'
+PERIODS = (DAY, WEEK, MONTH)
+
+# Номера периодов в callback_data
+PERIOD_CODES = {DAY: 0, WEEK: 1, MONTH: 2}
+
+
+def bucket_start(period: str, value) -> datetime.date:
+    """Первый день бакета, в который попадает дата: сам день, понедельник недели или 1-е число месяца"""
+    day = value.date() if isinstance(value, datetime.datetime) else value
+    if period == DAY:
+        return day
+    if period == WEEK:
+        return day - datetime.timedelta(days=day.weekday())
+    if period == MONTH:
+        return day.replace(day=1)
+    raise ValueError(f"неизвестный период: {period}")
+
+
+def previous_bucket(period: str, bucket: datetime.date) -> datetime.date:
+    return bucket_start(period, bucket - datetime.timedelta(days=1))
+
+
+def site_today() -> datetime.date:
+    """Сегодня по времени сайта: в нем хранятся date_buster"""
+    return datetime.datetime.now(SITE_TIMEZONE).date()
+
+
+def deltas(rows, sign: int = 1):
+    """[(ник, сумма, дата)] -> {(период, бакет, ник): [сумма, число донатов]}; sign=-1 для удаленных донатов"""
+    result = {}
+    for user_name, amount, date in rows:
+        if date is None:
+            continue
+        for period in PERIODS:
+            entry = result.setdefault((period, bucket_start(period, date), user_name), [0, 0])
+            entry[0] += sign * int(amount)
+            entry[1] += sign
+    return result
+
+
+def merge(target: dict, other: dict) -> dict:
+    for key, (total, count) in other.items():
+        entry = target.setdefault(key, [0, 0])
+        entry[0] += total
+        entry[1] += count
+    return target
@@ -0,0 +1,129 @@
+# Компактные снимки результата парсинга: отсортированные пары (минута доната, 8-байтный отпечаток) в zlib
+# Разница двух снимков дает добавленные и удаленные на сайте донаты без чтения истории из БД
+import os
+import sys
+import zlib
+import struct
+import hashlib
+import datetime
+from array import array
+
+# Доля строк окна предыдущего снимка, которую разрешено удалить за один проход;
+# больше - скорее обрезанная выгрузка, чем правка на сайте. Одно удаление допускается всегда
+MAX_REMOVAL_RATIO = float(os.getenv('SNAPSHOT_MAX_REMOVAL_RATIO', 0.2))
+
+# Насколько может разойтись время одного доната между проходами при точности до минуты
+# (относительное "5 минут назад" или минутная метка API)
+MINUTE_TOLERANCE = datetime.timedelta(minutes=2)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+_HEADER = struct.Struct('<BI')
+FORMAT_VERSION = 1
+
+
+def fingerprint(key: str) -> int:
+    """8-байтный отпечаток ключа доната (знаковый, помещается в BIGINT)"""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def to_minute(date: datetime.datetime) -> int:
+    return int((date - EPOCH).total_seconds() // 60)
+
+
+def _little_endian(values: array) -> array:
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def encode(entries) -> bytes:
+    """[(минута, отпечаток)] -> bytes: минуты дельтами, затем отпечатки; оба ряда в порядке сортировки"""
+    entries = sorted(set(entries))
+    minutes = array('I', (minute - (entries[i - 1][0] if i else 0) for i, (minute, _) in enumerate(entries)))
+    fingerprints = array('q', (value for _, value in entries))
+    payload = _little_endian(minutes).tobytes() + _little_endian(fingerprints).tobytes()
+    return _HEADER.pack(FORMAT_VERSION, len(entries)) + zlib.compress(payload, 6)
+
+
+def decode(blob: bytes):
+    """bytes -> отсортированный список (минута, отпечаток)"""
+    version, count = _HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"неизвестная версия снимка: {version}")
+    payload = zlib.decompress(blob[_HEADER.size:])
+    minutes = _little_endian(array('I', payload[:count * 4]))
+    fingerprints = _little_endian(array('q', payload[count * 4:]))
+
+    entries = []
+    minute = 0
+    for delta, value in zip(minutes, fingerprints):
+        minute += delta
+        entries.append((minute, value))
+    return entries
+
+
+def diff(previous, current):
+    """Добавленные и удаленные отпечатки между снимками.
+    Удаленными считаются только строки внутри окна текущей выгрузки (новее ее самой старой минуты):
+    более старые просто не попали в прокрутку"""
+    previous_fingerprints = {value for _, value in previous}
+    current_fingerprints = {value for _, value in current}
+    added = current_fingerprints - previous_fingerprints
+
+    if not current:
+        return added, set(), 0
+    oldest = min(minute for minute, _ in current)
+    window = {value for minute, value in previous if minute > oldest}
+    return added, window - current_fingerprints, len(window)
+
+
+def removals_look_safe(removed: int, window: int) -> bool:
+    """Защита от обрезанной выгрузки: большая доля исчезнувших строк не применяется"""
+    return removed <= max(1, int(window * MAX_REMOVAL_RATIO))
+
+
+def match_tolerance(date: datetime.datetime) -> datetime.timedelta:
+    """Точность времени доната: относительные даты округлены до часа или дня и сдвигаются на эту единицу"""
+    if date.hour == 0 and date.minute == 0:
+        return datetime.timedelta(days=1)
+    if date.minute == 0:
+        return datetime.timedelta(hours=1)
+    return MINUTE_TOLERANCE
+
+
+def pair_moved(removed, added):
+    """Сопоставляет исчезнувшие и появившиеся донаты одного бустера с той же суммой,
+    у которых разошлось только показанное время (в пределах точности).
+    removed, added: [(отпечаток, ник, сумма, дата)]. Возвращает {старый отпечаток: новый}"""
+    candidates = {}
+    for fingerprint, user_name, amount, date in added:
+        candidates.setdefault((user_name, int(amount)), []).append((_as_datetime(date), fingerprint))
+
+    pairs = {}
+    used = set()
+    for fingerprint, user_name, amount, date in removed:
+        if date is None:
+            continue
+        date = _as_datetime(date)
+        best = None
+        for new_date, new_fingerprint in candidates.get((user_name, int(amount)), ()):
+            if new_fingerprint in used:
+                continue
+            gap = abs(new_date - date)
+            if gap <= max(match_tolerance(date), match_tolerance(new_date)) and (best is None or gap < best[0]):
+                best = (gap, new_fingerprint)
+        if best is not None:
+            used.add(best[1])
+            pairs[fingerprint] = best[1]
+    return pairs
+
+
+def _as_datetime(value) -> datetime.datetime:
+    # Строки старой схемы хранят только дату
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.combine(value, datetime.time())
+
+
+def fingerprint_index_name(table: str) -> str:
+    return f"idx_{table}_fp"[:64]
@@ -0,0 +1,298 @@
+import os
+import logging
+import sqlite3
+import datetime
+
+try:
+    import mysql.connector
+    from mysql.connector import Error as MySQLError
+except ImportError:  # для однонодовых установок на SQLite mysql-connector не обязателен
+    mysql = None
+
+    class MySQLError(Exception):
+        pass
+
+logger = logging.getLogger(__name__)
+
+# Ошибки любого из хранилищ; DatabaseManager ловит их единым except
+DB_ERRORS = (MySQLError, sqlite3.Error)
+
+
+def _convert_date(value: bytes):
+    text = value.decode()
+    # В колонке date старой схемы могут лежать значения со временем: SQLite не меняет тип колонки
+    if len(text) > 10:
+        return datetime.datetime.fromisoformat(text)
+    return datetime.date.fromisoformat(text)
+
+
+def _convert_datetime(value: bytes):
+    return datetime.datetime.fromisoformat(value.decode())
+
+
+# Явные конвертеры вместо устаревших встроенных: колонки date/timestamp возвращаются
+# объектами date/datetime, как в mysql.connector
+sqlite3.register_converter('date', _convert_date)
+sqlite3.register_converter('timestamp', _convert_datetime)
+sqlite3.register_converter('datetime', _convert_datetime)
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(' '))
+
+
+class MySQLBackend:
+    """Хранилище на MySQL (Railway): каждый вызов открывает свое подключение к серверу"""
+
+    name = 'mysql'
+    supports_partitioning = True
+
+    def __init__(self, config: dict):
+        self.config = config
+
+    def describe(self) -> str:
+        return f"mysql host={self.config['host']}, db={self.config['database']}, port={self.config['port']}"
+
+    def connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def connect_server(self):
+        """Подключение к серверу без выбора базы данных"""
+        server_config = self.config.copy()
+        server_config.pop('database', None)
+        return mysql.connector.connect(**server_config)
+
+    def database_exists(self) -> bool:
+        connection = self.connect_server()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SHOW DATABASES LIKE %s", (self.config['database'],))
+            return cursor.fetchone() is not None
+        finally:
+            connection.close()
+
+    def create_database(self):
+        connection = self.connect_server()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{self.config['database']}`")
+            connection.commit()
+        finally:
+            connection.close()
+
+    def table_exists_sql(self) -> str:
+        return "SHOW TABLES LIKE %s"
+
+    def column_type_sql(self) -> str:
+        """Запрос типа колонки: параметры (таблица, колонка)"""
+        return ("SELECT DATA_TYPE FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s")
+
+    def modify_column_sql(self, table: str, column: str, definition: str):
+        return f"ALTER TABLE `{table}` MODIFY `{column}` {definition}"
+
+    def index_exists_sql(self) -> str:
+        """Запрос наличия индекса: параметры (таблица, индекс)"""
+        return ("SELECT 1 FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1")
+
+    def create_index_sql(self, table: str, name: str, columns) -> str:
+        column_list = ', '.join(f"`{column}`" for column in columns)
+        return f"ALTER TABLE `{table}` ADD INDEX `{name}` ({column_list})"
+
+    def partitions_sql(self) -> str:
+        """Имена партиций таблицы по порядку: параметр (таблица)"""
+        return ("SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+                "ORDER BY PARTITION_ORDINAL_POSITION")
+
+    def now_offset_sql(self) -> str:
+        """Время сервера БД плюс %s секунд (отрицательное значение - в прошлом)"""
+        return "NOW() + INTERVAL %s SECOND"
+
+    def autoincrement_pk(self) -> str:
+        return "int NOT NULL AUTO_INCREMENT PRIMARY KEY"
+
+    def on_update_timestamp(self) -> str:
+        return "timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+
+    def insert_ignore(self) -> str:
+        return "INSERT IGNORE"
+
+    def greatest(self, *expressions) -> str:
+        return f"GREATEST({', '.join(expressions)})"
+
+    def excluded(self, column: str) -> str:
+        """Значение колонки из вставляемой строки внутри upsert"""
+        return f"VALUES(`{column}`)"
+
+    def upsert_sql(self, table: str, columns, key_columns, updates: dict) -> str:
+        """INSERT ... ON DUPLICATE KEY UPDATE; updates: колонка -> SQL-выражение"""
+        column_list = ', '.join(f"`{column}`" for column in columns)
+        placeholders = ', '.join(['%s'] * len(columns))
+        assignments = ', '.join(f"`{column}` = {expression}" for column, expression in updates.items())
+        return f"INSERT INTO `{table}` ({column_list}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {assignments}"
+
+
+class SQLiteCursor:
+    """Курсор SQLite с интерфейсом mysql.connector: плейсхолдеры %s и dictionary=True"""
+
+    def __init__(self, cursor: sqlite3.Cursor, dictionary: bool = False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @staticmethod
+    def _translate(sql: str) -> str:
+        return sql.replace('%s', '?')
+
+    def execute(self, sql: str, params=()):
+        self._cursor.execute(self._translate(sql), tuple(params or ()))
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        self._cursor.executemany(self._translate(sql), seq_of_params)
+        return self
+
+    def _convert(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {description[0]: value for description, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._convert(row) for row in self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Подключение SQLite с интерфейсом, который использует DatabaseManager"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+        self._open = True
+
+    def cursor(self, dictionary: bool = False, **kwargs):
+        return SQLiteCursor(self._connection.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def is_connected(self) -> bool:
+        return self._open
+
+    def close(self):
+        if self._open:
+            self._connection.close()
+            self._open = False
+
+
+class SQLiteBackend:
+    """Встроенное хранилище SQLite в режиме WAL: без внешнего сервиса и сетевых задержек"""
+
+    name = 'sqlite'
+    # Партиций нет: недавние строки находит индекс по date_buster
+    supports_partitioning = False
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        # journal_mode=WAL сохраняется в файле базы: читатели не блокируют писателя
+        connection = sqlite3.connect(self.path)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+        finally:
+            connection.close()
+
+    def describe(self) -> str:
+        return f"sqlite path={self.path}"
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        return SQLiteConnection(connection)
+
+    def database_exists(self) -> bool:
+        # Файл базы создается при первом подключении
+        return True
+
+    def create_database(self):
+        pass
+
+    def table_exists_sql(self) -> str:
+        return "SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s"
+
+    def column_type_sql(self) -> str:
+        return "SELECT type FROM pragma_table_info(%s) WHERE name = %s"
+
+    def modify_column_sql(self, table: str, column: str, definition: str):
+        # SQLite не меняет тип колонки, но хранит в ней любые значения; миграция не нужна
+        return None
+
+    def index_exists_sql(self) -> str:
+        return "SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s"
+
+    def create_index_sql(self, table: str, name: str, columns) -> str:
+        column_list = ', '.join(f"`{column}`" for column in columns)
+        return f"CREATE INDEX IF NOT EXISTS `{name}` ON `{table}` ({column_list})"
+
+    def now_offset_sql(self) -> str:
+        # datetime() возвращает UTC в формате 'YYYY-MM-DD HH:MM:SS', строки сравниваются как время
+        return "datetime('now', %s || ' seconds')"
+
+    def autoincrement_pk(self) -> str:
+        return "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+    def on_update_timestamp(self) -> str:
+        return "timestamp DEFAULT CURRENT_TIMESTAMP"
+
+    def insert_ignore(self) -> str:
+        return "INSERT OR IGNORE"
+
+    def greatest(self, *expressions) -> str:
+        # Скалярный MAX с несколькими аргументами
+        return f"MAX({', '.join(expressions)})"
+
+    def excluded(self, column: str) -> str:
+        return f"excluded.`{column}`"
+
+    def upsert_sql(self, table: str, columns, key_columns, updates: dict) -> str:
+        """INSERT ... ON CONFLICT DO UPDATE; updates: колонка -> SQL-выражение"""
+        column_list = ', '.join(f"`{column}`" for column in columns)
+        placeholders = ', '.join(['%s'] * len(columns))
+        conflict = ', '.join(f"`{column}`" for column in key_columns)
+        assignments = ', '.join(f"`{column}` = {expression}" for column, expression in updates.items())
+        return (f"INSERT INTO `{table}` ({column_list}) VALUES ({placeholders}) "
+                f"ON CONFLICT ({conflict}) DO UPDATE SET {assignments}")
+
+
+def create_backend(config: dict):
+    """Выбирает хранилище по DB_BACKEND: mysql (по умолчанию) или sqlite"""
+    backend_name = os.getenv('DB_BACKEND', 'mysql').strip().lower()
+
+    if backend_name == 'sqlite':
+        return SQLiteBackend(os.getenv('SQLITE_PATH', 'regilda.db'))
+
+    if backend_name != 'mysql':
+        logger.warning(f"⚠️ Неизвестный DB_BACKEND '{backend_name}', используем mysql")
+    if mysql is None:
+        raise RuntimeError("mysql-connector-python не установлен; установите его или задайте DB_BACKEND=sqlite")
+    return MySQLBackend(config)
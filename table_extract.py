@@ -0,0 +1,142 @@
+import re
+
+# Модуль намеренно не импортирует selenium/pandas: его загружают рабочие процессы bench_parsing --workers
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:  # без lxml parser.py разбирает страницу через BeautifulSoup
+    etree = lxml_html = None
+
+LXML_AVAILABLE = etree is not None
+
+# Селекторы контейнера таблицы в порядке приоритета
+TABLE_SELECTORS = [
+    'div[data-sentry-component="VirtualizedDataTable"]',
+    'div[data-sentry-component="GuildDonationsList"]',
+    'div[class*="table"]',
+    'table'
+]
+
+# Те же селекторы в виде XPath для lxml (cssselect не входит в зависимости)
+TABLE_XPATHS = {
+    'div[data-sentry-component="VirtualizedDataTable"]': '//div[@data-sentry-component="VirtualizedDataTable"]',
+    'div[data-sentry-component="GuildDonationsList"]': '//div[@data-sentry-component="GuildDonationsList"]',
+    'div[class*="table"]': '//div[contains(@class, "table")]',
+    'table': '//table',
+}
+
+# Значения в колонке пользователя, которые означают заголовок или пустую строку
+SKIPPED_USER_VALUES = {'Пользователь', 'User', 'Неизвестный'}
+
+ABSOLUTE_ROW_STYLE = re.compile(r'position:\s*absolute')
+
+_WHITESPACE = re.compile(r'\s+')
+_DIGIT = re.compile(r'\d')
+
+
+def clean_text(text):
+    """Очистка текста от NBSP и лишних пробелов"""
+    if not text:
+        return text
+    text = text.replace('\u00a0', ' ').replace('\u2007', ' ').replace('\u202f', ' ')
+    text = _WHITESPACE.sub(' ', text).strip()
+    return text
+
+
+def _class_xpath(tag: str, class_name: str) -> str:
+    return f".//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+
+
+if LXML_AVAILABLE:
+    _CONTAINER_XPATHS = [(selector, etree.XPath(xpath)) for selector, xpath in TABLE_XPATHS.items()]
+    _USER_NAME = etree.XPath(_class_xpath('span', 'font-medium'))
+    _USER_FALLBACKS = [etree.XPath(_class_xpath('*', name)) for name in ('font-medium', 'username', 'user-name')]
+    _AMOUNT_BADGE = etree.XPath('.//div[@data-slot="badge"]')
+    _DATE = etree.XPath(_class_xpath('span', 'text-muted-foreground'))
+    _TEXTS = etree.XPath('.//text()')
+    _STYLED_ROWS = etree.XPath('.//tr[@style]')
+    _ROWS_WITH_CELLS = etree.XPath('.//tr[.//td]')
+    _CELLS = etree.XPath('.//td | .//th')
+
+
+def _first_text(element, accept):
+    for text in _TEXTS(element):
+        cleaned = clean_text(str(text))
+        if cleaned and accept(cleaned):
+            return cleaned
+    return None
+
+
+def _user(cell) -> str:
+    found = _USER_NAME(cell)
+    if found:
+        return clean_text(found[0].text_content())
+    for xpath in _USER_FALLBACKS:
+        found = xpath(cell)
+        if found:
+            return clean_text(found[0].text_content())
+    return _first_text(cell, lambda text: text not in SKIPPED_USER_VALUES) or "Неизвестный"
+
+
+def _amount(cell) -> str:
+    badges = _AMOUNT_BADGE(cell)
+    if badges:
+        # Текст бейджа до иконки
+        badge = badges[0]
+        parts = [badge.text or '']
+        for child in badge:
+            if child.tag == 'svg':
+                break
+            parts.append(child.text_content())
+            parts.append(child.tail or '')
+        return clean_text(''.join(parts).strip())
+    return _first_text(cell, _DIGIT.search) or "0"
+
+
+def _date(cell) -> str:
+    found = _DATE(cell)
+    if found:
+        return clean_text(found[0].text_content())
+    return _first_text(cell, _DIGIT.search) or "Неизвестная дата"
+
+
+def find_container(root):
+    """Ищет контейнер таблицы в дереве lxml. Возвращает (элемент, селектор) или (None, None)"""
+    for selector, xpath in _CONTAINER_XPATHS:
+        found = xpath(root)
+        if found:
+            return found[0], selector
+    return None, None
+
+
+def extract_container_rows(container):
+    """Строки [пользователь, сумма, дата] из контейнера таблицы lxml; возвращает (строки, число найденных tr)"""
+    rows = [row for row in _STYLED_ROWS(container) if ABSOLUTE_ROW_STYLE.search(row.get('style', ''))]
+    if not rows:
+        rows = _ROWS_WITH_CELLS(container)
+
+    extracted = []
+    for row in rows:
+        cells = _CELLS(row)
+        if len(cells) < 3:
+            continue
+        user = _user(cells[0])
+        if not user or user in SKIPPED_USER_VALUES:
+            continue
+        extracted.append([user, _amount(cells[1]), _date(cells[2])])
+
+    return extracted, len(rows)
+
+
+def extract_table_rows(markup: str, selector: str = None):
+    """Разбирает HTML через lxml. markup - вся страница или outerHTML контейнера (тогда передается его selector).
+    Возвращает (строки, число найденных tr, селектор); строки = None, если таблицы нет"""
+    root = lxml_html.fromstring(markup)
+    if selector is None:
+        root, selector = find_container(root)
+        if root is None:
+            return None, 0, None
+
+    rows, rows_seen = extract_container_rows(root)
+    return rows, rows_seen, selector
+
@@ -0,0 +1,60 @@
+import datetime
+
+import pytest
+
+from date_normalizer import normalize_date, normalize_date_column
+
+EARLY = datetime.datetime(2026, 10, 19, 12, 5, 40)
+LATE = datetime.datetime(2026, 10, 19, 12, 55, 10)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('час назад', datetime.datetime(2026, 10, 19, 11, 0)),
+    ('3 часа назад', datetime.datetime(2026, 10, 19, 9, 0)),
+    ('2 дня назад', datetime.datetime(2026, 10, 17)),
+    ('неделю назад', datetime.datetime(2026, 10, 12)),
+    ('месяц назад', datetime.datetime(2026, 9, 19)),
+    ('3 месяца назад', datetime.datetime(2026, 7, 19)),
+    ('11 месяцев назад', datetime.datetime(2025, 11, 19)),
+    ('год назад', datetime.datetime(2025, 10, 19)),
+    ('2 года назад', datetime.datetime(2024, 10, 19)),
+    ('5 лет назад', datetime.datetime(2021, 10, 19)),
+])
+def test_relative_units_are_stable_between_passes(text, expected):
+    # Одна и та же надпись в соседних проходах дает одно и то же время
+    assert normalize_date(text, EARLY) == expected
+    assert normalize_date(text, LATE) == expected
+
+
+def test_minutes_ago_rounds_to_minute():
+    assert normalize_date('5 минут назад', EARLY) == datetime.datetime(2026, 10, 19, 12, 0)
+    assert normalize_date('55 минут назад', LATE) == datetime.datetime(2026, 10, 19, 12, 0)
+
+
+def test_month_ago_clamps_to_month_end():
+    assert normalize_date('месяц назад', datetime.datetime(2026, 3, 31, 10, 0)) == datetime.datetime(2026, 2, 28)
+    assert normalize_date('год назад', datetime.datetime(2028, 2, 29, 10, 0)) == datetime.datetime(2027, 2, 28)
+    assert normalize_date('2 месяца назад', datetime.datetime(2026, 1, 15)) == datetime.datetime(2025, 11, 15)
+
+
+def test_relative_day_keeps_time():
+    assert normalize_date('вчера в 23:15', EARLY) == datetime.datetime(2026, 10, 18, 23, 15)
+    assert normalize_date('вчера в 23:15', LATE) == datetime.datetime(2026, 10, 18, 23, 15)
+
+
+def test_absolute_dates():
+    assert normalize_date('24 мая 2024, 07:08', EARLY) == datetime.datetime(2024, 5, 24, 7, 8)
+    assert normalize_date('24.05.2024', EARLY) == datetime.datetime(2024, 5, 24)
+    assert normalize_date('2024-05-24T07:08:00+00:00', EARLY) == datetime.datetime(2024, 5, 24, 10, 8)
+    # Дата без года "в будущем" относится к прошлому году
+    assert normalize_date('31 дек., 10:00', datetime.datetime(2027, 1, 2)) == datetime.datetime(2026, 12, 31, 10, 0)
+
+
+def test_unknown_format():
+    assert normalize_date('когда-то', EARLY) is None
+    assert normalize_date(None, EARLY) is None
+
+
+def test_column_uses_one_now():
+    assert normalize_date_column(['час назад', 'час назад', None], LATE) == [
+        datetime.datetime(2026, 10, 19, 11, 0), datetime.datetime(2026, 10, 19, 11, 0), None]
@@ -0,0 +1,34 @@
+import datetime
+
+from TableToBot import format_booster_search, split_message_by_lines
+
+
+def booster_rows(users, guilds):
+    return [
+        {'user_name': f"user{u}", 'guild_name': f"Гильдия <{g}> & co", 'total': 1000 + g,
+         'donations': g + 1, 'last_date': datetime.datetime(2026, 10, 19)}
+        for u in range(users) for g in range(guilds)
+    ]
+
+
+def test_short_message_is_one_part():
+    assert split_message_by_lines("<b>a</b>\n<pre>x\n</pre>\n") == ["<b>a</b>\n<pre>x\n</pre>\n"]
+
+
+def test_booster_search_splits_between_lines_and_reopens_pre():
+    text = format_booster_search(booster_rows(5, 60), 'user')
+    parts = split_message_by_lines(text, max_length=1000)
+
+    assert len(parts) > 1
+    for part in parts:
+        assert len(part) <= 1000
+        assert part.count("<pre>") == part.count("</pre>")
+        # Экранированные символы ника не разрезаны
+        assert part.count("&lt;") == part.count("&gt;")
+    # Разрывы только добавляют пары <pre></pre>, строки таблицы не теряются
+    assert "".join(parts).replace("</pre><pre>", "") == text
+
+
+def test_closing_tag_stays_with_its_part():
+    parts = split_message_by_lines("<pre>aaaa\nbbbb\n</pre>\n", max_length=16)
+    assert parts == ["<pre>aaaa\n</pre>", "<pre>bbbb\n</pre>\n"]
@@ -0,0 +1,21 @@
+import metrics
+
+
+def pool_gauges(pool):
+    labels = {'pool': pool}
+    return metrics.get_gauge('pool_busy', labels), metrics.get_gauge('pool_queued', labels)
+
+
+def test_pool_usage_splits_busy_and_queued():
+    usage = metrics.PoolUsage('test_pool', 2)
+    assert metrics.get_gauge('pool_size', {'pool': 'test_pool'}) == 2
+
+    for _ in range(3):
+        usage.submitted()
+    assert pool_gauges('test_pool') == (2, 1)
+
+    usage.finished()
+    assert pool_gauges('test_pool') == (2, 0)
+    usage.finished(object())
+    usage.finished()
+    assert pool_gauges('test_pool') == (0, 0)
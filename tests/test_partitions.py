@@ -0,0 +1,29 @@
+import datetime
+
+import partitions
+
+JAN = datetime.date(2026, 1, 1)
+FEB = datetime.date(2026, 2, 1)
+MAR = datetime.date(2026, 3, 1)
+
+
+def test_old_partition_kept_while_its_bound_is_after_cutoff():
+    # Таблица создана в марте: в p_old может лежать история февраля, которую еще рано архивировать
+    assert partitions.expired_partitions([MAR], FEB) == []
+
+
+def test_old_partition_archived_with_expired_months():
+    assert partitions.expired_partitions([FEB, JAN, MAR], FEB) == [partitions.OLD_PARTITION, 'p202601']
+    assert partitions.expired_partitions([MAR], MAR) == [partitions.OLD_PARTITION]
+
+
+def test_expired_partitions_without_months():
+    assert partitions.expired_partitions([], MAR) == []
+
+
+def test_split_old_sql_ends_at_first_monthly_partition():
+    sql = partitions.split_old_sql('guild', [JAN, FEB])
+    assert sql.startswith(f"ALTER TABLE `guild` REORGANIZE PARTITION {partitions.OLD_PARTITION} INTO")
+    assert "VALUES LESS THAN (TO_DAYS('2026-01-01'))" in sql
+    # Последняя новая партиция заканчивается там, где начинается март
+    assert "PARTITION p202602 VALUES LESS THAN (TO_DAYS('2026-03-01'))\n)" in sql
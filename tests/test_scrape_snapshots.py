@@ -0,0 +1,79 @@
+import datetime
+
+import scrape_snapshots as snapshots
+
+
+def entry(minute, key):
+    return minute, snapshots.fingerprint(key)
+
+
+def test_encode_decode_roundtrip():
+    entries = [entry(29000000 + i * 7, f"user{i}|10|{i}") for i in range(500)]
+    decoded = snapshots.decode(snapshots.encode(entries))
+    assert decoded == sorted(set(entries))
+
+
+def test_encode_empty():
+    assert snapshots.decode(snapshots.encode([])) == []
+
+
+def test_decode_rejects_unknown_version():
+    blob = bytearray(snapshots.encode([entry(1, 'a')]))
+    blob[0] = 99
+    try:
+        snapshots.decode(bytes(blob))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('ожидали ValueError')
+
+
+def test_fingerprint_fits_bigint():
+    value = snapshots.fingerprint('user|100|2024-05-24 07:08:00')
+    assert -2 ** 63 <= value < 2 ** 63
+    assert value == snapshots.fingerprint('user|100|2024-05-24 07:08:00')
+
+
+def test_diff_added_and_removed_inside_window():
+    old, kept, gone, new = entry(100, 'old'), entry(200, 'kept'), entry(300, 'gone'), entry(400, 'new')
+    added, removed, window = snapshots.diff([old, kept, gone], [kept, new])
+    assert added == {new[1]}
+    # old старше самой старой строки выгрузки: просто не попал в прокрутку
+    assert removed == {gone[1]}
+    assert window == 1
+
+
+def test_diff_empty_current_removes_nothing():
+    assert snapshots.diff([entry(1, 'a')], []) == (set(), set(), 0)
+
+
+def test_removals_look_safe():
+    assert snapshots.removals_look_safe(1, 2)
+    assert snapshots.removals_look_safe(20, 100)
+    assert not snapshots.removals_look_safe(21, 100)
+    assert not snapshots.removals_look_safe(2, 5)
+
+
+def test_pair_moved_matches_same_user_and_amount_within_tolerance():
+    exact = datetime.datetime(2026, 10, 19, 11, 1)
+    hour_snapped = datetime.datetime(2026, 10, 19, 11, 0)
+    day_snapped = datetime.datetime(2026, 10, 18)
+    removed = [(1, 'a', 10, exact), (2, 'b', 5, datetime.datetime(2026, 10, 18, 15, 30))]
+    added = [(11, 'a', 10, hour_snapped), (12, 'b', 5, day_snapped), (13, 'a', 99, hour_snapped)]
+    assert snapshots.pair_moved(removed, added) == {1: 11, 2: 12}
+
+
+def test_pair_moved_keeps_real_changes():
+    removed = [(1, 'a', 10, datetime.datetime(2026, 10, 19, 11, 1))]
+    # Другая сумма, другой бустер и время за пределами точности - это настоящие удаление и добавление
+    added = [(11, 'a', 20, datetime.datetime(2026, 10, 19, 11, 1)),
+             (12, 'b', 10, datetime.datetime(2026, 10, 19, 11, 1)),
+             (13, 'a', 10, datetime.datetime(2026, 10, 19, 11, 9))]
+    assert snapshots.pair_moved(removed, added) == {}
+
+
+def test_pair_moved_uses_each_added_row_once():
+    date = datetime.datetime(2026, 10, 19, 11, 1)
+    removed = [(1, 'a', 10, date), (2, 'a', 10, date + datetime.timedelta(minutes=1))]
+    added = [(11, 'a', 10, date + datetime.timedelta(minutes=1))]
+    assert len(snapshots.pair_moved(removed, added)) == 1
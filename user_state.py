@@ -0,0 +1,75 @@
+# Компактное состояние пользователя в context.user_data: id гильдии, курсор просмотра и время последней активности
+# Хранится через PicklePersistence, поэтому переживает перезапуск; неактивные пользователи вытесняются по TTL
+import os
+import time
+import asyncio
+import logging
+from telegram.ext import PicklePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+STATE_PATH = os.getenv('BOT_STATE_PATH', 'bot_state.pickle')
+STATE_TTL = int(os.getenv('USER_STATE_TTL_SECONDS', 7 * 24 * 3600))
+EVICT_INTERVAL = int(os.getenv('USER_STATE_EVICT_INTERVAL_SECONDS', 3600))
+
+GUILD_ID = 'guild_id'
+CURSOR = 'cursor'
+TIMESTAMP = 'ts'
+
+
+def create_persistence():
+    """Persistence только для user_data: bot_data и chat_data бот не сохраняет"""
+    return PicklePersistence(
+        filepath=STATE_PATH,
+        store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+        update_interval=60,
+    )
+
+
+def touch(user_data: dict):
+    """Отмечает активность пользователя"""
+    user_data[TIMESTAMP] = time.time()
+
+
+def set_view(user_data: dict, guild_id: int, cursor: int = 0):
+    """Запоминает гильдию и позицию просмотра"""
+    user_data[GUILD_ID] = guild_id
+    user_data[CURSOR] = cursor
+    touch(user_data)
+
+
+def get_cursor(user_data: dict, guild_id: int) -> int:
+    """Позиция просмотра для гильдии; 0, если пользователь смотрел другую гильдию"""
+    if user_data.get(GUILD_ID) != guild_id:
+        return 0
+    return user_data.get(CURSOR, 0)
+
+
+async def touch_user_state(update, context):
+    """Обработчик в группе -1: обновляет время активности для любого апдейта пользователя"""
+    if update.effective_user is not None:
+        touch(context.user_data)
+
+
+def evict_expired(application, now: float = None) -> int:
+    """Удаляет состояние пользователей, неактивных дольше STATE_TTL. Возвращает число удаленных"""
+    now = now or time.time()
+    expired = [
+        user_id for user_id, user_data in application.user_data.items()
+        if now - user_data.get(TIMESTAMP, 0) > STATE_TTL
+    ]
+    for user_id in expired:
+        application.drop_user_data(user_id)
+    return len(expired)
+
+
+async def eviction_loop(application):
+    """Фоновая задача бота: периодически вытесняет устаревшие состояния"""
+    while True:
+        await asyncio.sleep(EVICT_INTERVAL)
+        try:
+            evicted = evict_expired(application)
+            if evicted:
+                logger.info(f"🧹 Удалено состояний неактивных пользователей: {evicted}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка очистки состояний пользователей: {e}")